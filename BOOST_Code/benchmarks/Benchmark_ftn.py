@@ -45,22 +45,25 @@ class Benchmarks:
         target=0.0
     )
 
+    @staticmethod
+    def _as_tensor(individuals):
+        """Torch-native inputs are used as they are (device and dtype kept), others become float64 tensors"""
+        if isinstance(individuals, torch.Tensor):
+            return individuals.detach()
+        return torch.as_tensor(np.asarray(individuals), dtype=torch.double)
+
     @staticmethod
     def Ackley(individuals):
         """
         Ackley function
         Global minimum: f(0,0,...,0) = 0
         """
-        if isinstance(individuals, torch.Tensor):
-            individuals = individuals.detach().cpu().numpy()
-        else:
-            individuals = np.asarray(individuals)
+        individuals = Benchmarks._as_tensor(individuals)
         n = individuals.shape[1]
-        sum1 = np.sum(individuals ** 2, axis=1)
-        sum2 = np.sum(np.cos(2 * np.pi * individuals), axis=1)
+        sum1 = torch.sum(individuals ** 2, dim=1)
+        sum2 = torch.sum(torch.cos(2 * np.pi * individuals), dim=1)
 
-        ackley_value = -20 * np.exp(-0.2 * np.sqrt(sum1 / n)) - np.exp(sum2 / n) + 20 + np.exp(1)
-        return torch.tensor(ackley_value)
+        return -20 * torch.exp(-0.2 * torch.sqrt(sum1 / n)) - torch.exp(sum2 / n) + 20 + np.exp(1)
 
     @staticmethod
     def Levy(individuals):
@@ -68,18 +71,15 @@ class Benchmarks:
         Levy function
         Global minimum: f(1,1,...,1) = 0
         """
-        if isinstance(individuals, torch.Tensor):
-            individuals = individuals.detach().cpu().numpy()
-        else:
-            individuals = np.asarray(individuals)
+        individuals = Benchmarks._as_tensor(individuals)
         w = 1 + (individuals - 1) / 4
 
-        term1 = np.sin(np.pi * w[:, 0]) ** 2
-        term3 = (w[:, -1] - 1) ** 2 * (1 + np.sin(2 * np.pi * w[:, -1]) ** 2)
+        term1 = torch.sin(np.pi * w[:, 0]) ** 2
+        term3 = (w[:, -1] - 1) ** 2 * (1 + torch.sin(2 * np.pi * w[:, -1]) ** 2)
 
-        sum_term = np.sum((w[:, :-1] - 1) ** 2 * (1 + 10 * np.sin(np.pi * w[:, :-1] + 1) ** 2), axis=1)
+        sum_term = torch.sum((w[:, :-1] - 1) ** 2 * (1 + 10 * torch.sin(np.pi * w[:, :-1] + 1) ** 2), dim=1)
 
-        return torch.tensor(term1 + sum_term + term3)
+        return term1 + sum_term + term3
 
     @staticmethod
     def Rosenbrock(individuals):
@@ -87,13 +87,9 @@ class Benchmarks:
         Rosenbrock function (Banana function)
         Global minimum: f(1,1,...,1) = 0
         """
-        if isinstance(individuals, torch.Tensor):
-            individuals = individuals.detach().cpu().numpy()
-        else:
-            individuals = np.asarray(individuals)
-        sum_term = np.sum(100.0 * (individuals[:, 1:] - individuals[:, :-1] ** 2) ** 2 +
-                          (individuals[:, :-1] - 1) ** 2, axis=1)
-        return torch.tensor(sum_term)
+        individuals = Benchmarks._as_tensor(individuals)
+        return torch.sum(100.0 * (individuals[:, 1:] - individuals[:, :-1] ** 2) ** 2 +
+                         (individuals[:, :-1] - 1) ** 2, dim=1)
 
     @staticmethod
     def SumSquares(individuals):
@@ -101,8 +97,7 @@ class Benchmarks:
         Sum Squares function
         Global minimum: f(0,0,...,0) = 0
         """
-        individuals = np.array(individuals)
+        individuals = Benchmarks._as_tensor(individuals)
         n = individuals.shape[1]
-        i = np.arange(1, n + 1)
-        return torch.tensor(np.sum(i * individuals ** 2, axis=1))
-
+        i = torch.arange(1, n + 1, dtype=individuals.dtype, device=individuals.device)
+        return torch.sum(i * individuals ** 2, dim=1)
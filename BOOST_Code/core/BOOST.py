@@ -1,3 +1,4 @@
+import copy
 import gc
 import os
 
@@ -6,7 +7,9 @@ from joblib import Parallel, delayed
 from sklearn.cluster import KMeans
 
 from core.BayesianOptimization import BayesianOptimizer
-from core.kernels_and_acquisitions import KernelType, AcquisitionType
+from core.candidates import CandidatePool
+from core.observations import ObservationStore
+from core.kernels_and_acquisitions import KernelType, AcquisitionType, BatchStrategy, GPBackend
 from utils.Save_results import save_recommendation_log
 
 os.environ['OMP_NUM_THREADS'] = '1'
@@ -16,14 +19,45 @@ class BOOST(BayesianOptimizer):
     def __init__(
             self,
             is_fixed_candidate_x=True,
-            kernel_candidates = [KernelType.MATERN32, KernelType.MATERN52, KernelType.RBF, KernelType.RQ],
+            kernel_candidates = [KernelType.MATERN32, KernelType.MATERN52, KernelType.RBF, KernelType.RQ, KernelType.WENDLAND],
             acquisition_candidates = [AcquisitionType.EI, AcquisitionType.PI, AcquisitionType.UCB, AcquisitionType.PM],
+            backend_candidates = [GPBackend.EXACT],
             device='cpu',
+            cache_distances=False,
+            compile_steps=False,
+            n_inducing_points=256,
+            batch_size=1,
+            batch_strategy=BatchStrategy.KRIGING_BELIEVER,
+            prior=None,
+            subspace=None,
+            initial_hyperparameters=None,
              ):
-        super().__init__(device=device)
+        # compile_steps=True compiles the graphs once per joblib worker (see core/compiled.py)
+        super().__init__(device=device, compile_steps=compile_steps, n_inducing_points=n_inducing_points)
         self.is_fixed_candidate_x = is_fixed_candidate_x
+        # Kernels of every combination read squared distances from one cache of the candidate pool
+        self.cache_distances = cache_distances
         self.kernel_candidates = kernel_candidates
         self.acquisition_candidates = acquisition_candidates
+        # GP backends compared like kernels; the recommended one is stored in self.backend by get_kernel_acq
+        self.backend_candidates = backend_candidates
+        # batch_size > 1 compares the combinations by the number of q-point batches (get_next_batch) to the target
+        self.batch_size = batch_size
+        self.batch_strategy = batch_strategy
+        # Prior weights {(kernel value, acquisition value): weight} of the combinations, e.g. from prior studies
+        # (core/warm_start.py); a tie in iterations goes to the combination with the larger weight
+        self.prior = prior or {}
+        # Subspace (core/subspace.py) every combination fits and scores in; each one gets its own copy, sharing the
+        # domain of this one (fit it with Subspace.fit_domain on the whole domain first, else the BOOST data is used)
+        if subspace is not None and batch_size > 1:
+            raise ValueError("subspace cannot be combined with batch_size > 1")
+        # get_next_batch fits exact GPs only
+        if batch_size > 1 and any(backend != GPBackend.EXACT for backend in backend_candidates):
+            raise ValueError("batch_size > 1 cannot be combined with a backend other than GPBackend.EXACT")
+        self.subspace = subspace
+        # Starting hyperparameters {kernel_type: {'lengthscale', 'outputscale', 'noise'}} of the GP fits of every
+        # combination, e.g. WarmStart.apply of the optimizer being recommended for
+        self.initial_hyperparameters = dict(initial_hyperparameters or {})
         self.device = torch.device("cuda") if device == "cuda" else torch.device("cpu")
 
     def recommend(
@@ -37,10 +71,9 @@ class BOOST(BayesianOptimizer):
             ratio_init_boost = 3, # Change this for different  |r_n| to |s_n| ratio
             max_iter_boost = 20,
     ):
-        self.set_seed(seed)
+        self.seed_step(seed)
         n_init_boost = min(max_init_boost, max(min_init_boost, train_x_init.shape[0] // ratio_init_boost))
         n_init_boost = round(n_init_boost)
-        torch.set_default_dtype(torch.double)
 
         # calculate y values corresponding to train_x_init
         train_x_init = train_x_init.to(self.device)
@@ -73,82 +106,92 @@ class BOOST(BayesianOptimizer):
         selected_train_x_init = train_x_init[train_indices]
 
         # leftover points for candidate set: treat as undiscovered points
-        candidate_mask = torch.ones(train_x_init.shape[0], dtype=torch.bool, device=self.device)
-        candidate_mask[train_indices] = False
-        self.filtered_candidate_x = train_x_init[candidate_mask]
+        # The pool is shared read-only by every combination; each one only forks the evaluated set
+        self.candidate_pool = CandidatePool(train_x_init, train_y_init, cache_distances=self.cache_distances, cache_rows=train_x_init.shape[0])
+        self.candidate_pool.remove(train_indices)
+        distance_cache = self.candidate_pool.distance_cache
+        if distance_cache is not None and distance_cache.n_rows == 0 and train_x_init.shape[0] <= distance_cache.max_rows:
+            # fill the cache once here so that every worker receives it complete
+            distance_cache.fill()
         if train_y_init is not None:
             selected_train_y_init = train_y_init[train_indices]
-            self.filtered_candidate_y = train_y_init[candidate_mask]
 
-        # Parallelize the evaluation of kernel-acquisition combinations
-        combinations = [
-            (acq, kern)
-            for acq in self.acquisition_candidates
-            for kern in self.kernel_candidates
-        ]
+        if self.subspace is not None:
+            # fixed before the combinations copy the subspace, not from each one's pool
+            self.subspace.fit_domain(train_x_init)
+
+        # Parallelize the evaluation of kernel-acquisition(-backend) combinations
+        combinations = self.combinations()
         n_combinations = len(combinations)
         n_workers = min(10, max(8, n_combinations // 2))
 
-        def evaluate_combo(acquisition_type, kernel_type):
+        def evaluate_combo(acquisition_type, kernel_type, backend):
             iterations = 0
-            train_x = selected_train_x_init.clone()
-            filtered_candidate_x = self.filtered_candidate_x.clone()
+            candidate_pool = self.candidate_pool.fork()
+            subspace = copy.deepcopy(self.subspace)
             if train_y_init is not None:
-                train_y = selected_train_y_init.clone()
-                filtered_candidate_y = self.filtered_candidate_y.clone()
+                train_y = selected_train_y_init
             else:
-                train_y = objective(train_x).to(dtype=train_x.dtype, device=self.device)
-                filtered_candidate_y = None
+                train_y = objective(selected_train_x_init).to(dtype=selected_train_x_init.dtype, device=self.device)
+            observations = ObservationStore.from_tensors(selected_train_x_init, train_y, capacity=n_init_boost + max_iter_boost, idx=train_indices)
 
-            while train_x.shape[0] < train_x_init.shape[0]:
+            while len(observations) < train_x_init.shape[0]:
                 iterations += 1
                 if iterations > max_iter_boost:
                     break
-                next_x, next_y, next_idx = self.get_next_point(
-                    train_x=train_x,
-                    train_y=train_y,
-                    filtered_candidate_x=filtered_candidate_x,
-                    filtered_candidate_y=filtered_candidate_y,
-                    kernel_type=kernel_type,
-                    acquisition_type=acquisition_type,
-                    objective=objective,
-                )
-                train_x = torch.cat([train_x, next_x], dim=0)
-                train_y = torch.cat([train_y, next_y], dim=0)
-
-                mask = torch.ones(filtered_candidate_x.shape[0], dtype=torch.bool, device=self.device)
-                mask[next_idx] = False
-                filtered_candidate_x = filtered_candidate_x[mask]
-                if self.is_fixed_candidate_x:
-                    filtered_candidate_y = filtered_candidate_y[mask]
-                
-                gc.collect()
-                if torch.cuda.is_available():
-                    torch.cuda.empty_cache()
+                if self.batch_size > 1:
+                    next_x, next_y, next_idx = self.get_next_batch(
+                        train_x=observations,
+                        train_y=None,
+                        filtered_candidate_x=candidate_pool,
+                        filtered_candidate_y=None,
+                        kernel_type=kernel_type,
+                        acquisition_type=acquisition_type,
+                        q=self.batch_size,
+                        strategy=self.batch_strategy,
+                        objective=objective,
+                        backend=backend,
+                    )
+                else:
+                    next_x, next_y, next_idx = self.get_next_point(
+                        train_x=observations,
+                        train_y=None,
+                        filtered_candidate_x=candidate_pool,
+                        filtered_candidate_y=None,
+                        kernel_type=kernel_type,
+                        acquisition_type=acquisition_type,
+                        objective=objective,
+                        backend=backend,
+                        subspace=subspace,
+                    )
+                observations.append(next_x, next_y, next_idx)
+
+                candidate_pool.remove(next_idx)
 
                 # Stopping criterion
-                if train_y.min().item() <= target:
+                if observations.y_min <= target:
                     break
 
-            del train_x, train_y, filtered_candidate_x, filtered_candidate_y
+            del observations, candidate_pool
             gc.collect()
 
             return {
                 'kernel': kernel_type.value,
                 'acquisition': acquisition_type.value,
+                'backend': backend.value,
                 'iterations': iterations,
             }
         
         # Parallel execution of the evaluation function for each combination
         with Parallel(n_jobs=n_workers) as parallel: 
             results = parallel(
-                delayed(evaluate_combo)(acq, kern)
-                for acq, kern in combinations
+                delayed(evaluate_combo)(acq, kern, backend)
+                for acq, kern, backend in combinations
             )
 
 
         # The kernel-acquisition pair that achieves the fastest convergence is selected
-        min_result = min(results, key=lambda x: x['iterations']) # For random tie-breaking rule,
+        min_result = min(results, key=lambda x: (x['iterations'], -self.prior.get((x['kernel'], x['acquisition']), 0.0))) # For random tie-breaking rule,
                                                                 # self.set_seed(seed)
                                                                 # min_iter = min(r['iterations'] for r in results)
                                                                 # min_results = [r for r in results if r['iterations'] == min_iter]
@@ -156,9 +199,21 @@ class BOOST(BayesianOptimizer):
         return {
             'recommended_kernel': min_result['kernel'],
             'recommended_acquisition': min_result['acquisition'],
+            'recommended_backend': min_result['backend'],
             'iterations': min_result['iterations']
         }
 
+    def combinations(self):
+        """(acquisition, kernel, backend) combinations compared by recommend"""
+        return [
+            (acq, kern, backend)
+            for acq in self.acquisition_candidates
+            for kern in self.kernel_candidates
+            for backend in self.backend_candidates
+            # RandomFourierSample (Thompson sampling) has no spectral sampler for the compactly supported Wendland kernel
+            if not (acq == AcquisitionType.TS and kern == KernelType.WENDLAND)
+        ]
+
     def get_kernel_acq(self, train_x, train_y, objective, iter, seed, n_init_points, base_dir):
         train_x = train_x.to(self.device)
         if train_y is not None:
@@ -174,6 +229,7 @@ class BOOST(BayesianOptimizer):
 
         kernel_type = KernelType(recommended['recommended_kernel'])
         acquisition_type = AcquisitionType(recommended['recommended_acquisition'])
+        self.backend = GPBackend(recommended['recommended_backend'])
 
         # Save the recommendation log
         save_recommendation_log(
@@ -1,4 +1,4 @@
-import gc
+import copy
 import math
 import random
 
@@ -7,13 +7,59 @@ import numpy as np
 import torch
 from gpytorch.constraints import Interval
 from gpytorch.likelihoods import GaussianLikelihood
+from scipy.optimize import minimize
+from torch.quasirandom import SobolEngine
 
-from core.kernels_and_acquisitions import AcquisitionType, GPModel
+from core.candidates import CandidateGrid, CandidatePool, CandidateSet, ContinuousBox
+from core.compiled import CompiledSteps, pad_training_data
+from core.kernels_and_acquisitions import ACQUISITION_MOMENTS, COST_ACQUISITIONS, AcquisitionType, BatchStrategy, GPBackend, GPModel, KernelType, Precision
+from core.observations import ObservationStore
+from core.posterior import CompactSupportPosterior, FantasyPosterior, GPPosterior, RandomFourierSample
 
 
 class BayesianOptimizer:
-    def __init__(self, device='cpu'):
+    def __init__(self, device='cpu', chunk_size=65536, reuse_models=True, keep_model_state=False, kronecker_grid=True, precision=Precision.DOUBLE, compile_steps=False, plan_moments=True, ts_features=1024, backend=GPBackend.EXACT, n_inducing_points=256, n_restarts=10, n_raw_samples=1024, box_max_iter=100):
         self.device = torch.device("cuda") if device == "cuda" else torch.device("cpu")
+        # Number of candidates scored at once when candidates are given as a CandidateSet
+        self.chunk_size = chunk_size
+        # Score CandidateGrids with the per-dimension factorization of the RBF kernel (other kernels use the model)
+        self.kronecker_grid = kronecker_grid
+        # Precision.MIXED fits the GP in float64 but computes the candidate cross-covariance and acquisition in float32
+        self.precision = precision
+        # Opt-in torch.compile'd training loss and acquisition math (the first call of every graph compiles it)
+        self.compile_steps = compile_steps
+        # Compute only the posterior moments the requested acquisitions need (e.g. no variance for PM)
+        self.plan_moments = plan_moments
+        # Number of random Fourier features of the posterior sample drawn by AcquisitionType.TS
+        self.ts_features = ts_features
+        # GPBackend.SGPR fits an inducing-point GP once there are more than n_inducing_points training points
+        self.backend = backend
+        self.n_inducing_points = n_inducing_points
+        # ContinuousBox candidates: L-BFGS-B from the n_restarts best of n_raw_samples Sobol points
+        self.n_restarts = n_restarts
+        self.n_raw_samples = n_raw_samples
+        self.box_max_iter = box_max_iter
+        self._compiled_steps = CompiledSteps()
+
+        # GP model objects are kept per kernel type and reused through set_train_data.
+        # keep_model_state=False resets hyperparameters and optimizer state on every fit (same result as a new model),
+        # keep_model_state=True continues from the previous fit of the same kernel type.
+        self.reuse_models = reuse_models
+        self.keep_model_state = keep_model_state
+        self._model_pool = {}
+        # Starting hyperparameters of every fit per kernel type, {kernel_type: {'lengthscale', 'outputscale', 'noise'}}
+        # (e.g. from the fits of prior studies, see core/warm_start.py); the default initialization otherwise
+        self.initial_hyperparameters = {}
+        # torch.Generator of the random draws of a step (inducing points, Thompson samples, Sobol seeds) for
+        # optimizers used off the main thread (core/speculative.py); None: the global RNGs seeded by set_seed
+        self.generator = None
+
+    def __getstate__(self):
+        # Pooled models are not sent to joblib workers; every worker builds its own
+        state = self.__dict__.copy()
+        state['_model_pool'] = {}
+        state['_compiled_steps'] = CompiledSteps()
+        return state
 
     @staticmethod
     def set_seed(seed):
@@ -27,44 +73,535 @@ class BayesianOptimizer:
         torch.backends.cudnn.benchmark = False
         torch.use_deterministic_algorithms(True)
 
-    def get_next_point(self, train_x, train_y, filtered_candidate_x, filtered_candidate_y, kernel_type, acquisition_type, objective=None):
+    def seed_step(self, seed):
+        """Seed the random draws of the next step: self.generator if there is one, else the global RNGs"""
+        if self.generator is not None:
+            self.generator.manual_seed(seed)
+        else:
+            self.set_seed(seed)
+
+    def get_next_point(self, train_x, train_y, filtered_candidate_x, filtered_candidate_y, kernel_type, acquisition_type, objective=None, backend=None, trust_region=None, candidate_sampler=None, acquisition_cache=None, cost_model=None, subspace=None):
+        """Next point (next_x, next_y, next_x_idx) of one acquisition function, see get_next_points"""
+        return self.get_next_points(
+            train_x=train_x,
+            train_y=train_y,
+            filtered_candidate_x=filtered_candidate_x,
+            filtered_candidate_y=filtered_candidate_y,
+            kernel_type=kernel_type,
+            acquisition_types=[acquisition_type],
+            objective=objective,
+            backend=backend,
+            trust_region=trust_region,
+            candidate_sampler=candidate_sampler,
+            acquisition_cache=acquisition_cache,
+            cost_model=cost_model,
+            subspace=subspace,
+        )[acquisition_type]
+
+    def get_next_points(self, train_x, train_y, filtered_candidate_x, filtered_candidate_y, kernel_type, acquisition_types, objective=None, backend=None, trust_region=None, candidate_sampler=None, acquisition_cache=None, cost_model=None, subspace=None):
+        """
+        Next point of every acquisition function in acquisition_types from one GP fit and one pass over the candidates.
+        Returns {acquisition_type: (next_x, next_y, next_x_idx)}.
+        Only the posterior moments the acquisitions need (ACQUISITION_MOMENTS) are computed: PM alone skips the variance.
+        train_x is either a tensor (with train_y) or an ObservationStore (train_y is then ignored).
+        filtered_candidate_x is either a tensor of candidate points or a CandidateSet (CandidateGrid, CandidatePool).
+        For a CandidateSet, next_x_idx is the index of next_x in the set, and evaluated candidates are not copied out.
+        For a ContinuousBox, the acquisition is maximized by multi-start L-BFGS-B (next_x_idx is -1).
+        next_y is None when there is neither candidate y nor an objective (the caller evaluates next_x).
+        For a CandidatePool with a distance cache and an ObservationStore of pool rows, the GP is fitted on pool row
+        indices and its kernel reads the squared distances from the cache.
+        backend overrides self.backend for this call (BOOST compares backends on one optimizer).
+        With a TrustRegion (core/trust_region.py), the GP is fitted on the observations near the incumbent and only
+        the candidates inside the region are scored; the region expands or shrinks on every call.
+        With a CandidateSampler (core/samplers.py), only the candidates it draws are scored.
+        With an AcquisitionCache (core/acquisition_cache.py), the scores of one acquisition function over a
+        CandidateGrid or CandidatePool are kept across calls and only rescored near the new observations.
+        The cost-aware acquisitions (COST_ACQUISITIONS, e.g. EI per unit cost) divide by the costs of a CostModel
+        (core/cost.py) and need a CandidateSet or a tensor of candidate points.
+        With a Subspace (core/subspace.py), the GP is fitted and the candidates are scored on a low-dimensional
+        projection of the points (random embedding or active axes); next_x is still a candidate of filtered_candidate_x.
+        """
+        scoring_candidates = filtered_candidate_x
+        cost_acquisitions = [acquisition_type for acquisition_type in acquisition_types if acquisition_type in COST_ACQUISITIONS]
+        if cost_acquisitions:
+            if cost_model is None:
+                raise ValueError("Cost-aware acquisition functions need a cost_model")
+            if isinstance(filtered_candidate_x, ContinuousBox) or acquisition_cache is not None:
+                raise ValueError("Cost-aware acquisition functions cannot be used with a ContinuousBox or an acquisition_cache")
+            cost_model.fit()
+        if trust_region is not None and candidate_sampler is not None:
+            raise ValueError("trust_region and candidate_sampler cannot be combined")
+        if subspace is not None:
+            if trust_region is not None or candidate_sampler is not None or acquisition_cache is not None:
+                raise ValueError("subspace cannot be combined with trust_region, candidate_sampler or acquisition_cache")
+            if isinstance(filtered_candidate_x, ContinuousBox):
+                raise ValueError("subspace needs candidate points, not a ContinuousBox")
+        if acquisition_cache is not None:
+            if trust_region is not None or candidate_sampler is not None:
+                raise ValueError("acquisition_cache cannot be combined with trust_region or candidate_sampler")
+            if not isinstance(filtered_candidate_x, (CandidateGrid, CandidatePool)):
+                raise ValueError("acquisition_cache needs a CandidateGrid or CandidatePool")
+            if len(acquisition_types) != 1 or ACQUISITION_MOMENTS[acquisition_types[0]] == ("sample",):
+                raise ValueError("acquisition_cache supports one acquisition function that is not a sample")
+            with torch.no_grad(), gpytorch.settings.fast_pred_var():
+                next_x_idx = {acquisition_types[0]: self._get_next_idx_cached(cache=acquisition_cache, train_x=train_x, train_y=train_y, filtered_candidate_x=filtered_candidate_x, kernel_type=kernel_type, acquisition_type=acquisition_types[0], backend=backend)}
+                return self._collect_next_points(next_x_idx, {}, filtered_candidate_x, filtered_candidate_y, objective)
+        if trust_region is not None:
+            train_x, train_y, scoring_candidates = trust_region.restrict(train_x, train_y, filtered_candidate_x)
+        if candidate_sampler is not None:
+            scoring_candidates = candidate_sampler.subset(filtered_candidate_x, train_x, train_y)
+        if subspace is not None:
+            train_x, train_y, scoring_candidates = subspace.restrict(self, train_x, train_y, filtered_candidate_x)
+
         # Normaize data: x is min-max normalized to [0, 1], y is standardized with median and std
         x_min, x_range, y_median, y_std, train_x_normalized, train_y_normalized = self.normalize_data(train_x, train_y)
-        candidate_x_normalized = (filtered_candidate_x - x_min) / x_range
+        if isinstance(train_x, ObservationStore):
+            best_f = train_x.y_min
+        else:
+            best_f = train_y.min().item()
 
         # Generate and train GP model
-        model, likelihood = self._train_model(train_x_normalized=train_x_normalized, train_y_normalized=train_y_normalized, kernel_type=kernel_type)
+        inducing_points = self._get_inducing_points(train_x_normalized, backend)
+        distance_cache = None
+        if inducing_points is not None:
+            model, likelihood = self._train_model(train_x_normalized=train_x_normalized, train_y_normalized=train_y_normalized, kernel_type=kernel_type, inducing_points=inducing_points)
+        else:
+            distance_cache = self._get_distance_cache(train_x, filtered_candidate_x)
+            if distance_cache is not None:
+                train_idx = train_x.idx
+                model, likelihood = self._train_model(train_x_normalized=train_idx.to(train_y_normalized.dtype).unsqueeze(-1), train_y_normalized=train_y_normalized, kernel_type=kernel_type, pool_distances=(distance_cache, train_idx, x_range))
+            else:
+                model, likelihood = self._train_model(train_x_normalized=train_x_normalized, train_y_normalized=train_y_normalized, kernel_type=kernel_type)
 
         # Get into evaluation (predictive posterior) mode
         model.eval()
         likelihood.eval()
         
+        if self.compile_steps:
+            # best_f as a tensor, so that the compiled graph does not specialize on its value
+            best_f = torch.tensor(best_f, dtype=train_y_normalized.dtype, device=train_y_normalized.device)
+            get_acq_values = self._compiled_steps.acquisition_values(self._get_acq_values)
+        else:
+            get_acq_values = self._get_acq_values
+        sample_acquisitions = [acquisition_type for acquisition_type in acquisition_types if ACQUISITION_MOMENTS[acquisition_type] == ("sample",)]
+        moment_acquisitions = [acquisition_type for acquisition_type in acquisition_types if acquisition_type not in sample_acquisitions]
+        with_variance = not self.plan_moments or any("variance" in ACQUISITION_MOMENTS[acquisition_type] for acquisition_type in moment_acquisitions)
+
         with torch.no_grad(), gpytorch.settings.fast_pred_var():
-            # Get predictions for the candidate points and find the next point
-            observed_pred = likelihood(model(candidate_x_normalized))
+            # Get predictions for the candidate points chunk by chunk and keep the best point of every acquisition so far
+            best_values, next_x_idx, box_points = {}, {}, {}
+            if isinstance(filtered_candidate_x, ContinuousBox):
+                for acquisition_type in acquisition_types:
+                    box_points[acquisition_type] = self._optimize_box(model=model, likelihood=likelihood, kernel_type=kernel_type, box=scoring_candidates, acquisition_type=acquisition_type, best_f=best_f, x_min=x_min, x_range=x_range, y_median=y_median, y_std=y_std, train_x_normalized=train_x_normalized, train_y_normalized=train_y_normalized)
+                    next_x_idx[acquisition_type] = torch.tensor(-1, device=self.device)
+            else:
+                if moment_acquisitions:
+                    predictions = self._iter_predictions(model=model, likelihood=likelihood, kernel_type=kernel_type, filtered_candidate_x=scoring_candidates, x_min=x_min, x_range=x_range, train_x_normalized=train_x_normalized, train_y_normalized=train_y_normalized, distance_cache=distance_cache, with_variance=with_variance)
+                    for candidate_idx, mean, stddev in predictions:
+                        if cost_acquisitions:
+                            costs = cost_model.predict(scoring_candidates, candidate_idx)
+                        for acquisition_type in moment_acquisitions:
+                            acq_values = get_acq_values(acquisition_type=COST_ACQUISITIONS.get(acquisition_type, acquisition_type), best_f=best_f, mean=mean, stddev=stddev, y_median=y_median, y_std=y_std)
+                            if acquisition_type in COST_ACQUISITIONS:
+                                acq_values = acq_values / costs.to(acq_values.dtype)
+                            self._update_best(best_values, next_x_idx, acquisition_type, acq_values, candidate_idx)
+
+                for acquisition_type in sample_acquisitions:
+                    # Thompson sampling: minimize one posterior sample path, O(ts_features) per candidate
+                    sample = RandomFourierSample(model, likelihood, train_x_normalized, train_y_normalized, kernel_type, n_features=self.ts_features, generator=self.generator)
+                    for candidate_idx, candidate_x in self._iter_chunks(scoring_candidates):
+                        acq_values = -(sample((candidate_x - x_min) / x_range) * y_std + y_median)
+                        self._update_best(best_values, next_x_idx, acquisition_type, acq_values, candidate_idx)
+
+            return self._collect_next_points(next_x_idx, box_points, filtered_candidate_x, filtered_candidate_y, objective)
+
+    def _collect_next_points(self, next_x_idx, box_points, filtered_candidate_x, filtered_candidate_y, objective):
+        """{acquisition_type: (next_x, next_y, next_x_idx)} from the selected indices (box_points for a ContinuousBox)"""
+        next_points, evaluated = {}, {}
+        for acquisition_type, idx in next_x_idx.items():
+            if isinstance(filtered_candidate_x, ContinuousBox):
+                next_x = box_points[acquisition_type]
+            elif isinstance(filtered_candidate_x, CandidateSet):
+                next_x = filtered_candidate_x.points(idx)
+            else:
+                next_x = filtered_candidate_x[idx].unsqueeze(0)
+
+            # Generate train_y, evaluating the objective once per distinct point
+            if filtered_candidate_y is not None:
+                next_y = filtered_candidate_y[idx].unsqueeze(0).to(self.device)
+            elif isinstance(filtered_candidate_x, CandidatePool) and filtered_candidate_x.y is not None:
+                next_y = filtered_candidate_x.y[idx].unsqueeze(0).to(self.device)
+            elif objective is None:
+                next_y = None
+            else:
+                key = tuple(next_x.reshape(-1).tolist())
+                if key not in evaluated:
+                    evaluated[key] = objective(next_x).to(dtype=next_x.dtype)
+                next_y = evaluated[key]
+            next_points[acquisition_type] = (next_x, next_y, idx)
+
+        return next_points
+
+    def _get_next_idx_cached(self, cache, train_x, train_y, filtered_candidate_x, kernel_type, acquisition_type, backend):
+        """
+        Next candidate index from an AcquisitionCache: a full rescore with a newly fitted GP every
+        cache.full_rescore_every steps, otherwise the frozen GP conditioned on the new observations rescores only
+        the candidates near them and the stale candidates whose upper bound reaches the top.
+        """
+        if isinstance(train_x, ObservationStore):
+            obs_x, obs_y = train_x.x, train_x.y
+        else:
+            obs_x, obs_y = train_x, train_y
+        best_f = obs_y.min().item()
+        # the bounds of the stale scores need the stddev, PM included
+        with_variance = True
+
+        if cache.needs_full_rescore(filtered_candidate_x, kernel_type, acquisition_type, obs_x.shape[0]):
+            x_min, x_range, y_median, y_std, train_x_normalized, train_y_normalized = self.normalize_data(train_x, train_y)
+            # copies, because an ObservationStore normalizes into buffers that are overwritten on the next call
+            train_x_normalized, train_y_normalized = train_x_normalized.clone(), train_y_normalized.clone()
+            inducing_points = self._get_inducing_points(train_x_normalized, backend)
+            with torch.enable_grad():
+                model, likelihood = self._train_model(train_x_normalized=train_x_normalized, train_y_normalized=train_y_normalized, kernel_type=kernel_type, inducing_points=inducing_points)
+            model.eval()
+            likelihood.eval()
+            cache.reset(filtered_candidate_x, kernel_type, acquisition_type, model, likelihood, (x_min, x_range, y_median, y_std), obs_x.shape[0])
+            candidates = filtered_candidate_x
+        else:
+            # hyperparameters and normalization of the last full rescore
+            x_min, x_range, y_median, y_std = cache.normalization
+            train_x_normalized = (obs_x - x_min) / x_range
+            train_y_normalized = (obs_y - y_median) / y_std
+            new_x = obs_x[cache.n_train:]
+            cache.condition(train_x_normalized, train_y_normalized, train_x_normalized[cache.n_train:], train_y_normalized[cache.n_train:])
+            candidates = cache.local_candidates(filtered_candidate_x, new_x)
+
+        def rescore(candidates):
+            predictions = self._iter_predictions(model=cache.model, likelihood=cache.likelihood, kernel_type=kernel_type, filtered_candidate_x=candidates, x_min=x_min, x_range=x_range, train_x_normalized=train_x_normalized, train_y_normalized=train_y_normalized, with_variance=with_variance)
+            for candidate_idx, mean, stddev in predictions:
+                cache.update(candidate_idx, self._get_acq_values(acquisition_type=acquisition_type, best_f=best_f, mean=mean, stddev=stddev, y_median=y_median, y_std=y_std), mean, stddev)
+
+        def upper_bound(mean, stddev, slack):
+            """Largest acquisition value for a mean within slack of mean and a stddev of at most stddev"""
+            acq_values = self._get_acq_values(acquisition_type=acquisition_type, best_f=best_f, mean=mean - slack, stddev=stddev, y_median=y_median, y_std=y_std)
+            if acquisition_type == AcquisitionType.PI:
+                # PI tends to 1 as the stddev shrinks wherever the optimistic mean improves on best_f
+                acq_values = torch.where((mean - slack) * y_std + y_median < best_f, torch.ones_like(acq_values), acq_values)
+            return acq_values
+
+        rescore(candidates)
+        cache.bound_stale(upper_bound)
+        return cache.select(filtered_candidate_x, rescore)
+
+    def _get_inducing_points(self, train_x_normalized, backend):
+        """Initial inducing points if the (backend or self.backend) GP is SGPR and sparse at this size, else None"""
+        backend = backend or self.backend
+        if backend == GPBackend.SGPR and train_x_normalized.shape[0] > self.n_inducing_points:
+            # inducing points start at a random subset of the training points and are then optimized with the rest
+            idx = torch.randperm(train_x_normalized.shape[0], device=train_x_normalized.device, generator=self.generator)
+            return train_x_normalized[idx[:self.n_inducing_points]]
+        return None
+
+    def get_next_batch(self, train_x, train_y, filtered_candidate_x, filtered_candidate_y, kernel_type, acquisition_type, q, strategy=BatchStrategy.KRIGING_BELIEVER, objective=None, shortlist_size=8192, pending_x=None, backend=None):
+        """
+        q distinct points (batch_x (q, dim), batch_y (q,), batch_idx (q,)) to be evaluated in parallel, from one GP fit.
+        Every candidate is scored once and the moments of the shortlist_size best ones are kept (all of them for
+        smaller candidate sets); the points are then picked greedily from that shortlist:
+        KRIGING_BELIEVER and CONSTANT_LIAR add every pick to the GP as a fantasy observation (its posterior mean, or
+        the best observed value) with the hyperparameters held fixed, and the kept moments get a rank-one update.
+        LOCAL_PENALIZATION multiplies the acquisition by a penalizer around every pick, whose radius comes from
+        the Lipschitz constant of the posterior mean.
+        pending_x (k, dim) are points whose evaluation has not finished (AsyncOptimizer): they are fantasized or
+        penalized like earlier picks before the batch is picked. They must not be among the remaining candidates.
+        filtered_candidate_x is a tensor of candidate points or a CandidateSet (CandidateGrid, CandidatePool).
+        The GP is exact (the fantasy updates need its Cholesky factor): a (backend or self.backend) SGPR GP that would
+        be sparse at this size raises. batch_y is None without candidate y or objective.
+        """
+        if ACQUISITION_MOMENTS[acquisition_type] == ("sample",):
+            raise ValueError("Batch selection needs an acquisition function of the posterior moments")
+        if isinstance(filtered_candidate_x, ContinuousBox):
+            raise ValueError("Batch selection needs a CandidateSet or a tensor of candidate points")
+
+        x_min, x_range, y_median, y_std, train_x_normalized, train_y_normalized = self.normalize_data(train_x, train_y)
+        if (backend or self.backend) == GPBackend.SGPR and train_x_normalized.shape[0] > self.n_inducing_points:
+            raise ValueError("Batch selection needs an exact GP, not a sparse (SGPR) one")
+        if isinstance(train_x, ObservationStore):
+            best_f = train_x.y_min
+        else:
             best_f = train_y.min().item()
-            next_x_idx = self._get_next_idx(acquisition_type=acquisition_type, best_f=best_f, observed_pred=observed_pred, y_median=y_median, y_std=y_std)
-            next_x = filtered_candidate_x[next_x_idx].unsqueeze(0)
+        model, likelihood = self._train_model(train_x_normalized=train_x_normalized, train_y_normalized=train_y_normalized, kernel_type=kernel_type)
+        model.eval()
+        likelihood.eval()
+
+        with torch.no_grad():
+            # Every remaining candidate is scored once; the shortlist of the best ones keeps its moments
+            posterior = FantasyPosterior(model, likelihood, train_x_normalized, train_y_normalized, kernel_type)
+            candidate_idx, mean, variance, _ = self._score_shortlist(posterior, filtered_candidate_x, acquisition_type, best_f, x_min, x_range, y_median, y_std, shortlist_size)
+            candidate_x = filtered_candidate_x.points(candidate_idx) if isinstance(filtered_candidate_x, CandidateSet) else filtered_candidate_x[candidate_idx]
+            candidate_x = (candidate_x - x_min) / x_range
+            if strategy == BatchStrategy.LOCAL_PENALIZATION:
+                log_penalty = torch.zeros_like(mean)
+                best_value = torch.min(train_y_normalized.min(), mean.min())
+                lipschitz = self._lipschitz_constant(posterior, candidate_x[:1024])
+            min_variance = gpytorch.settings.min_variance.value(variance.dtype)
+
+            def condition(x_new, mean_new, variance_new):
+                """Account for a point that is picked or pending: a penalizer around it, or a fantasy observation"""
+                if strategy == BatchStrategy.LOCAL_PENALIZATION:
+                    # penalizer: probability that the point's value plus lipschitz * distance is above the best value,
+                    # taken below every posterior mean so that every point excludes a ball
+                    dist = torch.cdist(candidate_x, x_new).squeeze(-1)
+                    log_penalty.add_(torch.special.log_ndtr((lipschitz * dist + best_value - mean_new) / variance_new.sqrt()))
+                else:
+                    # fantasy observation and rank-one update of the kept moments
+                    if strategy == BatchStrategy.KRIGING_BELIEVER:
+                        y_fantasy = mean_new
+                    else:
+                        y_fantasy = train_y_normalized.min()
+                    w, s = posterior.fantasize(x_new)
+                    cov = posterior.posterior_covariance(candidate_x, x_new, w)
+                    mean.add_(cov * (y_fantasy - mean_new) / s)
+                    variance.sub_(cov ** 2 / s).clamp_(min=min_variance)
+                    posterior.add(x_new, y_fantasy, w, s)
 
-            # Generate train_y
+            # Points still being evaluated are accounted for like earlier picks
+            if pending_x is not None:
+                for x_pending in (pending_x.reshape(-1, candidate_x.shape[1]) - x_min) / x_range:
+                    x_pending = x_pending.unsqueeze(0)
+                    mean_pending, variance_pending = posterior.predict_points(x_pending)
+                    condition(x_pending, mean_pending[0], variance_pending[0])
+
+            picks = []
+            for _ in range(min(q, candidate_idx.shape[0])):
+                acq_values = self._get_acq_values(acquisition_type=acquisition_type, best_f=best_f, mean=mean, stddev=variance.sqrt(), y_median=y_median, y_std=y_std)
+                if strategy == BatchStrategy.LOCAL_PENALIZATION:
+                    # product of the acquisition and the penalizers, in log space; EI and PI are already positive
+                    if acquisition_type in (AcquisitionType.EI, AcquisitionType.PI):
+                        acq_values = acq_values.clamp_min(1e-300).log()
+                    else:
+                        acq_values = torch.nn.functional.softplus(acq_values).clamp_min(1e-300).log()
+                    acq_values = acq_values + log_penalty
+                acq_values[picks] = -math.inf
+                pick = int(torch.argmax(acq_values))
+                picks.append(pick)
+                if len(picks) < min(q, candidate_idx.shape[0]):
+                    condition(candidate_x[pick].unsqueeze(0), mean[pick].clone(), variance[pick].clone())
+
+            batch_idx = candidate_idx[picks]
+            batch_x = filtered_candidate_x.points(batch_idx) if isinstance(filtered_candidate_x, CandidateSet) else filtered_candidate_x[batch_idx]
             if filtered_candidate_y is not None:
-                next_y = filtered_candidate_y[next_x_idx].unsqueeze(0).to(self.device)
+                batch_y = filtered_candidate_y[batch_idx].to(self.device)
+            elif isinstance(filtered_candidate_x, CandidatePool) and filtered_candidate_x.y is not None:
+                batch_y = filtered_candidate_x.y[batch_idx].to(self.device)
+            elif objective is not None:
+                batch_y = objective(batch_x).to(dtype=batch_x.dtype)
+            else:
+                batch_y = None
+
+        return batch_x, batch_y, batch_idx
+
+    def get_shortlist(self, train_x, train_y, filtered_candidate_x, kernel_type, acquisition_type, shortlist_size=1024, backend=None, cost_model=None):
+        """
+        Indices of the shortlist_size candidates with the largest acquisition values, best first, from one GP fit
+        (backend overrides self.backend, as in get_next_points). AcquisitionType.TS ranks the candidates by one
+        posterior sample path; the cost-aware acquisitions (COST_ACQUISITIONS) need a cost_model.
+        filtered_candidate_x is a tensor of candidate points or a CandidateSet (CandidateGrid, CandidatePool).
+        """
+        if isinstance(filtered_candidate_x, ContinuousBox):
+            raise ValueError("A shortlist needs a CandidateSet or a tensor of candidate points")
+        if acquisition_type in COST_ACQUISITIONS:
+            if cost_model is None:
+                raise ValueError("Cost-aware acquisition functions need a cost_model")
+            cost_model.fit()
+
+        x_min, x_range, y_median, y_std, train_x_normalized, train_y_normalized = self.normalize_data(train_x, train_y)
+        if isinstance(train_x, ObservationStore):
+            best_f = train_x.y_min
+        else:
+            best_f = train_y.min().item()
+        inducing_points = self._get_inducing_points(train_x_normalized, backend)
+        model, likelihood = self._train_model(train_x_normalized=train_x_normalized, train_y_normalized=train_y_normalized, kernel_type=kernel_type, inducing_points=inducing_points)
+        model.eval()
+        likelihood.eval()
+
+        candidate_idx, acq_values = [], []
+
+        def keep(idx, chunk_acq_values):
+            """Keep the shortlist_size best candidates of a chunk"""
+            if chunk_acq_values.shape[0] > shortlist_size:
+                top = torch.topk(chunk_acq_values, shortlist_size).indices
+                idx, chunk_acq_values = idx[top], chunk_acq_values[top]
+            candidate_idx.append(idx)
+            acq_values.append(chunk_acq_values)
+
+        with torch.no_grad(), gpytorch.settings.fast_pred_var():
+            if ACQUISITION_MOMENTS[acquisition_type] == ("sample",):
+                sample = RandomFourierSample(model, likelihood, train_x_normalized, train_y_normalized, kernel_type, n_features=self.ts_features, generator=self.generator)
+                for idx, x in self._iter_chunks(filtered_candidate_x):
+                    keep(idx, -(sample((x - x_min) / x_range) * y_std + y_median))
             else:
-                next_y = objective(next_x).to(dtype=next_x.dtype)
+                with_variance = not self.plan_moments or "variance" in ACQUISITION_MOMENTS[acquisition_type]
+                predictions = self._iter_predictions(model=model, likelihood=likelihood, kernel_type=kernel_type, filtered_candidate_x=filtered_candidate_x, x_min=x_min, x_range=x_range, train_x_normalized=train_x_normalized, train_y_normalized=train_y_normalized, with_variance=with_variance)
+                for idx, mean, stddev in predictions:
+                    chunk_acq_values = self._get_acq_values(acquisition_type=COST_ACQUISITIONS.get(acquisition_type, acquisition_type), best_f=best_f, mean=mean, stddev=stddev, y_median=y_median, y_std=y_std)
+                    if acquisition_type in COST_ACQUISITIONS:
+                        chunk_acq_values = chunk_acq_values / cost_model.predict(filtered_candidate_x, idx).to(chunk_acq_values.dtype)
+                    keep(idx, chunk_acq_values)
+        if not candidate_idx:
+            raise ValueError("No remaining candidate")
+        acq_values = torch.cat(acq_values)
+        return torch.cat(candidate_idx)[torch.topk(acq_values, min(shortlist_size, acq_values.shape[0])).indices]
+
+    def _score_shortlist(self, posterior, filtered_candidate_x, acquisition_type, best_f, x_min, x_range, y_median, y_std, shortlist_size):
+        """(candidate_idx, mean, variance, acq_values) of the shortlist_size best candidates, best first"""
+        candidate_idx, mean, variance, acq_values = [], [], [], []
+        for idx, x in self._iter_chunks(filtered_candidate_x):
+            chunk_mean, chunk_variance = posterior.predict_points((x - x_min) / x_range)
+            chunk_acq_values = self._get_acq_values(acquisition_type=acquisition_type, best_f=best_f, mean=chunk_mean, stddev=chunk_variance.sqrt(), y_median=y_median, y_std=y_std)
+            if chunk_acq_values.shape[0] > shortlist_size:
+                top = torch.topk(chunk_acq_values, shortlist_size).indices
+                idx, chunk_mean, chunk_variance, chunk_acq_values = idx[top], chunk_mean[top], chunk_variance[top], chunk_acq_values[top]
+            candidate_idx.append(idx)
+            mean.append(chunk_mean)
+            variance.append(chunk_variance)
+            acq_values.append(chunk_acq_values)
+        if not candidate_idx:
+            raise ValueError("No remaining candidate")
+        acq_values = torch.cat(acq_values)
+        top = torch.topk(acq_values, min(shortlist_size, acq_values.shape[0])).indices
+        return torch.cat(candidate_idx)[top], torch.cat(mean)[top], torch.cat(variance)[top], acq_values[top]
+
+    @staticmethod
+    def _lipschitz_constant(posterior, x):
+        """Largest gradient norm of the posterior mean over the rows of x (normalized x and y), at least 1e-7"""
+        with torch.enable_grad():
+            x = x.clone().requires_grad_(True)
+            mean, _ = posterior.predict_points(x, with_variance=False)
+            grad, = torch.autograd.grad(mean.sum(), x)
+        return grad.nan_to_num(0.0).norm(dim=1).max().clamp_min(1e-7)
+
+    def _optimize_box(self, model, likelihood, kernel_type, box, acquisition_type, best_f, x_min, x_range, y_median, y_std, train_x_normalized, train_y_normalized):
+        """
+        Next point (1, dim) in a ContinuousBox: the acquisition is scored at n_raw_samples Sobol points, and the best
+        n_restarts are refined together by L-BFGS-B on the sum of their acquisition values (the restarts are
+        independent, so this is a batched multi-start) with gradients by autograd through the posterior.
+        With snap_axes, the local optima and their axis neighbours are snapped to the grid and the best grid point
+        that has not been evaluated is returned.
+        """
+        if ACQUISITION_MOMENTS[acquisition_type] == ("sample",):
+            sample = RandomFourierSample(model, likelihood, train_x_normalized, train_y_normalized, kernel_type, n_features=self.ts_features, generator=self.generator)
+        with_variance = not self.plan_moments or "variance" in ACQUISITION_MOMENTS[acquisition_type]
 
-        # Remove unnecessary variables to free memory
-        del candidate_x_normalized, observed_pred
-        gc.collect()
-        if torch.cuda.is_available():
-            torch.cuda.empty_cache()
+        def acquisition(x):
+            x_normalized = (x - x_min) / x_range
+            if ACQUISITION_MOMENTS[acquisition_type] == ("sample",):
+                return -(sample(x_normalized) * y_std + y_median)
+            observed_pred = likelihood(model(x_normalized))
+            stddev = observed_pred.variance.sqrt() if with_variance else None
+            return self._get_acq_values(acquisition_type=acquisition_type, best_f=best_f, mean=observed_pred.mean, stddev=stddev, y_median=y_median, y_std=y_std)
 
-        return next_x, next_y, next_x_idx
+        # Starting points: the best Sobol points
+        sobol = SobolEngine(box.dim, scramble=True, seed=int(torch.randint(2**31 - 1, (1,), generator=self.generator)))
+        raw_x = box.lower + (box.upper - box.lower) * sobol.draw(self.n_raw_samples, dtype=box.lower.dtype).to(box.device)
+        raw_values = torch.cat([acquisition(chunk) for chunk in raw_x.split(self.chunk_size)])
+        start_x = raw_x[torch.topk(raw_values, min(self.n_restarts, self.n_raw_samples)).indices]
+
+        def loss_and_grad(flat_x):
+            x = torch.from_numpy(flat_x).to(device=box.device, dtype=box.lower.dtype).reshape(start_x.shape).requires_grad_(True)
+            with torch.enable_grad():
+                loss = -acquisition(x).sum()
+                grad, = torch.autograd.grad(loss, x)
+            return loss.item(), grad.reshape(-1).cpu().numpy()
+
+        bounds = list(zip(box.lower.repeat(start_x.shape[0]).tolist(), box.upper.repeat(start_x.shape[0]).tolist()))
+        result = minimize(loss_and_grad, start_x.reshape(-1).cpu().numpy(), jac=True, method='L-BFGS-B', bounds=bounds, options={'maxiter': self.box_max_iter})
+        local_x = torch.from_numpy(result.x).to(device=box.device, dtype=box.lower.dtype).reshape(start_x.shape)
+        local_x = torch.min(torch.max(local_x, box.lower), box.upper)
+        if box.snap_axes is None:
+            return local_x[torch.argmax(acquisition(local_x))].unsqueeze(0)
+
+        # Snap to the grid: the nearest grid points of the local optima and their neighbours, unless already evaluated
+        coords = box.snap(local_x)
+        coords = torch.unique(torch.cat([coords, box.neighbors(coords)]), dim=0)
+        coords = coords[~box.is_evaluated(coords)]
+        if coords.shape[0] == 0:
+            # every grid point near the local optima is evaluated: fall back to the best remaining raw sample
+            coords = box.snap(raw_x[torch.argsort(raw_values, descending=True)])
+            coords = coords[~box.is_evaluated(coords)][:1]
+            if coords.shape[0] == 0:
+                raise ValueError("No unevaluated grid point found near the acquisition optima")
+        grid_x = box.points(coords)
+        return grid_x[torch.argmax(acquisition(grid_x))].unsqueeze(0)
+
+    def _iter_chunks(self, filtered_candidate_x):
+        """(candidate indices, candidate points) chunks of a CandidateSet, or a tensor of candidates as one chunk"""
+        if isinstance(filtered_candidate_x, CandidateSet):
+            return filtered_candidate_x.iter_chunks(self.chunk_size)
+        return [(torch.arange(filtered_candidate_x.shape[0], device=filtered_candidate_x.device), filtered_candidate_x)]
+
+    @staticmethod
+    def _update_best(best_values, next_x_idx, acquisition_type, acq_values, candidate_idx):
+        """Keep the candidate with the largest acquisition value seen so far"""
+        chunk_idx = torch.argmax(acq_values)
+        if acquisition_type not in best_values or acq_values[chunk_idx] > best_values[acquisition_type]:
+            best_values[acquisition_type] = acq_values[chunk_idx]
+            next_x_idx[acquisition_type] = candidate_idx[chunk_idx]
+
+    def _iter_predictions(self, model, likelihood, kernel_type, filtered_candidate_x, x_min, x_range, train_x_normalized, train_y_normalized, distance_cache=None, with_variance=True):
+        """
+        Yield (candidate indices, mean, stddev) of the predictive posterior in the normalized y space, chunk by chunk.
+        stddev is None if not with_variance: only the mean (one solve against the train targets) is computed.
+        With Precision.MIXED the predictions come from a GPPosterior whose cross-covariance is computed in float32.
+        KernelType.WENDLAND predictions come from a CompactSupportPosterior (sparse neighbour cross-covariance)
+        when its training covariance is sparse enough.
+        """
+        chunks = self._iter_chunks(filtered_candidate_x)
+        scoring_dtype = torch.float32 if self.precision == Precision.MIXED else train_x_normalized.dtype
+        compact_posterior = None
+        if distance_cache is None and not model.sparse and kernel_type == KernelType.WENDLAND:
+            # pays_off is decided from a neighbour count, the training covariance is only factorized if it is used
+            compact_posterior = CompactSupportPosterior(model, likelihood, train_x_normalized, train_y_normalized)
+            if not compact_posterior.pays_off:
+                compact_posterior = None
+
+        if distance_cache is not None:
+            for candidate_idx, _ in chunks:
+                # Keep the joint kernel lazy: only the candidate-train block and the candidate variances are read
+                with gpytorch.settings.max_eager_kernel_size(0), gpytorch.settings.skip_posterior_variances(not with_variance):
+                    observed_pred = likelihood(model(candidate_idx.to(train_y_normalized.dtype).unsqueeze(-1)))
+                    mean, stddev = observed_pred.mean, observed_pred.stddev if with_variance else None
+                yield candidate_idx, mean, stddev
+        elif compact_posterior is not None:
+            # Compactly supported kernel with a short lengthscale: sparse cross-covariance from a neighbour search
+            for candidate_idx, candidate_x in chunks:
+                mean, variance = compact_posterior.predict_points((candidate_x - x_min) / x_range, with_variance=with_variance)
+                yield candidate_idx, mean, variance.sqrt() if with_variance else None
+        elif not model.sparse and self.kronecker_grid and isinstance(filtered_candidate_x, CandidateGrid) and kernel_type == KernelType.RBF:
+            # Separable RBF kernel on a Cartesian grid: mean and variance from per-dimension kernel blocks
+            posterior = GPPosterior(model, likelihood, train_x_normalized, train_y_normalized, kernel_type, dtype=scoring_dtype)
+            for candidate_idx, mean, variance in posterior.iter_rbf_grid(filtered_candidate_x, x_min, x_range, self.chunk_size, with_variance=with_variance):
+                yield candidate_idx, mean, variance.sqrt() if with_variance else None
+        elif not model.sparse and self.precision == Precision.MIXED:
+            posterior = GPPosterior(model, likelihood, train_x_normalized, train_y_normalized, kernel_type, dtype=scoring_dtype)
+            for candidate_idx, candidate_x in chunks:
+                mean, variance = posterior.predict_points((candidate_x - x_min) / x_range, with_variance=with_variance)
+                yield candidate_idx, mean, variance.sqrt() if with_variance else None
+        else:
+            for candidate_idx, candidate_x in chunks:
+                with gpytorch.settings.skip_posterior_variances(not with_variance):
+                    observed_pred = likelihood(model((candidate_x - x_min) / x_range))
+                    mean, stddev = observed_pred.mean, observed_pred.stddev if with_variance else None
+                yield candidate_idx, mean, stddev
 
     @staticmethod
     def normalize_data(train_x, train_y):
         """
         Normaize data: x is min-max normalized to [0, 1], y is standardized with median and std
+        An ObservationStore is normalized from its cached statistics (train_y is then ignored).
         """
+        if isinstance(train_x, ObservationStore):
+            return train_x.normalize()
+
         # x is min-max normalized to [0, 1]
         x_min = train_x.min(dim=0)[0]
         x_max = train_x.max(dim=0)[0]
@@ -75,29 +612,38 @@ class BayesianOptimizer:
         y_median = train_y.median()
         y_std = train_y.std()
         if y_std < 1e-6:
-            y_std = torch.tensor(1e-6)
+            y_std = torch.tensor(1e-6, dtype=train_y.dtype, device=train_y.device)
         train_y_normalized = (train_y - y_median) / y_std
 
         return x_min, x_range, y_median, y_std, train_x_normalized, train_y_normalized
 
     @staticmethod
-    def _train_model(train_x_normalized, train_y_normalized, kernel_type):
-        # Constraints for the GP model
-        noise_constraint = Interval(5e-4, 0.2)
-        lengthscale_constraint = Interval(5*1e-6, math.sqrt(train_x_normalized.shape[1]))
-        outputscale_constraint = Interval(0.05, 20.0)
+    def _get_distance_cache(train_x, filtered_candidate_x):
+        """Distance cache of the candidate pool if every training point is a pool row and the cache has room for them"""
+        if not isinstance(filtered_candidate_x, CandidatePool) or filtered_candidate_x.distance_cache is None:
+            return None
+        if not isinstance(train_x, ObservationStore) or (train_x.idx < 0).any():
+            return None
+        if not filtered_candidate_x.distance_cache.fits(train_x.idx):
+            return None
+        return filtered_candidate_x.distance_cache
 
-        # GP Model
-        likelihood = GaussianLikelihood(noise_constraint=noise_constraint).to(device=train_x_normalized.device, dtype=train_y_normalized.dtype)
-        model = GPModel(train_x_normalized, train_y_normalized, likelihood, kernel_type=kernel_type,  lengthscale_constraint=lengthscale_constraint, outputscale_constraint=outputscale_constraint)
+    def _train_model(self, train_x_normalized, train_y_normalized, kernel_type, pool_distances=None, inducing_points=None):
+        """
+        pool_distances = (distance_cache, train_idx, x_range) fits a PoolDistanceKernel,
+        train_x_normalized then holds the pool row indices of the training points.
+        inducing_points = (m, dim) initial inducing points fits an SGPR model.
+        """
+        model, likelihood, mll, optimizer = self._get_model(train_x_normalized=train_x_normalized, train_y_normalized=train_y_normalized, kernel_type=kernel_type, pool_distances=pool_distances, inducing_points=inducing_points)
 
         # Model training
         model.train()
         likelihood.train()
-        mll = gpytorch.mlls.ExactMarginalLogLikelihood(likelihood, model)
-        lr = 0.05
         max_iter = 50
-        optimizer = torch.optim.Adam(model.parameters(), lr=lr)
+        if self.compile_steps and pool_distances is None and inducing_points is None:
+            self._fit_compiled(model=model, likelihood=likelihood, optimizer=optimizer, train_x_normalized=train_x_normalized, train_y_normalized=train_y_normalized, kernel_type=kernel_type, max_iter=max_iter)
+            return model, likelihood
+
         for i in range(max_iter):
             optimizer.zero_grad()
             output = model(train_x_normalized)
@@ -109,50 +655,115 @@ class BayesianOptimizer:
 
         return model, likelihood
 
-    def _get_next_idx(self, acquisition_type, best_f, observed_pred, y_median, y_std):
+    def _fit_compiled(self, model, likelihood, optimizer, train_x_normalized, train_y_normalized, kernel_type, max_iter):
+        """Same training loop on the compiled exact_mll_loss; the optimizer updates the parameters of model and likelihood"""
+        loss_fn = self._compiled_steps.loss(kernel_type)
+        padded_x, padded_y, mask = pad_training_data(train_x_normalized, train_y_normalized)
+        # n as a tensor, so that every n in a size bucket shares one graph
+        n = torch.tensor(float(train_x_normalized.shape[0]), dtype=train_x_normalized.dtype, device=train_x_normalized.device)
+        base_kernel = model.covar_module.base_kernel
+        for i in range(max_iter):
+            optimizer.zero_grad()
+            alpha = base_kernel.alpha.squeeze() if kernel_type == KernelType.RQ else None
+            loss = loss_fn(padded_x, padded_y, mask, n, base_kernel.lengthscale.squeeze(), model.covar_module.outputscale, likelihood.noise.squeeze(), model.mean_module.constant, alpha)
+            if torch.isnan(loss):
+                break
+            loss.backward()
+            optimizer.step()
+
+    def _get_model(self, train_x_normalized, train_y_normalized, kernel_type, pool_distances=None, inducing_points=None):
+        """GP model, likelihood, mll and optimizer for the training data, taken from the model pool if possible"""
+        if pool_distances is not None:
+            distance_cache, train_idx, x_range = pool_distances
+            dim = distance_cache.x.shape[1]
+        else:
+            dim = train_x_normalized.shape[1]
+        n_inducing = None if inducing_points is None else inducing_points.shape[0]
+        key = (kernel_type, dim, train_x_normalized.device, train_x_normalized.dtype, pool_distances is not None, n_inducing)
+        is_new = False
+        if self.reuse_models and key in self._model_pool:
+            model, likelihood, mll, optimizer, initial_state = self._model_pool[key]
+            model.set_train_data(inputs=train_x_normalized, targets=train_y_normalized, strict=False)
+            if not self.keep_model_state:
+                model.load_state_dict(initial_state)
+                optimizer.state.clear()
+                if inducing_points is not None:
+                    model.covar_module.inducing_points.data.copy_(inducing_points)
+        else:
+            model, likelihood, mll, optimizer = self._build_model(train_x_normalized, train_y_normalized, kernel_type, dim, pool_distances is not None, inducing_points)
+            if self.reuse_models:
+                self._model_pool[key] = (model, likelihood, mll, optimizer, copy.deepcopy(model.state_dict()))
+            is_new = True
+        # Warm start: the fit starts from the given hyperparameters instead of the default initialization
+        if kernel_type in self.initial_hyperparameters and (is_new or not self.keep_model_state):
+            hyperparameters = self.initial_hyperparameters[kernel_type]
+            model.scale_kernel.base_kernel.lengthscale = hyperparameters['lengthscale']
+            model.scale_kernel.outputscale = hyperparameters['outputscale']
+            likelihood.noise = hyperparameters['noise']
+
+        if pool_distances is not None:
+            # squared distances for this step's normalization, computed once and shared by every training iteration
+            model.covar_module.base_kernel.set_distances(train_idx, distance_cache.scaled_sq_dist(train_idx, x_range))
+
+        return model, likelihood, mll, optimizer
+
+    @staticmethod
+    def _build_model(train_x_normalized, train_y_normalized, kernel_type, dim, pool_distances=False, inducing_points=None):
+        # Constraints for the GP model
+        noise_constraint = Interval(5e-4, 0.2)
+        lengthscale_constraint = Interval(5*1e-6, math.sqrt(dim))
+        outputscale_constraint = Interval(0.05, 20.0)
+
+        # GP Model
+        likelihood = GaussianLikelihood(noise_constraint=noise_constraint).to(device=train_x_normalized.device, dtype=train_y_normalized.dtype)
+        model = GPModel(train_x_normalized, train_y_normalized, likelihood, kernel_type=kernel_type,  lengthscale_constraint=lengthscale_constraint, outputscale_constraint=outputscale_constraint, pool_distances=pool_distances, inducing_points=inducing_points, dim=dim)
+        mll = gpytorch.mlls.ExactMarginalLogLikelihood(likelihood, model)
+        lr = 0.05
+        optimizer = torch.optim.Adam(model.parameters(), lr=lr)
+
+        return model, likelihood, mll, optimizer
+
+    def _get_acq_values(self, acquisition_type, best_f, mean, stddev, y_median, y_std):
+        """
+        Acquisition values signed so that the next point is always the argmax.
+        mean and stddev are the predictions in the normalized y space (stddev may be None for PM).
+        """
         # Denormalize predictions
         # Assume minimization problem. Should be modified if applied to maximization problem
-        mean = observed_pred.mean * y_std + y_median
-        stddev = observed_pred.stddev * y_std
+        mean = mean * y_std + y_median
+        if stddev is not None:
+            stddev = stddev * y_std
         if acquisition_type == AcquisitionType.EI:
             acq_values = self._expected_improvement(best_f=best_f, mean=mean, sigma=stddev)
-            next_x_idx = torch.argmax(acq_values)
         elif acquisition_type == AcquisitionType.PI:
             acq_values = self._probability_improvement(best_f=best_f, mean=mean, sigma=stddev)
-            next_x_idx = torch.argmax(acq_values)
         elif acquisition_type == AcquisitionType.PM:
-            acq_values = self._posterior_mean(mean=mean)
-            next_x_idx = torch.argmin(acq_values)
+            acq_values = -self._posterior_mean(mean=mean)
         elif acquisition_type == AcquisitionType.UCB:
-            acq_values = self._upper_confidence_bound(mean=mean, sigma=stddev)
-            next_x_idx = torch.argmin(acq_values)
+            acq_values = -self._upper_confidence_bound(mean=mean, sigma=stddev)
         else:
             raise ValueError("Unsupported acquisition type")
 
-        return next_x_idx
-
+        return acq_values
 
     @staticmethod
     def _expected_improvement(best_f, mean, sigma, epsilon=0):
         """Expected Improvement acquisition function"""
-        with torch.no_grad():
-            z = (best_f - mean - epsilon) / sigma
-            cdf = 0.5 * (1 + torch.erf(z / math.sqrt(2)))
-            pdf = torch.exp(-0.5 * z**2) / math.sqrt(2 * math.pi)
-            return (best_f - mean - epsilon) * cdf + sigma * pdf
+        z = (best_f - mean - epsilon) / sigma
+        cdf = 0.5 * (1 + torch.erf(z / math.sqrt(2)))
+        pdf = torch.exp(-0.5 * z**2) / math.sqrt(2 * math.pi)
+        return (best_f - mean - epsilon) * cdf + sigma * pdf
 
     @staticmethod
     def _probability_improvement(best_f, mean, sigma, epsilon=0):
         """Probability of Improvement acquisition function"""
-        with torch.no_grad():
-            z = (best_f - mean - epsilon) / sigma
-            return 0.5 * (1 + torch.erf(z / math.sqrt(2)))
+        z = (best_f - mean - epsilon) / sigma
+        return 0.5 * (1 + torch.erf(z / math.sqrt(2)))
 
     @staticmethod
     def _upper_confidence_bound(mean, sigma, kappa=0.1):
         """Upper Confidence Bound acquisition function"""
-        with torch.no_grad():
-            return mean - kappa * sigma
+        return mean - kappa * sigma
 
     @staticmethod
     def _posterior_mean(mean):
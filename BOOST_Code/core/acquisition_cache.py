@@ -0,0 +1,126 @@
+import copy
+import math
+
+import torch
+
+from core.candidates import CandidateSubset
+from core.kernels_and_acquisitions import stationary_covariance
+
+
+class AcquisitionCache:
+    """
+    Acquisition values of the candidates of one CandidateGrid or CandidatePool kept across steps,
+    for BayesianOptimizer.get_next_point(acquisition_cache=...).
+    A full rescore fits the GP and scores every remaining candidate. For the next full_rescore_every - 1 steps the
+    hyperparameters and the normalization stay fixed: the new observations are added to the frozen GP without
+    training and the candidates within the kernel radius of them (where the correlation is still above tol) are
+    rescored. Every other candidate is ranked by an upper bound of its acquisition value: conditioning on new
+    observations with residuals r and predictive covariance S moves the mean at x by at most stddev(x) * drift,
+    drift = sqrt(r^T S^-1 r) (Cauchy-Schwarz), and only shrinks the stddev; drifts add up over the steps since the
+    candidate was scored. The next point is taken lazily from the top: stale candidates at the top are rescored
+    batch_size at a time until the top candidate is fresh, so it is the pick of a full rescore of the frozen GP.
+    Only the hyperparameters and the normalization lag, until the next full rescore.
+    """
+    def __init__(self, full_rescore_every=10, tol=1e-3, batch_size=256):
+        self.full_rescore_every = full_rescore_every
+        self.tol = tol
+        self.batch_size = batch_size
+
+        self.candidates = None
+        self.key = None
+        self.model = None
+        self.likelihood = None
+        self.normalization = None
+        self.radius = None
+        # one score per candidate index (-inf for evaluated candidates) and whether it is exact for this step;
+        # otherwise it is an upper bound from the moments (normalized) and the total drift when it was scored
+        self.scores = None
+        self.fresh = None
+        self.mean = None
+        self.stddev = None
+        self.drift_at = None
+        self.drift = 0.0
+        self.n_train = 0
+        self.n_steps = 0
+        # number of candidates scored, for benchmarks
+        self.n_scored = 0
+
+    def needs_full_rescore(self, filtered_candidate_x, kernel_type, acquisition_type, n_train):
+        """True if the cache has to be rebuilt: new candidates, kernel or acquisition, or the rescore period is over"""
+        self.n_steps += 1
+        if self.candidates is not filtered_candidate_x or self.key != (kernel_type, acquisition_type):
+            return True
+        return (self.n_steps - 1) % self.full_rescore_every == 0 or n_train < self.n_train
+
+    def reset(self, filtered_candidate_x, kernel_type, acquisition_type, model, likelihood, normalization, n_train):
+        """Freeze a copy of the fitted model and the normalization (x_min, x_range, y_median, y_std)"""
+        self.candidates = filtered_candidate_x
+        self.key = (kernel_type, acquisition_type)
+        self.model = copy.deepcopy(model)
+        self.likelihood = copy.deepcopy(likelihood)
+        self.normalization = normalization
+        self.n_train = n_train
+        self.n_steps = 1
+        self.radius = self.kernel_radius(kernel_type, self.model.scale_kernel.base_kernel, normalization[1].shape[0])
+
+        self.scores = torch.full((filtered_candidate_x.n_total,), -math.inf, dtype=normalization[1].dtype, device=filtered_candidate_x.device)
+        self.fresh = torch.zeros(filtered_candidate_x.n_total, dtype=torch.bool, device=filtered_candidate_x.device)
+        self.mean = torch.zeros_like(self.scores)
+        self.stddev = torch.zeros_like(self.scores)
+        self.drift_at = torch.zeros_like(self.scores)
+        self.drift = 0.0
+
+    def kernel_radius(self, kernel_type, base_kernel, dim):
+        """Distance in the normalized x space beyond which the kernel correlation is below tol"""
+        alpha = base_kernel.alpha.item() if hasattr(base_kernel, 'alpha') else None
+        r = torch.linspace(0, 100, 100001, dtype=torch.double)
+        below = stationary_covariance(kernel_type, r ** 2, alpha=alpha, dim=dim) < self.tol
+        r_tol = r[below.nonzero()[0, 0]].item() if below.any() else math.inf
+        return r_tol * base_kernel.lengthscale.max().item()
+
+    def condition(self, train_x_normalized, train_y_normalized, new_x_normalized, new_y_normalized):
+        """Add the new observations to the frozen GP and add their drift; every score becomes stale"""
+        with torch.no_grad():
+            # residuals and predictive covariance of the new observations before they are added
+            predictive = self.likelihood(self.model(new_x_normalized))
+            residual = new_y_normalized - predictive.mean
+            self.drift += torch.sqrt(residual @ torch.linalg.solve(predictive.covariance_matrix, residual)).item()
+        self.model.set_train_data(inputs=train_x_normalized, targets=train_y_normalized, strict=False)
+        self.n_train = train_x_normalized.shape[0]
+        self.fresh.zero_()
+
+    def bound_stale(self, upper_bound):
+        """Replace the stale scores by upper_bound(mean, stddev, slack), slack bounding the change of the mean"""
+        stale = torch.nonzero(~self.fresh & torch.isfinite(self.scores)).reshape(-1)
+        slack = self.stddev[stale] * (self.drift - self.drift_at[stale])
+        self.scores[stale] = upper_bound(self.mean[stale], self.stddev[stale], slack).to(self.scores.dtype)
+
+    def local_candidates(self, filtered_candidate_x, new_x):
+        """Remaining candidates within the kernel radius of the new observations (a box around each of them)"""
+        half_width = self.radius * self.normalization[1]
+        idx = torch.cat([filtered_candidate_x.box_indices(x - half_width, x + half_width) for x in new_x])
+        return CandidateSubset(filtered_candidate_x, torch.unique(idx))
+
+    def update(self, idx, acq_values, mean, stddev):
+        self.scores[idx] = acq_values.to(self.scores.dtype)
+        self.mean[idx] = mean.to(self.mean.dtype)
+        self.stddev[idx] = stddev.to(self.stddev.dtype)
+        self.drift_at[idx] = self.drift
+        self.fresh[idx] = True
+        self.n_scored += idx.shape[0]
+
+    def select(self, filtered_candidate_x, rescore):
+        """Candidate index with the largest score; rescore(CandidateSubset) refreshes stale candidates at the top"""
+        while True:
+            top = torch.topk(self.scores, min(self.batch_size, self.scores.shape[0])).indices
+            top = top[torch.isfinite(self.scores[top])]
+            if top.shape[0] == 0:
+                raise ValueError("No remaining candidate in the acquisition cache")
+            # candidates evaluated since their score was stored
+            is_evaluated = torch.from_numpy(filtered_candidate_x.evaluated.contains(top.cpu().numpy())).to(top.device)
+            if is_evaluated.any():
+                self.scores[top[is_evaluated]] = -math.inf
+                continue
+            if self.fresh[top[0]]:
+                return top[0]
+            rescore(CandidateSubset(filtered_candidate_x, top[~self.fresh[top]]))
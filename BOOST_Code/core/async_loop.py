@@ -0,0 +1,131 @@
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import torch
+
+from core.candidates import CandidatePool
+from core.kernels_and_acquisitions import BatchStrategy
+
+
+def _evaluate(objective, x, duration):
+    """Process pool task: objective value of the rows of x after sleeping for duration seconds (simulated experiment)"""
+    if duration:
+        time.sleep(duration)
+    return torch.as_tensor(objective(x), dtype=x.dtype).reshape(-1)
+
+
+class Evaluator:
+    """Evaluates points for AsyncOptimizer.run: evaluate(x) is a coroutine returning the objective value (1,)"""
+    async def evaluate(self, x):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class ProcessPoolEvaluator(Evaluator):
+    """
+    Runs a picklable objective (e.g. a Benchmarks function) in a local process pool of max_workers processes.
+    duration(x) -> seconds simulates the run time of an experiment (None: the objective's own run time).
+    """
+    def __init__(self, objective, max_workers=4, duration=None):
+        self.objective = objective
+        self.duration = duration
+        self.executor = ProcessPoolExecutor(max_workers=max_workers)
+
+    async def evaluate(self, x):
+        duration = self.duration(x) if self.duration is not None else None
+        return await asyncio.get_running_loop().run_in_executor(self.executor, _evaluate, self.objective, x.cpu(), duration)
+
+    def close(self):
+        self.executor.shutdown()
+
+
+class ObjectiveEvaluator(Evaluator):
+    """
+    Runs an Objective adapter (core/objectives.py) on up to max_workers threads, so that its counters separate the
+    evaluation time from the optimizer time and a PROCESS_POOL objective applies its timeout to every evaluation
+    """
+    def __init__(self, objective, max_workers=4):
+        self.objective = objective
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    async def evaluate(self, x):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.objective, x)
+
+    def close(self):
+        self.executor.shutdown()
+
+
+class AsyncOptimizer:
+    """
+    Ask/tell interface of a BayesianOptimizer for evaluations that run concurrently and finish in any order.
+    ask() suggests a point while other evaluations are pending: the pending points are removed from the candidates
+    and fantasized (get_next_batch with pending_x, see BatchStrategy), so that neither they nor, for the fantasized
+    posterior, their close neighbours are suggested again. tell() records a result of any pending point.
+    run() keeps n_workers evaluations of an Evaluator in flight, calls ask() off the event loop and measures the
+    worker utilization.
+    """
+    def __init__(self, optimizer, candidates, observations, kernel_type, acquisition_type, strategy=BatchStrategy.KRIGING_BELIEVER):
+        self.optimizer = optimizer
+        self.candidates = candidates
+        self.observations = observations
+        self.kernel_type = kernel_type
+        self.acquisition_type = acquisition_type
+        self.strategy = strategy
+        # candidate index -> point (1, dim) of every evaluation that has not been told yet
+        self.pending = {}
+
+    def ask(self):
+        """Next point (1, dim) and its candidate index, given the observations and the pending points"""
+        pending_x = torch.cat(list(self.pending.values())) if self.pending else None
+        next_x, _, next_idx = self.optimizer.get_next_batch(
+            train_x=self.observations,
+            train_y=None,
+            filtered_candidate_x=self.candidates,
+            filtered_candidate_y=None,
+            kernel_type=self.kernel_type,
+            acquisition_type=self.acquisition_type,
+            q=1,
+            strategy=self.strategy,
+            pending_x=pending_x,
+        )
+        next_idx = int(next_idx[0])
+        self.candidates.remove(next_idx)
+        self.pending[next_idx] = next_x
+        return next_x, next_idx
+
+    def tell(self, idx, y):
+        """Record the objective value y of the pending point with candidate index idx"""
+        if idx not in self.pending:
+            raise ValueError(f"No pending point with index {idx}")
+        x = self.pending.pop(idx)
+        self.observations.append(x, torch.as_tensor(y, dtype=x.dtype, device=x.device), idx if isinstance(self.candidates, CandidatePool) else None)
+
+    async def run(self, evaluator, n_evaluations, n_workers):
+        """
+        Ask and evaluate until n_evaluations results are told, with up to n_workers evaluations in flight.
+        Returns {'wall_time', 'busy_time', 'utilization', 'optimizer_time'}: busy_time sums the time every evaluation
+        was in flight, utilization = busy_time / (n_workers * wall_time), optimizer_time is the time spent in ask().
+        """
+        in_flight = {}
+        n_asked, n_told, busy_time, optimizer_time = 0, 0, 0.0, 0.0
+        start = time.perf_counter()
+        while n_told < n_evaluations:
+            while len(in_flight) < n_workers and n_asked < n_evaluations:
+                asked = time.perf_counter()
+                # ask() fits the GP: it runs in a thread so that the event loop keeps serving the evaluations; tell()
+                # only runs after it returned, so the observations and candidates are not changed meanwhile
+                next_x, next_idx = await asyncio.to_thread(self.ask)
+                optimizer_time += time.perf_counter() - asked
+                in_flight[asyncio.ensure_future(evaluator.evaluate(next_x))] = (next_idx, time.perf_counter())
+                n_asked += 1
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                next_idx, submitted = in_flight.pop(task)
+                busy_time += time.perf_counter() - submitted
+                self.tell(next_idx, task.result())
+                n_told += 1
+        wall_time = time.perf_counter() - start
+        return {'wall_time': wall_time, 'busy_time': busy_time, 'utilization': busy_time / (n_workers * wall_time), 'optimizer_time': optimizer_time}
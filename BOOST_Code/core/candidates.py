@@ -0,0 +1,423 @@
+import copy
+import math
+
+import numpy as np
+import torch
+from scipy.spatial import cKDTree
+
+
+class Bitset:
+    """Packed boolean array with one bit per entry"""
+    def __init__(self, size):
+        self.size = size
+        self.bits = np.zeros((size + 7) // 8, dtype=np.uint8)
+
+    def add(self, idx):
+        idx = np.asarray(idx, dtype=np.int64).reshape(-1)
+        np.bitwise_or.at(self.bits, idx >> 3, np.left_shift(1, idx & 7).astype(np.uint8))
+
+    def contains(self, idx):
+        idx = np.asarray(idx, dtype=np.int64)
+        return ((self.bits[idx >> 3] >> (idx & 7)) & 1).astype(bool)
+
+    def unpack(self, start, stop):
+        """Boolean array for entries [start, stop). start must be a multiple of 8."""
+        return np.unpackbits(self.bits[start >> 3:(stop + 7) >> 3], bitorder='little')[:stop - start].astype(bool)
+
+    def copy(self):
+        new = copy.copy(self)
+        new.bits = self.bits.copy()
+        return new
+
+
+def nearest_axis_index(axis, values):
+    """Index of the nearest value of the increasing axis for each of values, by binary search"""
+    if axis.shape[0] == 1:
+        return torch.zeros(values.shape, dtype=torch.long, device=axis.device)
+    right = torch.searchsorted(axis, values.contiguous()).clamp(1, axis.shape[0] - 1)
+    left = right - 1
+    is_left = (values - axis[left]).abs() <= (axis[right] - values).abs()
+    return torch.where(is_left, left, right)
+
+
+class CandidateSet:
+    """
+    Base class of candidate sets scored chunk by chunk by BayesianOptimizer.get_next_point.
+    Candidates are addressed by a fixed integer index, and evaluated candidates are tracked in a bitset
+    so that removal is O(1). fork() gives an independent evaluated set while sharing the candidate data.
+    """
+    def __init__(self, n_total, device='cpu'):
+        self.device = torch.device(device)
+        self.n_total = n_total
+        self.evaluated = Bitset(self.n_total)
+        self.n_remaining = self.n_total
+
+    def __len__(self):
+        return self.n_remaining
+
+    def remove(self, idx):
+        """Mark candidates as evaluated"""
+        idx = np.unique(torch.as_tensor(idx).reshape(-1).cpu().numpy())
+        new_idx = idx[~self.evaluated.contains(idx)]
+        self.evaluated.add(new_idx)
+        self.n_remaining -= len(new_idx)
+
+    def points(self, idx):
+        """Candidate indices -> points of shape (n, dim)"""
+        raise NotImplementedError
+
+    def iter_chunks(self, chunk_size=65536):
+        """Yield (indices, points) of the remaining candidates"""
+        raise NotImplementedError
+
+    def fork(self):
+        """Copy with its own evaluated set. The candidate data is shared."""
+        new = copy.copy(self)
+        new.evaluated = self.evaluated.copy()
+        return new
+
+
+class CandidateGrid(CandidateSet):
+    """
+    Cartesian grid of candidate points that is never materialized.
+    Points are addressed by flat index in the same order as torch.cartesian_prod (last dimension varies fastest).
+    Every axis must be increasing. Flat indices are int64 and the evaluated bitset has one bit per grid point, so the
+    grid can have at most 2**62 points and 8 * max_bitset_bytes points; a ContinuousBox with snap_axes takes larger
+    grids.
+    """
+    def __init__(self, axes, device='cpu', max_bitset_bytes=2**32):
+        self.axes = [torch.as_tensor(axis, dtype=torch.double, device=device) for axis in axes]
+        self.shape = tuple(axis.shape[0] for axis in self.axes)
+        self.dim = len(self.axes)
+        n_total = math.prod(self.shape)
+        if n_total > 2**62:
+            raise ValueError(f"CandidateGrid of {n_total} points exceeds the 2**62 int64 flat indices; use a ContinuousBox with snap_axes")
+        if (n_total + 7) // 8 > max_bitset_bytes:
+            raise ValueError(f"CandidateGrid of {n_total} points needs a {(n_total + 7) // 8} byte evaluated bitset (max_bitset_bytes={max_bitset_bytes}); use a ContinuousBox with snap_axes")
+        super().__init__(n_total=n_total, device=device)
+        self.strides = torch.tensor(
+            [math.prod(self.shape[d + 1:]) for d in range(self.dim)], dtype=torch.long, device=self.device
+        )
+        self.sizes = torch.tensor(self.shape, dtype=torch.long, device=self.device)
+
+    @classmethod
+    def from_bounds(cls, bounds, n_grid, dim, device='cpu', max_bitset_bytes=2**32):
+        """Same grid as torch.linspace(bounds[0], bounds[1], n_grid) repeated over every dimension"""
+        axes = [torch.linspace(bounds[0], bounds[1], n_grid, dtype=torch.double) for _ in range(dim)]
+        return cls(axes, device=device, max_bitset_bytes=max_bitset_bytes)
+
+    def decode(self, flat_idx):
+        """Flat indices -> integer grid coordinates of shape (n, dim)"""
+        flat_idx = torch.as_tensor(flat_idx, dtype=torch.long, device=self.device).reshape(-1, 1)
+        return (flat_idx // self.strides) % self.sizes
+
+    def points(self, flat_idx):
+        """Flat indices -> grid points of shape (n, dim)"""
+        coords = self.decode(flat_idx)
+        return torch.stack([self.axes[d][coords[:, d]] for d in range(self.dim)], dim=1)
+
+    def encode(self, x, tol=1e-5):
+        """
+        Points -> flat indices (int64 keys of the integer grid coordinates).
+        Points farther than tol from every grid point are encoded as -1.
+        """
+        x = x.to(device=self.device, dtype=torch.double).reshape(-1, self.dim)
+        coords = torch.zeros(x.shape, dtype=torch.long, device=self.device)
+        sq_err = torch.zeros(x.shape[0], dtype=torch.double, device=self.device)
+        for d, axis in enumerate(self.axes):
+            coords[:, d] = nearest_axis_index(axis, x[:, d])
+            sq_err += (axis[coords[:, d]] - x[:, d]) ** 2
+        flat_idx = (coords * self.strides).sum(dim=1)
+
+        return torch.where(sq_err < tol ** 2, flat_idx, -1)
+
+    def nearest_indices(self, x, eps=0.0):
+        """Flat index of the grid point nearest to each row of x (evaluated or not); eps is unused (exact on a grid)"""
+        return self.encode(x, tol=math.inf)
+
+    def remove_points(self, x, tol=1e-5):
+        """Mark grid points closer than tol to any row of x as evaluated"""
+        flat_idx = self.encode(x, tol=tol)
+        self.remove(flat_idx[flat_idx >= 0])
+
+    def box_indices(self, lower, upper):
+        """Flat indices of the remaining grid points inside the box [lower, upper]"""
+        flat_idx = torch.zeros(1, dtype=torch.long, device=self.device)
+        for d, axis in enumerate(self.axes):
+            start = int(torch.searchsorted(axis, lower[d].to(axis.dtype).reshape(1)))
+            stop = int(torch.searchsorted(axis, upper[d].to(axis.dtype).reshape(1), right=True))
+            axis_idx = torch.arange(start, stop, device=self.device)
+            flat_idx = (flat_idx.unsqueeze(1) + axis_idx.unsqueeze(0) * self.strides[d]).reshape(-1)
+        return flat_idx[~torch.from_numpy(self.evaluated.contains(flat_idx.cpu().numpy())).to(self.device)]
+
+    def iter_chunks(self, chunk_size=65536):
+        """Yield (flat indices, points) of the remaining grid points, chunk_size grid positions at a time"""
+        chunk_size = max(8, chunk_size - chunk_size % 8)
+        for start in range(0, self.n_total, chunk_size):
+            stop = min(start + chunk_size, self.n_total)
+            is_evaluated = torch.from_numpy(self.evaluated.unpack(start, stop)).to(self.device)
+            flat_idx = torch.arange(start, stop, device=self.device)[~is_evaluated]
+            if flat_idx.shape[0] == 0:
+                continue
+            yield flat_idx, self.points(flat_idx)
+
+
+class PointIndex:
+    """KD-tree over a fixed set of points, used for off-grid (continuous) candidate pools"""
+    def __init__(self, points):
+        self.tree = cKDTree(points.detach().cpu().numpy())
+
+    def find(self, x, tol=1e-5):
+        """Index of the stored point closer than tol to each row of x, -1 if there is none"""
+        distances, idx = self.tree.query(x.detach().cpu().numpy().reshape(-1, self.tree.m), k=1, distance_upper_bound=tol)
+        return torch.as_tensor(np.where(np.isfinite(distances), idx, -1), dtype=torch.long)
+
+
+class PairwiseDistanceCache:
+    """
+    Per-dimension squared differences between pool rows, shared by every kernel, BOOST combination and iteration.
+    Rows are filled lazily for the pool rows that are used as training points. Since the min-max normalization
+    of x changes whenever a new point extends the range, the differences are stored per dimension and the weighted
+    sum is kept for the last scale only; it is recomputed from the differences when the scale changes.
+    A row costs n_pool * dim * element_size bytes (4.2 MB for 59k rows of 9 columns), so the budget is given in
+    rows: max_rows, e.g. the most training points of a run; without it, max_bytes sets it. Once the training points
+    no longer fit, the steps fall back to kernels on the points (see BayesianOptimizer._get_distance_cache).
+    """
+    def __init__(self, x, max_rows=None, max_bytes=2**28):
+        self.x = x
+        self.max_bytes = max_bytes
+        self._max_rows = max_rows
+        self.row_of = torch.full((x.shape[0],), -1, dtype=torch.long, device=x.device)
+        self.n_rows = 0
+        self.sq_diff = torch.empty((0, x.shape[0], x.shape[1]), dtype=x.dtype, device=x.device)
+        # squared distances weighted by the last scale, valid for the first n_scaled cache rows
+        self.scale = None
+        self.sq_dist = torch.empty((0, x.shape[0]), dtype=x.dtype, device=x.device)
+        self.n_scaled = 0
+
+    @property
+    def max_rows(self):
+        if self._max_rows is not None:
+            return self._max_rows
+        return self.max_bytes // (self.x.shape[0] * self.x.shape[1] * self.x.element_size())
+
+    def fits(self, rows):
+        """Whether caching the given pool rows keeps the cache within max_rows"""
+        missing = rows[self.row_of[rows] < 0]
+        if missing.shape[0] == 0:
+            return True
+        # a full cache needs no count of the new rows
+        if self.n_rows >= self.max_rows:
+            return False
+        return self.n_rows + torch.unique(missing).shape[0] <= self.max_rows
+
+    def fill(self, rows=None):
+        """Compute the rows that are not cached yet (all pool rows by default)"""
+        rows = torch.arange(self.x.shape[0], device=self.x.device) if rows is None else rows.reshape(-1)
+        new_rows = torch.unique(rows[self.row_of[rows] < 0])
+        if new_rows.shape[0] == 0:
+            return
+        n_new = self.n_rows + new_rows.shape[0]
+        if n_new > self.sq_diff.shape[0]:
+            capacity = max(n_new, min(2 * self.sq_diff.shape[0], self.max_rows))
+            sq_diff = torch.empty((capacity,) + self.sq_diff.shape[1:], dtype=self.x.dtype, device=self.x.device)
+            sq_diff[:self.n_rows] = self.sq_diff[:self.n_rows]
+            self.sq_diff = sq_diff
+            sq_dist = torch.empty((capacity, self.x.shape[0]), dtype=self.x.dtype, device=self.x.device)
+            sq_dist[:self.n_scaled] = self.sq_dist[:self.n_scaled]
+            self.sq_dist = sq_dist
+        self.sq_diff[self.n_rows:n_new] = (self.x[new_rows].unsqueeze(1) - self.x.unsqueeze(0)) ** 2
+        self.row_of[new_rows] = torch.arange(self.n_rows, n_new, device=self.x.device)
+        self.n_rows = n_new
+
+    def scaled_sq_dist(self, rows, scale):
+        """Squared distances between pool rows `rows` and every pool row after dividing each dimension by scale"""
+        self.fill(rows)
+        if self.scale is None or not torch.equal(scale, self.scale):
+            self.scale = scale.clone()
+            self.n_scaled = 0
+        if self.n_scaled < self.n_rows:
+            self.sq_dist[self.n_scaled:self.n_rows] = self.sq_diff[self.n_scaled:self.n_rows] @ self.scale.to(self.x.dtype).pow(-2)
+            self.n_scaled = self.n_rows
+        return self.sq_dist[self.row_of[rows]]
+
+
+class CandidatePool(CandidateSet):
+    """
+    Fixed pool of candidate rows (e.g. HPO-B or chemical engineering datasets) with optional known y values.
+    x and y are shared read-only by every fork. The remaining rows are kept in an index tensor that is
+    compacted lazily, once more than compaction_ratio of its entries have been evaluated.
+    With cache_distances=True, GP kernels are evaluated from a PairwiseDistanceCache of the pool, with room for
+    cache_rows training rows (e.g. max_iter; None: as many as fit in its max_bytes).
+    """
+    def __init__(self, x, y=None, compaction_ratio=0.25, cache_distances=False, cache_rows=None):
+        super().__init__(n_total=x.shape[0], device=x.device)
+        self.x = x
+        self.y = y
+        self.compaction_ratio = compaction_ratio
+        self.active_idx = torch.arange(self.n_total, device=self.device)
+        self.index = None
+        # KD-tree over the rows scaled to the unit cube, for box queries (built on first use)
+        self.box_index = None
+        self.x_lower = None
+        self.x_extent = None
+        self.distance_cache = PairwiseDistanceCache(x, max_rows=cache_rows) if cache_distances else None
+
+    def remove(self, idx):
+        super().remove(idx)
+        if self.active_idx.shape[0] - self.n_remaining > self.compaction_ratio * self.active_idx.shape[0]:
+            is_evaluated = torch.from_numpy(self.evaluated.contains(self.active_idx.cpu().numpy())).to(self.device)
+            self.active_idx = self.active_idx[~is_evaluated]
+
+    def remove_points(self, x, tol=1e-5):
+        """Mark pool rows closer than tol to any row of x as evaluated"""
+        if self.index is None:
+            self.index = PointIndex(self.x)
+        idx = self.index.find(x, tol=tol)
+        self.remove(idx[idx >= 0])
+
+    def points(self, idx):
+        return self.x[torch.as_tensor(idx, device=self.device).reshape(-1)]
+
+    def _build_box_index(self):
+        if self.box_index is None:
+            self.x_lower = self.x.min(dim=0)[0]
+            self.x_extent = (self.x.max(dim=0)[0] - self.x_lower).clamp_min(1e-12)
+            self.box_index = cKDTree(((self.x - self.x_lower) / self.x_extent).cpu().numpy())
+
+    def box_indices(self, lower, upper):
+        """Row indices of the remaining pool rows inside the box [lower, upper]"""
+        self._build_box_index()
+        # Chebyshev ball around the box centre that contains the box, then the exact box test
+        unit_lower = ((lower - self.x_lower) / self.x_extent).cpu().numpy()
+        unit_upper = ((upper - self.x_lower) / self.x_extent).cpu().numpy()
+        idx = self.box_index.query_ball_point((unit_lower + unit_upper) / 2, r=float((unit_upper - unit_lower).max()) / 2 + 1e-12, p=np.inf)
+        idx = torch.as_tensor(np.sort(np.asarray(idx, dtype=np.int64)), device=self.device)
+        x = self.x[idx]
+        inside = ((x >= lower) & (x <= upper)).all(dim=1)
+        idx = idx[inside]
+        return idx[~torch.from_numpy(self.evaluated.contains(idx.cpu().numpy())).to(self.device)]
+
+    def nearest_indices(self, x, eps=0.0):
+        """
+        Row index of the pool row nearest to each row of x (evaluated or not), in unit-cube coordinates.
+        With eps > 0 the neighbour is approximate (at most 1 + eps times farther than the nearest), which is much
+        faster for query points far from the pool rows.
+        """
+        self._build_box_index()
+        _, idx = self.box_index.query(((x.to(self.x.dtype) - self.x_lower) / self.x_extent).cpu().numpy(), k=1, eps=eps)
+        return torch.as_tensor(idx, dtype=torch.long, device=self.device)
+
+    def remaining_indices(self):
+        """Row indices of every remaining pool row"""
+        return self.active_idx[~torch.from_numpy(self.evaluated.contains(self.active_idx.cpu().numpy())).to(self.device)]
+
+    def iter_chunks(self, chunk_size=65536):
+        """Yield (row indices, rows) of the remaining pool rows"""
+        for start in range(0, self.active_idx.shape[0], chunk_size):
+            idx = self.active_idx[start:start + chunk_size]
+            is_evaluated = torch.from_numpy(self.evaluated.contains(idx.cpu().numpy())).to(self.device)
+            idx = idx[~is_evaluated]
+            if idx.shape[0] == 0:
+                continue
+            yield idx, self.x[idx]
+
+
+def domain_bounds(filtered_candidate_x):
+    """Lower and upper corner of a candidate domain (CandidateGrid, CandidatePool, ContinuousBox or tensor of points)"""
+    if isinstance(filtered_candidate_x, CandidateGrid):
+        return torch.stack([axis[0] for axis in filtered_candidate_x.axes]), torch.stack([axis[-1] for axis in filtered_candidate_x.axes])
+    if isinstance(filtered_candidate_x, ContinuousBox):
+        return filtered_candidate_x.lower, filtered_candidate_x.upper
+    x = filtered_candidate_x.x if isinstance(filtered_candidate_x, CandidatePool) else filtered_candidate_x
+    return x.min(dim=0)[0], x.max(dim=0)[0]
+
+
+class CandidateSubset(CandidateSet):
+    """
+    Remaining candidates of a CandidateSet (or a tensor of candidate points) restricted to the indices idx,
+    e.g. the candidates inside a trust region. Chunks yield the indices of the source, and remove() takes them too;
+    the evaluated bitset is indexed by the position in idx, so it is as small as the subset.
+    """
+    def __init__(self, source, idx):
+        super().__init__(n_total=idx.shape[0], device=idx.device)
+        self.source = source
+        self.idx = idx
+        self.sorted_idx, self.order = torch.sort(idx)
+
+    def positions(self, idx):
+        """Positions in self.idx of the source indices idx (indices outside the subset are dropped)"""
+        idx = torch.as_tensor(idx, device=self.device).reshape(-1)
+        if self.n_total == 0:
+            return idx[:0]
+        position = torch.searchsorted(self.sorted_idx, idx).clamp_max(self.n_total - 1)
+        return self.order[position[self.sorted_idx[position] == idx]]
+
+    def remove(self, idx):
+        super().remove(self.positions(idx))
+
+    def points(self, idx):
+        return self.source.points(idx) if isinstance(self.source, CandidateSet) else self.source[idx]
+
+    def iter_chunks(self, chunk_size=65536):
+        chunk_size = max(8, chunk_size - chunk_size % 8)
+        for start in range(0, self.n_total, chunk_size):
+            stop = min(start + chunk_size, self.n_total)
+            is_evaluated = torch.from_numpy(self.evaluated.unpack(start, stop)).to(self.device)
+            idx = self.idx[start:stop][~is_evaluated]
+            if idx.shape[0] == 0:
+                continue
+            yield idx, self.points(idx)
+
+
+class ContinuousBox:
+    """
+    Box-bounded continuous search domain. BayesianOptimizer.get_next_points maximizes the acquisition over it with
+    multi-start L-BFGS-B instead of enumerating candidates.
+    With snap_axes (one increasing tensor of allowed values per dimension), optimized points are snapped to the
+    nearest grid point that has not been evaluated yet. The grid is never enumerated: evaluated grid points are kept
+    as a set of integer coordinates, so the dimension is not limited by the grid size.
+    """
+    def __init__(self, lower, upper, snap_axes=None, device='cpu'):
+        self.device = torch.device(device)
+        self.lower = torch.as_tensor(lower, dtype=torch.double, device=self.device)
+        self.upper = torch.as_tensor(upper, dtype=torch.double, device=self.device)
+        self.dim = self.lower.shape[0]
+        self.snap_axes = None if snap_axes is None else [torch.as_tensor(axis, dtype=torch.double, device=self.device) for axis in snap_axes]
+        self.evaluated = set()
+
+    @classmethod
+    def from_bounds(cls, bounds, dim, n_grid=None, device='cpu'):
+        """Box [bounds[0], bounds[1]]^dim, snapped to the CandidateGrid.from_bounds grid if n_grid is given"""
+        snap_axes = None if n_grid is None else [torch.linspace(bounds[0], bounds[1], n_grid, dtype=torch.double) for _ in range(dim)]
+        return cls([bounds[0]] * dim, [bounds[1]] * dim, snap_axes=snap_axes, device=device)
+
+    def snap(self, x):
+        """Integer grid coordinates (n, dim) of the grid point nearest to each row of x"""
+        x = x.to(device=self.device, dtype=torch.double).reshape(-1, self.dim)
+        return torch.stack([nearest_axis_index(axis, x[:, d]) for d, axis in enumerate(self.snap_axes)], dim=1)
+
+    def neighbors(self, coords):
+        """Grid coordinates one axis step away from each row of coords"""
+        neighbors = []
+        for d, axis in enumerate(self.snap_axes):
+            for step in (-1, 1):
+                shifted = coords.clone()
+                shifted[:, d] += step
+                neighbors.append(shifted[(shifted[:, d] >= 0) & (shifted[:, d] < axis.shape[0])])
+        return torch.cat(neighbors)
+
+    def points(self, coords):
+        """Grid coordinates -> grid points of shape (n, dim)"""
+        return torch.stack([axis[coords[:, d]] for d, axis in enumerate(self.snap_axes)], dim=1)
+
+    def is_evaluated(self, coords):
+        return torch.tensor([tuple(row) in self.evaluated for row in coords.tolist()], dtype=torch.bool, device=self.device)
+
+    def remove_points(self, x, tol=1e-5):
+        """Mark the grid points closer than tol to any row of x as evaluated (nothing to track without snap_axes)"""
+        if self.snap_axes is None:
+            return
+        coords = self.snap(x)
+        is_close = (self.points(coords) - x.to(device=self.device, dtype=torch.double).reshape(-1, self.dim)).pow(2).sum(dim=1) < tol ** 2
+        self.evaluated.update(tuple(row) for row in coords[is_close].tolist())
@@ -0,0 +1,78 @@
+import functools
+import math
+
+import torch
+
+from core.kernels_and_acquisitions import stationary_covariance
+
+# Every kernel type, acquisition type and training size bucket is one compiled graph of the same function
+RECOMPILE_LIMIT = 64
+
+
+def bucket_size(n, min_size=16):
+    """Training sets are padded to the next power of two (at least min_size) so that compiled graphs are reused"""
+    return max(min_size, 1 << (n - 1).bit_length())
+
+
+def pad_training_data(train_x, train_y):
+    """Zero-pad train_x and train_y to bucket_size rows; mask is 1 for the real rows"""
+    n = train_x.shape[0]
+    size = bucket_size(n)
+    padded_x = train_x.new_zeros((size, train_x.shape[1]))
+    padded_x[:n] = train_x
+    padded_y = train_y.new_zeros(size)
+    padded_y[:n] = train_y
+    mask = train_y.new_zeros(size)
+    mask[:n] = 1
+    return padded_x, padded_y, mask
+
+
+def exact_mll_loss(kernel_type, train_x, train_y, mask, n, lengthscale, outputscale, noise, constant, alpha=None):
+    """
+    -ExactMarginalLogLikelihood / n of GPModel (ConstantMean, ScaleKernel, Gaussian noise) on padded training data,
+    written on plain tensors so that it compiles to a single graph.
+    Padded rows (mask 0) get an identity block: they change neither the quadratic term nor the log determinant.
+    """
+    scaled_x = train_x / lengthscale
+    sq_dist = (scaled_x.unsqueeze(1) - scaled_x.unsqueeze(0)).pow(2).sum(dim=-1)
+    covar = outputscale * stationary_covariance(kernel_type, sq_dist, alpha, train_x.shape[1])
+    covar = covar + noise * torch.eye(train_x.shape[0], dtype=train_x.dtype, device=train_x.device)
+    covar = covar * (mask.unsqueeze(0) * mask.unsqueeze(1)) + torch.diag(1 - mask)
+
+    chol, info = torch.linalg.cholesky_ex(covar)
+    residual = ((train_y - constant) * mask).unsqueeze(-1)
+    inv_quad = (residual * torch.cholesky_solve(residual, chol)).sum()
+    logdet = 2 * chol.diagonal().log().sum()
+    loss = 0.5 * (inv_quad + logdet + n * math.log(2 * math.pi)) / n
+    # A failed factorization gives nan, which stops training as in the regular path
+    return torch.where(info == 0, loss, torch.full_like(loss, math.nan))
+
+
+def with_recompile_limit(fn):
+    """Raise the recompile limit while fn runs, instead of changing the global dynamo config"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with torch._dynamo.config.patch(recompile_limit=RECOMPILE_LIMIT):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+class CompiledSteps:
+    """
+    Cache of torch.compile'd graphs used by BayesianOptimizer(compile_steps=True):
+    the GP training loss per kernel type (static shapes, training sets padded to size buckets)
+    and the acquisition math (dynamic candidate chunk sizes).
+    """
+    def __init__(self):
+        self.losses = {}
+        self.acquisition = None
+
+    def loss(self, kernel_type):
+        if kernel_type not in self.losses:
+            self.losses[kernel_type] = with_recompile_limit(torch.compile(functools.partial(exact_mll_loss, kernel_type), dynamic=False))
+        return self.losses[kernel_type]
+
+    def acquisition_values(self, acquisition_values):
+        if self.acquisition is None:
+            self.acquisition = with_recompile_limit(torch.compile(acquisition_values, dynamic=True))
+        return self.acquisition
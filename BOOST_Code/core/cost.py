@@ -0,0 +1,64 @@
+import torch
+
+from core.BayesianOptimization import BayesianOptimizer
+from core.candidates import CandidateSet
+from core.kernels_and_acquisitions import KernelType
+from core.posterior import GPPosterior
+
+
+class CostModel:
+    """
+    Evaluation cost of the candidates for the cost-aware acquisition functions (AcquisitionType.EIPC, PIPC).
+    With candidate_cost (one cost per row of a CandidatePool or of a candidate tensor, e.g. a cost column of the
+    CSV) the costs are looked up. Otherwise observe() records measured costs (e.g. wall times) and a GP on the
+    log cost of the evaluated points predicts exp(posterior mean); every candidate costs 1 until two are observed.
+    """
+    def __init__(self, candidate_cost=None, kernel_type=KernelType.MATERN52, min_cost=1e-9, device='cpu'):
+        self.candidate_cost = candidate_cost
+        self.kernel_type = kernel_type
+        self.min_cost = min_cost
+        # The cost GP has its own optimizer so that it never shares a pooled model with the objective GP
+        self.optimizer = BayesianOptimizer(device=device, reuse_models=False)
+
+        self.x = []
+        self.cost = []
+        self.posterior = None
+        self.normalization = None
+        self.n_fitted = 0
+
+    def observe(self, x, cost):
+        """Record the costs (n,) of evaluating the rows of x (n, dim)"""
+        self.x.append(x.reshape(-1, x.shape[-1]))
+        self.cost.append(torch.as_tensor(cost, dtype=x.dtype, device=x.device).reshape(-1))
+
+    @property
+    def total_cost(self):
+        return sum(cost.sum().item() for cost in self.cost)
+
+    def fit(self):
+        """Refit the log-cost GP if costs were observed since the last fit (nothing to do for a cost lookup)"""
+        n_observed = sum(cost.shape[0] for cost in self.cost)
+        if self.candidate_cost is not None or n_observed < 2 or n_observed == self.n_fitted:
+            return
+        train_x = torch.cat(self.x)
+        log_cost = torch.cat(self.cost).clamp_min(self.min_cost).log()
+        x_min, x_range, y_median, y_std, train_x_normalized, train_y_normalized = self.optimizer.normalize_data(train_x, log_cost)
+        model, likelihood = self.optimizer._train_model(train_x_normalized=train_x_normalized, train_y_normalized=train_y_normalized, kernel_type=self.kernel_type)
+        model.eval()
+        likelihood.eval()
+        with torch.no_grad():
+            self.posterior = GPPosterior(model, likelihood, train_x_normalized, train_y_normalized, self.kernel_type)
+        self.normalization = (x_min, x_range, y_median, y_std)
+        self.n_fitted = n_observed
+
+    def predict(self, candidates, idx):
+        """Predicted costs of the candidates with indices idx in candidates (a CandidateSet or a tensor)"""
+        if self.candidate_cost is not None:
+            return self.candidate_cost[idx]
+        if self.posterior is None:
+            return torch.ones(idx.shape[0], dtype=torch.double, device=idx.device)
+        x = candidates.points(idx) if isinstance(candidates, CandidateSet) else candidates[idx]
+        x_min, x_range, y_median, y_std = self.normalization
+        with torch.no_grad():
+            mean, _ = self.posterior.predict_points((x - x_min) / x_range, with_variance=False)
+        return torch.exp(mean * y_std + y_median).clamp_min(self.min_cost)
@@ -1,9 +1,11 @@
+import math
 import warnings
 from enum import Enum
 
 import torch
+from gpytorch.constraints import Positive
 from gpytorch.distributions import MultivariateNormal
-from gpytorch.kernels import MaternKernel, ScaleKernel, RBFKernel, RQKernel
+from gpytorch.kernels import InducingPointKernel, Kernel, MaternKernel, ScaleKernel, RBFKernel, RQKernel
 from gpytorch.means import ConstantMean
 from gpytorch.models import ExactGP
 from gpytorch.utils.warnings import NumericalWarning
@@ -16,6 +18,7 @@ class KernelType(Enum):
     MATERN32 = "Matern32"
     MATERN52 = "Matern52"
     RQ = "RQ"
+    WENDLAND = "Wendland" # compactly supported, gives sparse covariance matrices
     TBD = "TBD"
 
 class AcquisitionType(Enum):
@@ -23,15 +26,169 @@ class AcquisitionType(Enum):
     PI = "PI"
     UCB = "UCB"
     PM = "PM"
+    TS = "TS" # Thompson sampling
+    EIPC = "EIpc" # EI per unit cost (needs a CostModel)
+    PIPC = "PIpc" # PI per unit cost (needs a CostModel)
     TBD = "TBD"
 
+# Posterior moments each acquisition function needs from the GP
+ACQUISITION_MOMENTS = {
+    AcquisitionType.EI: ("mean", "variance"),
+    AcquisitionType.PI: ("mean", "variance"),
+    AcquisitionType.UCB: ("mean", "variance"),
+    AcquisitionType.PM: ("mean",),
+    AcquisitionType.TS: ("sample",), # a posterior sample path instead of moments
+    AcquisitionType.EIPC: ("mean", "variance"),
+    AcquisitionType.PIPC: ("mean", "variance"),
+}
+
+# Cost-aware acquisition functions and the acquisition they divide by the predicted evaluation cost
+COST_ACQUISITIONS = {
+    AcquisitionType.EIPC: AcquisitionType.EI,
+    AcquisitionType.PIPC: AcquisitionType.PI,
+}
+
+class GPBackend(Enum):
+    EXACT = "exact" # ExactGP, O(n^3) per fit
+    SGPR = "SGPR" # inducing-point approximation (Titsias), O(n m^2) per fit for m inducing points
+
+class Precision(Enum):
+    DOUBLE = "double" # everything in float64
+    MIXED = "mixed" # float64 fitting and Cholesky, float32 cross-covariance and acquisition
+
+class BatchStrategy(Enum):
+    KRIGING_BELIEVER = "KB" # every pick is fantasized at its posterior mean
+    CONSTANT_LIAR = "CL" # every pick is fantasized at the best observed value
+    LOCAL_PENALIZATION = "LP" # the acquisition is penalized around every pick (Gonzalez et al., 2016)
+
+class SubspaceMethod(Enum):
+    RANDOM_EMBEDDING = "random" # random linear projection with orthonormal columns (REMBO-like)
+    ACTIVE_AXES = "axes" # the axes the GP posterior mean is most sensitive to (axis-aligned active subspace)
+
+class EvaluationMode(Enum):
+    TORCH = "torch" # one call on the tensor batch (n, dim) itself, no numpy round trip (e.g. Benchmarks functions)
+    VECTORIZED = "vectorized" # one call on the batch as a numpy array (n, dim)
+    PROCESS_POOL = "process" # one call per point (1, dim), in parallel worker processes with a timeout
+
+def stationary_covariance(kernel_type, sq_dist, alpha=None, dim=None):
+    """
+    Unscaled kernel value from squared distances that are already divided by the squared lengthscale.
+    alpha is the RQ mixture parameter, dim the input dimension the Wendland kernel must be positive definite in.
+    """
+    if kernel_type == KernelType.RBF:
+        return torch.exp(-0.5 * sq_dist)
+    elif kernel_type == KernelType.MATERN32:
+        # clamp as gpytorch does, so that the gradient of the distance is finite at 0
+        dist = math.sqrt(3) * sq_dist.clamp_min(1e-30).sqrt()
+        return (1 + dist) * torch.exp(-dist)
+    elif kernel_type == KernelType.MATERN52:
+        dist = math.sqrt(5) * sq_dist.clamp_min(1e-30).sqrt()
+        return (1 + dist + dist ** 2 / 3) * torch.exp(-dist)
+    elif kernel_type == KernelType.RQ:
+        return (1 + sq_dist / (2 * alpha)).pow(-alpha)
+    elif kernel_type == KernelType.WENDLAND:
+        exponent = wendland_exponent(dim)
+        dist = sq_dist.clamp_min(1e-30).sqrt()
+        return (1 - dist).clamp_min(0).pow(exponent + 1) * ((exponent + 1) * dist + 1)
+    else:
+        raise ValueError(f"Unsupported kernel type: {kernel_type}")
+
+
+def wendland_exponent(dim):
+    """l of the Wendland function phi_{dim,1}(r) = (1 - r)_+^(l+1) ((l+1) r + 1), positive definite in dim dimensions"""
+    return dim // 2 + 2
+
+
+class WendlandKernel(Kernel):
+    """
+    Compactly supported Wendland kernel phi_{dim,1}: exactly 0 once |x1 - x2| >= lengthscale,
+    so the covariance matrices are sparse when the lengthscale is small relative to the spread of the points.
+    """
+    has_lengthscale = True
+
+    def __init__(self, dim, **kwargs):
+        super().__init__(**kwargs)
+        self.dim = dim
+
+    def forward(self, x1, x2, diag=False, **params):
+        x1_ = x1.div(self.lengthscale)
+        x2_ = x2.div(self.lengthscale)
+        sq_dist = self.covar_dist(x1_, x2_, square_dist=True, diag=diag, **params)
+        return stationary_covariance(KernelType.WENDLAND, sq_dist, dim=self.dim)
+
+
+class PoolDistanceKernel(Kernel):
+    """
+    Stationary kernel on a fixed candidate pool whose inputs are pool row indices of shape (n, 1).
+    Squared distances are looked up from the (n_train, n_pool) matrix set by set_distances
+    (PairwiseDistanceCache.scaled_sq_dist), so they are not recomputed in every training iteration.
+    """
+    has_lengthscale = True
+
+    def __init__(self, kernel_type, dim=None, **kwargs):
+        super().__init__(**kwargs)
+        self.kernel_type = kernel_type
+        # input dimension of the pool (the Wendland kernel depends on it)
+        self.dim = dim
+        if kernel_type == KernelType.RQ:
+            self.register_parameter(name="raw_alpha", parameter=torch.nn.Parameter(torch.zeros(*self.batch_shape, 1)))
+            self.register_constraint("raw_alpha", Positive())
+        self.rows = None
+        self.row_of = None
+        self.sq_dist = None
+        self.train_sq_dist = None
+
+    @property
+    def alpha(self):
+        return self.raw_alpha_constraint.transform(self.raw_alpha)
+
+    def set_distances(self, rows, sq_dist):
+        """rows: pool indices of the training points, sq_dist: their scaled squared distances to every pool row"""
+        self.rows = rows
+        self.row_of = torch.full((sq_dist.shape[1],), -1, dtype=torch.long, device=sq_dist.device)
+        self.row_of[rows] = torch.arange(rows.shape[0], device=sq_dist.device)
+        self.sq_dist = sq_dist
+        self.train_sq_dist = sq_dist[:, rows]
+
+    def forward(self, x1, x2, diag=False, **params):
+        idx1 = x1[..., 0].long()
+        idx2 = x2[..., 0].long()
+        if diag:
+            if not torch.equal(idx1, idx2):
+                raise ValueError("PoolDistanceKernel only evaluates the diagonal of k(x, x)")
+            sq_dist = torch.zeros(idx1.shape, dtype=self.sq_dist.dtype, device=self.sq_dist.device)
+        elif torch.equal(idx2, self.rows):
+            sq_dist = self.train_sq_dist if torch.equal(idx1, self.rows) else self.sq_dist[:, idx1].T
+        elif torch.equal(idx1, self.rows):
+            sq_dist = self.sq_dist[:, idx2]
+        elif (self.row_of[idx1] >= 0).all():
+            sq_dist = self.sq_dist[self.row_of[idx1]][:, idx2]
+        elif (self.row_of[idx2] >= 0).all():
+            sq_dist = self.sq_dist[self.row_of[idx2]][:, idx1].T
+        else:
+            raise ValueError("PoolDistanceKernel needs one of its inputs to be training points")
+        alpha = self.alpha if self.kernel_type == KernelType.RQ else None
+        return stationary_covariance(self.kernel_type, sq_dist / self.lengthscale.pow(2).squeeze(), alpha, self.dim)
+
+
 class GPModel(ExactGP):
-    def __init__(self, train_x, train_y, likelihood, kernel_type, lengthscale_constraint, outputscale_constraint):
+    """
+    With pool_distances=True, the inputs are pool row indices and the base kernel is a PoolDistanceKernel.
+    The caller sets the distances through covar_module.base_kernel.set_distances before fitting.
+    With inducing_points (m, dim), the scaled kernel is wrapped in an InducingPointKernel (GPBackend.SGPR).
+    dim is the input dimension (train_x.shape[-1] by default; pass it with pool_distances).
+    """
+    def __init__(self, train_x, train_y, likelihood, kernel_type, lengthscale_constraint, outputscale_constraint, pool_distances=False, inducing_points=None, dim=None):
         super().__init__(train_x, train_y, likelihood)
         self.mean_module = ConstantMean()
+        dim = dim or train_x.shape[-1]
 
         # Base kernel selection
-        if kernel_type == KernelType.RBF:
+        if pool_distances:
+            base_kernel = PoolDistanceKernel(kernel_type, dim=dim, lengthscale_constraint=lengthscale_constraint)
+            if kernel_type == KernelType.RQ:
+                base_kernel.raw_alpha = torch.nn.Parameter(torch.tensor(2.0, device=train_x.device, dtype=train_x.dtype))
+        elif kernel_type == KernelType.RBF:
             base_kernel = RBFKernel(lengthscale_constraint=lengthscale_constraint)
         elif kernel_type == KernelType.MATERN32:
             base_kernel = MaternKernel(nu=1.5, lengthscale_constraint=lengthscale_constraint)
@@ -40,11 +197,21 @@ class GPModel(ExactGP):
         elif kernel_type == KernelType.RQ:
             base_kernel = RQKernel(lengthscale_constraint=lengthscale_constraint)
             base_kernel.raw_alpha = torch.nn.Parameter(torch.tensor(2.0, device=train_x.device, dtype=train_x.dtype))
+        elif kernel_type == KernelType.WENDLAND:
+            base_kernel = WendlandKernel(dim=dim, lengthscale_constraint=lengthscale_constraint)
         else:
             raise ValueError(f"Unsupported kernel type: {kernel_type}")
 
         self.covar_module = ScaleKernel(base_kernel, outputscale_constraint=outputscale_constraint)
-        self.to(train_x.device)
+        self.sparse = inducing_points is not None
+        if self.sparse:
+            self.covar_module = InducingPointKernel(self.covar_module, inducing_points=inducing_points, likelihood=likelihood)
+        self.to(device=train_x.device, dtype=train_x.dtype)
+
+    @property
+    def scale_kernel(self):
+        """ScaleKernel over the base kernel, also when it is wrapped in an InducingPointKernel"""
+        return self.covar_module.base_kernel if self.sparse else self.covar_module
 
     def forward(self, x):
         mean_x = self.mean_module(x)
@@ -0,0 +1,185 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import torch
+
+from core.candidates import CandidatePool, CandidateSet
+
+
+class MemmapPool(CandidatePool):
+    """
+    Out-of-core CandidatePool whose rows stay on disk in a memory-mapped .npy file (or a raw binary file of dim
+    columns of dtype), e.g. tens of millions of enumerated formulations; y (optional) is mapped the same way.
+    x and y are torch views of copy-on-write maps, so indexing rows reads only their pages and nothing is written back.
+    Scoring streams through the rows in chunks; with prefetch=True a background thread reads the next chunk while
+    the current one is scored. There is no index tensor of the remaining rows: the evaluated rows are only a Bitset,
+    kept in the file bitmap_path (memory-mapped, so that a run can be resumed) or in memory.
+    Point lookups (remove_points, nearest_indices, box_indices) scan the rows scan_rows at a time instead of
+    building KD-trees, and there is no distance cache.
+    Forks (BOOST combinations) share the maps and copy the bitmap to memory; pickled pools (joblib workers) reopen
+    the files instead of copying the rows.
+    """
+    def __init__(self, x_path, y_path=None, dim=None, dtype=np.float64, bitmap_path=None, prefetch=True, scan_rows=2**20):
+        self.x_path = str(x_path)
+        self.y_path = None if y_path is None else str(y_path)
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.bitmap_path = None if bitmap_path is None else str(bitmap_path)
+        self.prefetch = prefetch
+        # Bitset.unpack needs scan starts that are multiples of 8
+        self.scan_rows = max(8, scan_rows // 8 * 8)
+        self._open()
+        CandidateSet.__init__(self, n_total=self.x.shape[0])
+        if self.bitmap_path is not None:
+            # evaluated rows of an earlier run are kept
+            exists = os.path.exists(self.bitmap_path)
+            self.evaluated.bits = np.memmap(self.bitmap_path, dtype=np.uint8, mode='r+' if exists else 'w+', shape=self.evaluated.bits.shape)
+            self.n_remaining = self.n_total - int(np.bitwise_count(self.evaluated.bits).sum())
+
+        self.index = None
+        self.box_index = None
+        self.x_lower = None
+        self.x_extent = None
+        self.distance_cache = None
+        self._executor = None
+
+    @classmethod
+    def from_csv(cls, csv_path, directory, maximize=False, normalize_y=False, drop_columns=(), chunk_rows=10**6, **kwargs):
+        """
+        Pool of a CSV with x in the first columns and y in the last one (drop_columns excluded), converted once to
+        <name>_x.npy and <name>_y.npy in directory, chunk_rows rows at a time. As in HPOB.get_data, y is negated if
+        maximize and scaled to [0, 1] if normalize_y.
+        """
+        name = os.path.splitext(os.path.basename(csv_path))[0]
+        x_path = os.path.join(directory, f'{name}_x.npy')
+        y_path = os.path.join(directory, f'{name}_y.npy')
+        if not (os.path.exists(x_path) and os.path.exists(y_path)):
+            os.makedirs(directory, exist_ok=True)
+            n_rows, n_columns = 0, None
+            for chunk in pd.read_csv(csv_path, chunksize=chunk_rows):
+                n_rows += chunk.shape[0]
+                n_columns = chunk.shape[1] - len(drop_columns)
+            x = np.lib.format.open_memmap(x_path, mode='w+', dtype=np.float64, shape=(n_rows, n_columns - 1))
+            y = np.lib.format.open_memmap(y_path, mode='w+', dtype=np.float64, shape=(n_rows,))
+            start = 0
+            for chunk in pd.read_csv(csv_path, chunksize=chunk_rows):
+                values = chunk.drop(columns=list(drop_columns)).values.astype(np.float64)
+                stop = start + values.shape[0]
+                x[start:stop] = values[:, :-1]
+                y[start:stop] = -values[:, -1] if maximize else values[:, -1]
+                start = stop
+            if normalize_y:
+                y_min, y_max = y.min(), y.max()
+                for start in range(0, n_rows, chunk_rows):
+                    y[start:start + chunk_rows] = (y[start:start + chunk_rows] - y_min) / (y_max - y_min)
+            x.flush()
+            y.flush()
+            del x, y
+        return cls(x_path, y_path, **kwargs)
+
+    def _map(self, path, dim):
+        if path.endswith('.npy'):
+            return np.load(path, mmap_mode='c')
+        if dim is None and path == self.x_path:
+            raise ValueError("dim is needed for a raw binary x file")
+        array = np.memmap(path, dtype=self.dtype, mode='c')
+        return array.reshape(-1, dim) if dim is not None else array
+
+    def _open(self):
+        self.x = torch.from_numpy(self._map(self.x_path, self.dim))
+        self.y = torch.from_numpy(self._map(self.y_path, None)) if self.y_path is not None else None
+
+    def __getstate__(self):
+        # the maps are reopened from their files, the bitmap is sent as it is
+        state = self.__dict__.copy()
+        state['x'], state['y'], state['_executor'] = None, None, None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._open()
+
+    def fork(self):
+        new = super().fork()
+        # the bitmap file stays with this pool
+        new.evaluated.bits = np.array(self.evaluated.bits)
+        new._executor = None
+        return new
+
+    def remove(self, idx):
+        CandidateSet.remove(self, idx)
+        if isinstance(self.evaluated.bits, np.memmap):
+            self.evaluated.bits.flush()
+
+    def _scan(self):
+        """Yield (start, rows) of all rows, evaluated or not, scan_rows at a time"""
+        for start in range(0, self.n_total, self.scan_rows):
+            yield start, self.x[start:start + self.scan_rows]
+
+    def _build_box_index(self):
+        # only the bounds of the unit cube: lookups scan the rows instead of a KD-tree
+        if self.x_lower is None:
+            lower, upper = zip(*[(rows.min(dim=0)[0], rows.max(dim=0)[0]) for _, rows in self._scan()])
+            self.x_lower = torch.stack(lower).min(dim=0)[0]
+            self.x_extent = (torch.stack(upper).max(dim=0)[0] - self.x_lower).clamp_min(1e-12)
+
+    def remove_points(self, x, tol=1e-5):
+        """Mark pool rows closer than tol to any row of x as evaluated"""
+        x = x.to(self.x.dtype).reshape(-1, self.x.shape[1])
+        for start, rows in self._scan():
+            close = (torch.cdist(rows, x) < tol).any(dim=1)
+            self.remove(start + torch.nonzero(close).reshape(-1))
+
+    def nearest_indices(self, x, eps=0.0):
+        """Row index of the pool row nearest to each row of x (evaluated or not), in unit-cube coordinates; eps is unused"""
+        self._build_box_index()
+        x = (x.to(self.x.dtype).reshape(-1, self.x.shape[1]) - self.x_lower) / self.x_extent
+        best_dist = torch.full((x.shape[0],), float('inf'), dtype=self.x.dtype)
+        best_idx = torch.zeros(x.shape[0], dtype=torch.long)
+        for start, rows in self._scan():
+            dist, idx = torch.cdist(x, (rows - self.x_lower) / self.x_extent).min(dim=1)
+            closer = dist < best_dist
+            best_dist[closer], best_idx[closer] = dist[closer], start + idx[closer]
+        return best_idx
+
+    def box_indices(self, lower, upper):
+        """Row indices of the remaining pool rows inside the box [lower, upper]"""
+        idx = []
+        for start, rows in self._scan():
+            inside = ((rows >= lower) & (rows <= upper)).all(dim=1) & torch.from_numpy(~self.evaluated.unpack(start, start + rows.shape[0]))
+            idx.append(start + torch.nonzero(inside).reshape(-1))
+        return torch.cat(idx)
+
+    def remaining_indices(self):
+        """Row indices of every remaining pool row"""
+        return torch.cat([start + torch.from_numpy(np.flatnonzero(~self.evaluated.unpack(start, start + rows.shape[0]))) for start, rows in self._scan()])
+
+    def _read_chunk(self, start, stop):
+        """Indices and rows (read from disk) of the remaining rows in [start, stop)"""
+        keep = torch.from_numpy(~self.evaluated.unpack(start, stop))
+        return torch.arange(start, stop)[keep], self.x[start:stop][keep]
+
+    def iter_chunks(self, chunk_size=65536):
+        """Yield (row indices, rows) of the remaining pool rows, the next chunk read ahead if prefetch"""
+        # Bitset.unpack needs chunk starts that are multiples of 8
+        chunk_size = max(8, chunk_size // 8 * 8)
+        starts = range(0, self.n_total, chunk_size)
+        if not self.prefetch:
+            for start in starts:
+                idx, x = self._read_chunk(start, min(start + chunk_size, self.n_total))
+                if idx.shape[0] > 0:
+                    yield idx, x
+            return
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        future = self._executor.submit(self._read_chunk, 0, min(chunk_size, self.n_total))
+        for start in starts:
+            idx, x = future.result()
+            stop = start + chunk_size
+            if stop < self.n_total:
+                future = self._executor.submit(self._read_chunk, stop, min(stop + chunk_size, self.n_total))
+            if idx.shape[0] > 0:
+                yield idx, x
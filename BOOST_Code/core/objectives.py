@@ -0,0 +1,200 @@
+import multiprocessing
+import threading
+import time
+from multiprocessing.connection import wait
+
+import numpy as np
+import torch
+
+from core.kernels_and_acquisitions import EvaluationMode
+
+
+def _worker_loop(connection, objective):
+    """Worker process: objective values of the points x (1, dim) received on connection, until None"""
+    # numpy in and out: torch tensors would be sent as shared memory, which needs file descriptors in both processes
+    while True:
+        x = connection.recv()
+        if x is None:
+            break
+        try:
+            connection.send((True, float(np.asarray(objective(torch.from_numpy(x)), dtype=np.float64).reshape(-1)[0])))
+        except Exception as exception:
+            try:
+                connection.send((False, exception))
+            except Exception:
+                # the exception cannot be pickled
+                connection.send((False, RuntimeError(repr(exception))))
+
+
+class _Worker:
+    """One worker process of an Objective and the connection it receives points and sends values on"""
+    def __init__(self, objective):
+        context = multiprocessing.get_context()
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=_worker_loop, args=(child_connection, objective), daemon=True)
+        self.process.start()
+        child_connection.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+    def close(self):
+        try:
+            self.connection.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=1.0)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.connection.close()
+
+
+class Objective:
+    """
+    Adapter that evaluates an objective on a batch x (n, dim) and returns its values (n,) as a tensor with the dtype
+    and device of x, for TestFunction, BOOST.recommend(objective=...) and AsyncOptimizer (ObjectiveEvaluator).
+    The EvaluationMode says how the objective is called: on the tensor batch (TORCH), on the batch as a numpy array
+    (VECTORIZED), or per point on a persistent pool of max_workers worker processes (PROCESS_POOL, for slow Python
+    code and simulators; the objective and its values must be picklable). A PROCESS_POOL call keeps up to max_workers
+    points running and starts the next one as soon as any finishes.
+    A PROCESS_POOL evaluation still running timeout seconds after it started gets timeout_value (TimeoutError if
+    None), e.g. a penalty worse than any feasible value. Every worker is its own multiprocessing.Process: only the
+    worker of the point that timed out is killed and replaced, the other running points go on. close() stops the
+    workers.
+    eval_time sums the wall time spent in the objective, so the optimizer time of a run is its wall time minus
+    eval_time. The adapter keeps the objective's __name__ for the saved results.
+    """
+    def __init__(self, objective, mode=EvaluationMode.TORCH, max_workers=4, timeout=None, timeout_value=None, name=None):
+        if mode != EvaluationMode.PROCESS_POOL and timeout is not None:
+            raise ValueError("timeout needs mode=EvaluationMode.PROCESS_POOL")
+        self.objective = objective
+        self.mode = mode
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.timeout_value = timeout_value
+        self.__name__ = name or getattr(objective, '__name__', type(objective).__name__)
+        self._lock = threading.Lock()
+        # idle worker processes, kept across calls
+        self._workers = []
+        self.reset_counters()
+
+    def __getstate__(self):
+        # the lock and the worker processes cannot be pickled (joblib workers of BOOST.recommend)
+        state = self.__dict__.copy()
+        del state['_lock']
+        state['_workers'] = []
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def close(self):
+        """Stop the PROCESS_POOL worker processes (a later call starts new ones)"""
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.close()
+
+    def reset_counters(self):
+        self.n_calls = 0
+        self.n_evaluations = 0
+        self.n_timeouts = 0
+        self.eval_time = 0.0
+
+    def __call__(self, x):
+        x = torch.as_tensor(x, dtype=torch.double) if not isinstance(x, torch.Tensor) else x
+        x = x.reshape(-1, x.shape[-1])
+        start = time.perf_counter()
+        if self.mode == EvaluationMode.TORCH:
+            y = self.objective(x)
+        elif self.mode == EvaluationMode.VECTORIZED:
+            y = np.asarray(self.objective(x.detach().cpu().numpy()))
+        elif self.mode == EvaluationMode.PROCESS_POOL:
+            y, n_timeouts = self._evaluate_in_processes(x.detach().cpu())
+        else:
+            raise ValueError(f"Unsupported evaluation mode: {self.mode}")
+        y = torch.as_tensor(y, dtype=x.dtype, device=x.device).reshape(-1)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.n_calls += 1
+            self.n_evaluations += x.shape[0]
+            self.eval_time += elapsed
+            if self.mode == EvaluationMode.PROCESS_POOL:
+                self.n_timeouts += n_timeouts
+        return y
+
+    def _checkout_workers(self):
+        """Up to max_workers idle workers for one call (a call starts more as it needs them)"""
+        with self._lock:
+            workers, self._workers = self._workers[:self.max_workers], self._workers[self.max_workers:]
+        return workers
+
+    def _checkin_workers(self, workers):
+        """Keep the idle workers of a call for the next one, up to max_workers"""
+        with self._lock:
+            n_kept = max(0, self.max_workers - len(self._workers))
+            self._workers.extend(workers[:n_kept])
+        for worker in workers[n_kept:]:
+            worker.close()
+
+    def _evaluate_in_processes(self, x):
+        """Values of the rows of x on the worker processes, up to max_workers rows running at a time; and the number of timeouts"""
+        x = x.numpy()
+        y = torch.empty(x.shape[0], dtype=torch.double)
+        n_timeouts = 0
+        error = None
+        # rows not sent yet (the next one last), the idle workers, and the running ones: worker -> (row, deadline)
+        pending = list(range(x.shape[0]))[::-1]
+        idle = self._checkout_workers()
+        running = {}
+        try:
+            while pending or running:
+                while pending and len(idle) + len(running) < self.max_workers:
+                    idle.append(_Worker(self.objective))
+                while pending and idle:
+                    worker, i = idle.pop(), pending.pop()
+                    worker.connection.send(x[i:i + 1])
+                    running[worker] = (i, time.perf_counter() + self.timeout if self.timeout is not None else None)
+
+                # every running row has its own deadline: wait for the first result or the earliest deadline
+                wait_time = None
+                if self.timeout is not None:
+                    wait_time = max(0.0, min(deadline for _, deadline in running.values()) - time.perf_counter())
+                ready = wait([worker.connection for worker in running], timeout=wait_time)
+                for worker in [worker for worker in running if worker.connection in ready]:
+                    i, _ = running.pop(worker)
+                    try:
+                        succeeded, value = worker.connection.recv()
+                    except (EOFError, OSError):
+                        # the worker died (e.g. a crash of a simulator extension): it is replaced
+                        error = error or RuntimeError(f"A worker process of {self.__name__} exited unexpectedly")
+                        worker.kill()
+                        continue
+                    idle.append(worker)
+                    if succeeded:
+                        y[i] = value
+                    else:
+                        error = error or value
+
+                now = time.perf_counter()
+                for worker, (i, deadline) in list(running.items()):
+                    if deadline is not None and deadline <= now:
+                        # only this worker is killed, the other rows keep running
+                        del running[worker]
+                        worker.kill()
+                        n_timeouts += 1
+                        if self.timeout_value is None:
+                            error = error or TimeoutError(f"{self.__name__} did not finish within {self.timeout} s")
+                        y[i] = self.timeout_value if self.timeout_value is not None else float('nan')
+        finally:
+            # interrupted: the running workers cannot be reused
+            for worker in running:
+                worker.kill()
+            self._checkin_workers(idle)
+        if error is not None:
+            raise error
+        return y, n_timeouts
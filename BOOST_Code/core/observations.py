@@ -0,0 +1,115 @@
+import bisect
+import math
+
+import torch
+
+
+class ObservationStore:
+    """
+    Evaluated points (train_x, train_y) kept in preallocated buffers whose capacity doubles when full.
+    The statistics used for normalization (x min/max, y median/std/min) are updated incrementally on append,
+    and x, y and the normalized data are views of the filled part of the buffers.
+    idx holds the candidate pool row of each observation (-1 when the point is not a pool row).
+    """
+    def __init__(self, dim, capacity=64, device='cpu', dtype=torch.double):
+        self.dim = dim
+        self.device = torch.device(device)
+        self.dtype = dtype
+        self.n = 0
+        self._allocate(max(1, capacity))
+
+        self.x_min = torch.full((dim,), math.inf, dtype=dtype, device=self.device)
+        self.x_max = torch.full((dim,), -math.inf, dtype=dtype, device=self.device)
+        self.y_min = math.inf
+        self._y_sorted = []
+        # Welford's running mean and sum of squared deviations of y
+        self._y_mean = 0.0
+        self._y_m2 = 0.0
+
+    @classmethod
+    def from_tensors(cls, train_x, train_y, capacity=None, idx=None):
+        capacity = max(capacity or 0, 2 * train_x.shape[0])
+        store = cls(dim=train_x.shape[1], capacity=capacity, device=train_x.device, dtype=train_x.dtype)
+        store.append(train_x, train_y, idx=idx)
+        return store
+
+    def _allocate(self, capacity):
+        x_buffer = torch.empty((capacity, self.dim), dtype=self.dtype, device=self.device)
+        y_buffer = torch.empty(capacity, dtype=self.dtype, device=self.device)
+        idx_buffer = torch.empty(capacity, dtype=torch.long, device=self.device)
+        if self.n > 0:
+            x_buffer[:self.n] = self._x_buffer[:self.n]
+            y_buffer[:self.n] = self._y_buffer[:self.n]
+            idx_buffer[:self.n] = self._idx_buffer[:self.n]
+        self._x_buffer, self._y_buffer, self._idx_buffer = x_buffer, y_buffer, idx_buffer
+        self._x_normalized = torch.empty_like(x_buffer)
+        self._y_normalized = torch.empty_like(y_buffer)
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def capacity(self):
+        return self._x_buffer.shape[0]
+
+    @property
+    def x(self):
+        return self._x_buffer[:self.n]
+
+    @property
+    def y(self):
+        return self._y_buffer[:self.n]
+
+    @property
+    def idx(self):
+        return self._idx_buffer[:self.n]
+
+    def append(self, x, y, idx=None):
+        x = x.reshape(-1, self.dim)
+        y = y.reshape(-1)
+        n_new = self.n + x.shape[0]
+        if n_new > self.capacity:
+            capacity = self.capacity
+            while capacity < n_new:
+                capacity *= 2
+            self._allocate(capacity)
+
+        self._x_buffer[self.n:n_new] = x
+        self._y_buffer[self.n:n_new] = y
+        self._idx_buffer[self.n:n_new] = -1 if idx is None else torch.as_tensor(idx, device=self.device).reshape(-1)
+        torch.minimum(self.x_min, self._x_buffer[self.n:n_new].min(dim=0)[0], out=self.x_min)
+        torch.maximum(self.x_max, self._x_buffer[self.n:n_new].max(dim=0)[0], out=self.x_max)
+        for value in y.tolist():
+            self.n += 1
+            self.y_min = min(self.y_min, value)
+            bisect.insort(self._y_sorted, value)
+            delta = value - self._y_mean
+            self._y_mean += delta / self.n
+            self._y_m2 += delta * (value - self._y_mean)
+
+    @property
+    def y_median(self):
+        # Lower median, as torch.median
+        return self._y_sorted[(self.n - 1) // 2]
+
+    @property
+    def y_std(self):
+        # Unbiased standard deviation, as torch.std
+        return math.sqrt(self._y_m2 / (self.n - 1)) if self.n > 1 else math.nan
+
+    def normalize(self):
+        """
+        Same outputs as BayesianOptimizer.normalize_data, computed from the cached statistics.
+        The normalized data is written into preallocated buffers.
+        """
+        x_min = self.x_min.clone()
+        x_range = torch.clamp(self.x_max - self.x_min, min=1e-8)
+        train_x_normalized = torch.sub(self.x, x_min, out=self._x_normalized[:self.n]).div_(x_range)
+
+        y_median = torch.tensor(self.y_median, dtype=self.dtype, device=self.device)
+        y_std = torch.tensor(self.y_std, dtype=self.dtype, device=self.device)
+        if y_std < 1e-6:
+            y_std = torch.tensor(1e-6, dtype=self.dtype, device=self.device)
+        train_y_normalized = torch.sub(self.y, y_median, out=self._y_normalized[:self.n]).div_(y_std)
+
+        return x_min, x_range, y_median, y_std, train_x_normalized, train_y_normalized
@@ -0,0 +1,307 @@
+import math
+
+import gpytorch
+import numpy as np
+import scipy.sparse as sp
+import torch
+from linear_operator.utils.cholesky import psd_safe_cholesky
+from scipy.sparse.linalg import splu
+from scipy.spatial import cKDTree
+
+from core.kernels_and_acquisitions import KernelType, stationary_covariance, wendland_exponent
+
+# Above this fraction of nonzeros in the training covariance, the neighbour search costs more than dense scoring
+COMPACT_MAX_DENSITY = 0.1
+
+
+class GPPosterior:
+    """
+    Exact predictive posterior of a trained GPModel (ScaleKernel over a stationary base kernel, Gaussian likelihood)
+    computed from an explicit Cholesky factor of the training covariance.
+    Used by scoring paths that build the candidate cross-covariance themselves instead of calling the model.
+    mean and variance match likelihood(model(x)): the variance includes the noise.
+    The Cholesky factor is computed in the dtype of the model; the cached factors are then cast to dtype,
+    in which the cross-covariance and the predictions are computed.
+    """
+    def __init__(self, model, likelihood, train_x, train_y, kernel_type, dtype=None):
+        dtype = dtype or train_x.dtype
+        with torch.no_grad():
+            base_kernel = model.covar_module.base_kernel
+            noise = likelihood.noise.squeeze()
+            mean_constant = model.mean_module.constant.squeeze()
+
+            train_covar = model.covar_module(train_x).to_dense()
+            train_covar = train_covar + noise * torch.eye(train_x.shape[0], dtype=train_covar.dtype, device=train_covar.device)
+            chol = psd_safe_cholesky(train_covar)
+            eye = torch.eye(train_x.shape[0], dtype=chol.dtype, device=chol.device)
+            # L^-1, so that k^T K^-1 k = ||L^-1 k||^2
+            chol_inv = torch.linalg.solve_triangular(chol, eye, upper=False)
+            alpha = torch.cholesky_solve((train_y - mean_constant).unsqueeze(-1), chol).squeeze(-1)
+
+            self.kernel_type = kernel_type
+            self.dtype = dtype
+            self.train_x = train_x.to(dtype)
+            self.lengthscale = base_kernel.lengthscale.squeeze().to(dtype)
+            self.rq_alpha = base_kernel.alpha.squeeze().to(dtype) if kernel_type == KernelType.RQ else None
+            self.outputscale = model.covar_module.outputscale.to(dtype)
+            self.noise = noise.to(dtype)
+            self.mean_constant = mean_constant.to(dtype)
+            self.chol_inv = chol_inv.to(dtype)
+            self.alpha = alpha.to(dtype)
+
+    def _variance(self, latent_variance):
+        variance = latent_variance + self.noise
+        return variance.clamp_min(gpytorch.settings.min_variance.value(variance.dtype))
+
+    def prior_covariance(self, x1, x2):
+        """Kernel matrix between the rows of x1 and x2 (normalized inputs), in self.dtype"""
+        sq_dist = torch.cdist(x1.to(self.dtype) / self.lengthscale, x2.to(self.dtype) / self.lengthscale).pow(2)
+        return self.outputscale * stationary_covariance(self.kernel_type, sq_dist, self.rq_alpha, self.train_x.shape[1])
+
+    def cross_covariance(self, x):
+        """Covariance between the rows of x (normalized inputs) and the training points, in self.dtype"""
+        return self.prior_covariance(x, self.train_x)
+
+    def predict(self, cross_covar, with_variance=True):
+        """Posterior mean and variance (None if not with_variance) from the (m, n_train) candidate-train covariance"""
+        mean = self.mean_constant + cross_covar @ self.alpha
+        if not with_variance:
+            return mean, None
+        latent_variance = self.outputscale - (cross_covar @ self.chol_inv.T).pow(2).sum(dim=-1)
+        return mean, self._variance(latent_variance)
+
+    def predict_points(self, x, with_variance=True):
+        """Posterior mean and variance at the rows of x (normalized inputs)"""
+        return self.predict(self.cross_covariance(x), with_variance=with_variance)
+
+    def iter_rbf_grid(self, grid, x_min, x_range, chunk_size=65536, with_variance=True):
+        """
+        Yield (flat indices, mean, variance) of the remaining points of a CandidateGrid for an RBF base kernel
+        (variance is None if not with_variance).
+        The RBF kernel factors over dimensions, so the cross-covariance of the grid is the product of
+        per-dimension (n_grid, n_train) blocks. The grid is split into leading and trailing dimensions,
+        and for every leading grid point the trailing block is scored with matrix products:
+            mean = c + s * (K_lead[a] * alpha) @ K_trail^T
+            var = s - s^2 * ||(L^-1 * K_lead[a]) @ K_trail^T||^2 + noise
+        The (N_grid, n_train) cross-covariance is never built.
+        """
+        with torch.no_grad():
+            blocks = []
+            for d, axis in enumerate(grid.axes):
+                axis = ((axis - x_min[d]) / x_range[d]).to(self.dtype)
+                blocks.append(torch.exp(-0.5 * ((axis.unsqueeze(1) - self.train_x[:, d]) / self.lengthscale) ** 2))
+
+            # trailing dimensions: the longest suffix of the grid with at most chunk_size points
+            split = grid.dim - 1
+            while split > 0 and grid.shape[split - 1] * math.prod(grid.shape[split:]) <= chunk_size:
+                split -= 1
+            lead = self._kron_rows(blocks[:split])
+            trail_t = self._kron_rows(blocks[split:]).T.contiguous()
+            n_trail = trail_t.shape[1]
+
+            alpha = self.outputscale * self.alpha
+            chol_inv = self.outputscale * self.chol_inv
+            n_lead_chunk = max(1, chunk_size // n_trail)
+            for lead_start in range(0, lead.shape[0], n_lead_chunk):
+                lead_rows = lead[lead_start:lead_start + n_lead_chunk]
+                start, stop = lead_start * n_trail, (lead_start + lead_rows.shape[0]) * n_trail
+                is_evaluated = torch.from_numpy(grid.evaluated.unpack(start - start % 8, stop)[start % 8:]).to(grid.device)
+                if is_evaluated.all():
+                    continue
+
+                flat_idx = torch.arange(start, stop, device=grid.device)[~is_evaluated]
+                mean = self.mean_constant + ((lead_rows * alpha) @ trail_t).reshape(-1)
+                if not with_variance:
+                    yield flat_idx, mean[~is_evaluated], None
+                    continue
+                projected = (chol_inv.unsqueeze(0) * lead_rows.unsqueeze(1)) @ trail_t
+                latent_variance = self.outputscale - projected.pow(2).sum(dim=1).reshape(-1)
+                yield flat_idx, mean[~is_evaluated], self._variance(latent_variance[~is_evaluated])
+
+    def _kron_rows(self, blocks):
+        """Row-wise Kronecker product of (n_d, n_train) blocks -> (prod n_d, n_train), last block varying fastest"""
+        result = torch.ones((1, self.train_x.shape[0]), dtype=self.train_x.dtype, device=self.train_x.device)
+        for block in blocks:
+            result = (result.unsqueeze(1) * block.unsqueeze(0)).reshape(-1, block.shape[1])
+        return result
+
+
+class FantasyPosterior(GPPosterior):
+    """
+    GPPosterior that grows by fantasy observations with the hyperparameters held fixed, for greedy batch selection.
+    fantasize(x_new) gives w = K^-1 k(X, x_new) and the predictive variance s at x_new, from which moments stored
+    for other points get the rank-one update of adding (x_new, y_new):
+        cov = k(x, x_new) - k(x, X) w
+        mean += cov * (y_new - mean(x_new)) / s,    variance -= cov^2 / s
+    add() then appends the observation in O(n^2): the inverse Cholesky factor gains one row.
+    """
+    def __init__(self, model, likelihood, train_x, train_y, kernel_type, dtype=None):
+        super().__init__(model, likelihood, train_x, train_y, kernel_type, dtype=dtype)
+        self.train_y = train_y.to(self.dtype)
+
+    def fantasize(self, x_new):
+        """(K^-1 k(X, x_new), predictive variance at x_new) of one point x_new (1, dim) that is not yet added"""
+        v = self.chol_inv @ self.cross_covariance(x_new).squeeze(0)
+        return self.chol_inv.T @ v, self._variance(self.outputscale - v.pow(2).sum())
+
+    def posterior_covariance(self, x, x_new, w):
+        """Posterior covariance of the rows of x with x_new, w = fantasize(x_new)[0]"""
+        return self.prior_covariance(x, x_new).squeeze(-1) - self.cross_covariance(x) @ w
+
+    def add(self, x_new, y_new, w, variance):
+        """Append the observation (x_new, y_new), with (w, variance) = fantasize(x_new)"""
+        # L_aug^-1 = [[L^-1, 0], [-w^T / d, 1 / d]] with d^2 = variance
+        d = variance.sqrt()
+        last_row = torch.cat([-w / d, (1 / d).reshape(1)]).unsqueeze(0)
+        self.chol_inv = torch.cat([torch.nn.functional.pad(self.chol_inv, (0, 1)), last_row])
+        self.train_x = torch.cat([self.train_x, x_new.to(self.dtype)])
+        self.train_y = torch.cat([self.train_y, torch.as_tensor(y_new, dtype=self.dtype, device=self.train_y.device).reshape(1)])
+        self.alpha = self.chol_inv.T @ (self.chol_inv @ (self.train_y - self.mean_constant))
+
+
+class RandomFourierSample:
+    """
+    Sample path of the GP posterior with random Fourier features (weight-space approximation),
+        f(x) = c + phi(x)^T theta,  phi(x) = sqrt(2 s / m) cos(W x + b),
+    where the m frequencies W are drawn from the spectral density of the kernel (Gaussian for RBF, Student-t for
+    Matern, a Gamma scale mixture of Gaussians for RQ) and theta from its posterior given the training data
+    (Matheron's rule, solving the (n_train, n_train) or the (m, m) system, whichever is smaller).
+    Evaluating a point costs O(m * dim). The draws come from generator (a torch.Generator on the device of
+    train_x), or from the global torch RNG if None.
+    """
+    def __init__(self, model, likelihood, train_x, train_y, kernel_type, n_features=1024, generator=None):
+        dtype, device = train_x.dtype, train_x.device
+        with torch.no_grad():
+            base_kernel = model.scale_kernel.base_kernel
+            lengthscale = base_kernel.lengthscale.squeeze()
+            outputscale = model.scale_kernel.outputscale
+            noise = likelihood.noise.squeeze()
+            self.mean_constant = model.mean_module.constant.squeeze()
+
+            # Frequencies from the spectral density of the kernel
+            normal = torch.randn(n_features, train_x.shape[1], dtype=dtype, device=device, generator=generator)
+            if kernel_type == KernelType.RBF:
+                scale = torch.ones((n_features, 1), dtype=dtype, device=device)
+            elif kernel_type in (KernelType.MATERN32, KernelType.MATERN52):
+                nu = 1.5 if kernel_type == KernelType.MATERN32 else 2.5
+                # chi-squared with 2 nu (an integer) degrees of freedom: a sum of squared standard normals
+                chi2 = torch.randn(n_features, int(2 * nu), dtype=dtype, device=device, generator=generator).pow(2).sum(dim=1, keepdim=True)
+                scale = torch.sqrt(2 * nu / chi2)
+            elif kernel_type == KernelType.RQ:
+                alpha = base_kernel.alpha.item()
+                # torch has no Gamma sampler that takes a generator: numpy's, seeded from it
+                rng = np.random.default_rng(int(torch.randint(2**62, (1,), device=device, generator=generator)))
+                scale = torch.from_numpy(rng.gamma(alpha, 1 / alpha, size=(n_features, 1))).to(dtype=dtype, device=device).sqrt()
+            else:
+                raise ValueError(f"Unsupported kernel type for random Fourier features: {kernel_type}")
+            self.frequencies = normal * scale / lengthscale
+            self.phases = 2 * math.pi * torch.rand(n_features, dtype=dtype, device=device, generator=generator)
+            self.amplitude = torch.sqrt(2 * outputscale / n_features)
+
+            # Posterior weights: prior sample corrected by the training residual (Matheron's rule)
+            features = self.features(train_x)
+            prior_weights = torch.randn(n_features, dtype=dtype, device=device, generator=generator)
+            noise_sample = noise.sqrt() * torch.randn(train_x.shape[0], dtype=dtype, device=device, generator=generator)
+            residual = train_y - self.mean_constant - features @ prior_weights - noise_sample
+            if train_x.shape[0] <= n_features:
+                gram = features @ features.T + noise * torch.eye(train_x.shape[0], dtype=dtype, device=device)
+                chol = psd_safe_cholesky(gram)
+                self.weights = prior_weights + features.T @ torch.cholesky_solve(residual.unsqueeze(-1), chol).squeeze(-1)
+            else:
+                gram = features.T @ features + noise * torch.eye(n_features, dtype=dtype, device=device)
+                chol = psd_safe_cholesky(gram)
+                self.weights = prior_weights + torch.cholesky_solve((features.T @ residual).unsqueeze(-1), chol).squeeze(-1)
+
+            # the feature amplitude is folded into the weights for evaluation
+            self.scaled_weights = self.amplitude * self.weights
+
+    def features(self, x):
+        return self.amplitude * torch.cos(torch.addmm(self.phases, x, self.frequencies.T))
+
+    def __call__(self, x):
+        """Sample values at the rows of x (normalized inputs), in the normalized y space (differentiable in x)"""
+        # one (n, n_features) buffer: projection, phase shift and cosine in place (out of place if differentiated)
+        projection = torch.addmm(self.phases, x.to(self.weights.dtype), self.frequencies.T)
+        projection = projection.cos() if torch.is_grad_enabled() else projection.cos_()
+        return self.mean_constant + projection @ self.scaled_weights
+
+
+class CompactSupportPosterior:
+    """
+    Predictive posterior of a trained GPModel with a compactly supported (KernelType.WENDLAND) base kernel.
+    Only training points within one lengthscale of a candidate correlate with it, so the candidate-train
+    cross-covariance is built from a KD-tree neighbour search as a sparse matrix. Candidates with no training point
+    in range get the prior mean and variance without any solve.
+    The training covariance is factorized with a sparse LU once it has at least sparse_min_size points and at most
+    sparse_max_density nonzeros, and with a dense Cholesky otherwise.
+    The sparse path only pays off when the learned lengthscale is small: see pays_off, which is decided from a
+    neighbour count before anything is factorized; the factorization is done on the first prediction.
+    """
+    def __init__(self, model, likelihood, train_x, train_y, sparse_min_size=1000, sparse_max_density=0.05, block_size=2**22):
+        with torch.no_grad():
+            scale_kernel = model.scale_kernel
+            self.dtype, self.device = train_x.dtype, train_x.device
+            self.lengthscale = scale_kernel.base_kernel.lengthscale.item()
+            self.exponent = wendland_exponent(train_x.shape[1])
+            self.outputscale = scale_kernel.outputscale.item()
+            self.noise = likelihood.noise.item()
+            self.mean_constant = model.mean_module.constant.item()
+            # number of (row, training point) entries of a dense right-hand side solved at once
+            self.block_size = block_size
+
+            n = train_x.shape[0]
+            self.n_train = n
+            self.train_y = train_y
+            self.tree = cKDTree((train_x / self.lengthscale).cpu().numpy())
+            # nonzeros of the training covariance (pairs in range, the diagonal included) without building it
+            nnz = self.tree.count_neighbors(self.tree, 1.0)
+            self.density = nnz / (n * n)
+            self.sparse_factor = n >= sparse_min_size and nnz <= sparse_max_density * n * n
+            self.solve = None
+            self.alpha = None
+
+    @property
+    def pays_off(self):
+        """Whether the covariance is sparse enough for neighbour-search scoring to beat dense scoring"""
+        return self.density <= COMPACT_MAX_DENSITY
+
+    def _factorize(self):
+        """Factorize the training covariance and solve for the weights of the posterior mean"""
+        n = self.n_train
+        train_covar = (self._covariance(self.tree, self.tree, (n, n)) + self.noise * sp.identity(n)).tocsc()
+        if self.sparse_factor:
+            factor = splu(train_covar)
+            self.solve = factor.solve
+        else:
+            chol = psd_safe_cholesky(torch.from_numpy(train_covar.toarray()))
+            self.solve = lambda rhs: torch.cholesky_solve(torch.from_numpy(rhs), chol).numpy()
+        self.alpha = self.solve((self.train_y - self.mean_constant).cpu().numpy().reshape(-1, 1)).reshape(-1)
+
+    def _covariance(self, tree1, tree2, shape):
+        """Sparse scaled kernel matrix between the points of two KD-trees (scaled by the lengthscale)"""
+        pairs = tree1.sparse_distance_matrix(tree2, max_distance=1.0, output_type='ndarray')
+        dist = pairs['v']
+        values = self.outputscale * (1 - dist) ** (self.exponent + 1) * ((self.exponent + 1) * dist + 1)
+        return sp.coo_matrix((values, (pairs['i'], pairs['j'])), shape=shape).tocsr()
+
+    def predict_points(self, x, with_variance=True):
+        """Posterior mean and variance (None if not with_variance) at the rows of x (normalized inputs)"""
+        if self.alpha is None:
+            with torch.no_grad():
+                self._factorize()
+        query = cKDTree((x.to(torch.double) / self.lengthscale).cpu().numpy())
+        cross_covar = self._covariance(query, self.tree, (x.shape[0], self.n_train))
+        mean = torch.from_numpy(self.mean_constant + cross_covar @ self.alpha)
+        if not with_variance:
+            return mean.to(device=self.device, dtype=self.dtype), None
+
+        latent_variance = np.full(x.shape[0], self.outputscale)
+        rows = np.flatnonzero(np.diff(cross_covar.indptr))
+        n_block = max(1, self.block_size // self.n_train)
+        for start in range(0, rows.shape[0], n_block):
+            block_rows = rows[start:start + n_block]
+            block = cross_covar[block_rows]
+            solved = self.solve(block.T.toarray())
+            latent_variance[block_rows] -= np.asarray(block.multiply(solved.T).sum(axis=1)).reshape(-1)
+        variance = torch.from_numpy(latent_variance + self.noise).to(device=self.device, dtype=self.dtype)
+        return mean.to(device=self.device, dtype=self.dtype), variance.clamp_min(gpytorch.settings.min_variance.value(self.dtype))
@@ -0,0 +1,98 @@
+import torch
+from torch.quasirandom import SobolEngine
+
+from core.candidates import CandidateGrid, CandidatePool, CandidateSubset, domain_bounds
+from core.observations import ObservationStore
+
+# Sampled points are mapped to approximately nearest pool rows (cKDTree eps): exact queries far from the rows are slow
+NEAREST_EPS = 2.0
+
+
+class CandidateSampler:
+    """
+    Base class of candidate samplers for BayesianOptimizer.get_next_points(candidate_sampler=...).
+    A sampler draws at most n_samples remaining candidates of a CandidateGrid or CandidatePool,
+    so that the cost of a step is bounded by n_samples instead of the number of candidates.
+    """
+    def __init__(self, n_samples=2048):
+        self.n_samples = n_samples
+
+    def sample(self, filtered_candidate_x, train_x, train_y):
+        """Indices of the sampled candidates (remaining, unique)"""
+        raise NotImplementedError
+
+    def subset(self, filtered_candidate_x, train_x, train_y):
+        """The sampled candidates as a CandidateSubset, or all candidates if there are at most n_samples"""
+        if not isinstance(filtered_candidate_x, (CandidateGrid, CandidatePool)):
+            raise ValueError(f"Candidate samplers draw from a CandidateGrid or CandidatePool, not {type(filtered_candidate_x).__name__}")
+        if len(filtered_candidate_x) <= self.n_samples:
+            return filtered_candidate_x
+        if isinstance(train_x, ObservationStore):
+            train_x, train_y = train_x.x, train_x.y
+        idx = self.sample(filtered_candidate_x, train_x, train_y)
+        if idx.shape[0] == 0:
+            # every drawn candidate was evaluated already
+            return filtered_candidate_x
+        return CandidateSubset(filtered_candidate_x, idx)
+
+    @staticmethod
+    def _remaining(filtered_candidate_x, idx):
+        """Unique indices of idx that have not been evaluated, in order of first appearance"""
+        idx, inverse = torch.unique(idx, return_inverse=True)
+        first = torch.full((idx.shape[0],), inverse.shape[0], dtype=torch.long, device=idx.device)
+        first.scatter_reduce_(0, inverse, torch.arange(inverse.shape[0], device=idx.device), reduce='amin')
+        idx = idx[torch.argsort(first)]
+        return idx[~torch.from_numpy(filtered_candidate_x.evaluated.contains(idx.cpu().numpy())).to(idx.device)]
+
+
+class UniformSampler(CandidateSampler):
+    """Uniform random subset of the remaining candidates"""
+    def sample(self, filtered_candidate_x, train_x, train_y):
+        if isinstance(filtered_candidate_x, CandidatePool):
+            remaining = filtered_candidate_x.remaining_indices()
+            return remaining[torch.randperm(remaining.shape[0], device=remaining.device)[:self.n_samples]]
+        # The grid is never enumerated: draw flat indices and reject the evaluated ones
+        idx = torch.empty(0, dtype=torch.long, device=filtered_candidate_x.device)
+        while idx.shape[0] < self.n_samples:
+            draw = torch.randint(filtered_candidate_x.n_total, (2 * self.n_samples,), device=filtered_candidate_x.device)
+            idx = self._remaining(filtered_candidate_x, torch.cat([idx, draw]))
+        return idx[:self.n_samples]
+
+
+class StratifiedSampler(CandidateSampler):
+    """Candidates nearest to a scrambled Sobol sequence over the candidate domain (space-filling subset)"""
+    def sample(self, filtered_candidate_x, train_x, train_y):
+        lower, upper = domain_bounds(filtered_candidate_x)
+        sobol = SobolEngine(lower.shape[0], scramble=True, seed=int(torch.randint(2**31 - 1, (1,))))
+        x = lower + (upper - lower) * sobol.draw(self.n_samples, dtype=lower.dtype).to(lower.device)
+        return self._remaining(filtered_candidate_x, filtered_candidate_x.nearest_indices(x, eps=NEAREST_EPS))
+
+
+class PerturbationSampler(CandidateSampler):
+    """
+    Candidates nearest to Gaussian perturbations of the top_k observed points (lowest y),
+    with a standard deviation of scale times the extent of the candidate domain
+    """
+    def __init__(self, n_samples=2048, top_k=5, scale=0.1):
+        super().__init__(n_samples=n_samples)
+        self.top_k = top_k
+        self.scale = scale
+
+    def sample(self, filtered_candidate_x, train_x, train_y):
+        lower, upper = domain_bounds(filtered_candidate_x)
+        lower, upper = lower.to(train_x.dtype), upper.to(train_x.dtype)
+        centers = train_x[torch.topk(train_y, min(self.top_k, train_y.shape[0]), largest=False).indices]
+        centers = centers.repeat_interleave(-(-self.n_samples // centers.shape[0]), dim=0)[:self.n_samples]
+        x = centers + self.scale * (upper - lower) * torch.randn(centers.shape, dtype=centers.dtype, device=centers.device)
+        x = torch.max(torch.min(x, upper), lower)
+        return self._remaining(filtered_candidate_x, filtered_candidate_x.nearest_indices(x, eps=NEAREST_EPS))
+
+
+class UnionSampler(CandidateSampler):
+    """Union of the candidates drawn by several samplers (n_samples is the sum of theirs)"""
+    def __init__(self, samplers):
+        super().__init__(n_samples=sum(sampler.n_samples for sampler in samplers))
+        self.samplers = samplers
+
+    def sample(self, filtered_candidate_x, train_x, train_y):
+        return self._remaining(filtered_candidate_x, torch.cat([sampler.sample(filtered_candidate_x, train_x, train_y) for sampler in self.samplers]))
@@ -0,0 +1,189 @@
+import copy
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import torch
+
+from core.candidates import CandidatePool, CandidateSet, CandidateSubset
+from core.kernels_and_acquisitions import KernelType, AcquisitionType, GPBackend
+from core.observations import ObservationStore
+from core.posterior import GPPosterior
+
+
+class SpeculativeOptimizer:
+    """
+    Precomputes the next step of a BayesianOptimizer while the objective is evaluated at next_x.
+    speculate() starts a background thread that predicts the outcome y of next_x with the GP and runs the step that
+    follows (BOOST.recommend when a BOOST is given, then get_shortlist) once per plausible outcome: the posterior
+    quantiles of y, the median (the fantasized mean) first.
+    resolve(y) returns the precomputed step of the outcome within tol posterior standard deviations of y.
+    Otherwise the kernel, acquisition and backend recommended for the nearest outcome are kept and the cheap
+    correction runs get_next_point with y over the union of the precomputed shortlists only (BOOST is not rerun);
+    it is exact when the best candidate for y is in one of them. Without any finished precomputation, all candidates
+    are scored.
+    Thompson sampling shortlists by one sample path and the cost-aware acquisitions by the cost_model given to
+    speculate(); the background uses a snapshot of it without the cost of next_x, which is not observed yet.
+    The candidates must not change between speculate() and resolve(): remove next_x from them before speculate().
+    """
+    def __init__(self, optimizer, quantiles=(0.5, 0.1, 0.9), boost=None, tol=0.25, shortlist_size=1024):
+        self.optimizer = optimizer
+        # Shallow copy with its own model pool (see BayesianOptimizer.__getstate__) for the background thread.
+        # The background thread never touches the global RNGs (the objective may be drawing from them meanwhile):
+        # its draws come from generators of its own, seeded like set_seed would be.
+        self.background = copy.copy(optimizer)
+        self.background.generator = torch.Generator(device=self.background.device)
+        self.quantiles = quantiles
+        self.boost = boost
+        if boost is not None:
+            # the BOOST is only used on the background thread
+            boost.generator = torch.Generator(device=boost.device)
+        self.tol = tol
+        self.shortlist_size = shortlist_size
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+        self.step = None
+        self.prediction = None
+        self.futures = []
+        # Steps resolved from a precomputation and by a correction, for benchmarks
+        self.n_hits = 0
+        self.n_corrections = 0
+
+    @property
+    def pending(self):
+        """True between speculate() and resolve()"""
+        return self.step is not None
+
+    def speculate(self, observations, candidates, next_x, next_idx, kernel_type, acquisition_type, backend=None, objective=None, seed=0, iter=0, cost_model=None):
+        """
+        Start precomputing the step after next_x (1, dim) with candidate index next_idx.
+        observations (an ObservationStore) does not contain next_x yet; it is copied, so it may be appended to.
+        kernel_type, acquisition_type and backend are used without a BOOST; seed is set before every get_next_point
+        and iter seeds BOOST.recommend, as in get_kernel_acq. cost_model is needed for the cost-aware acquisitions.
+        """
+        self.cancel()
+        self.step = {
+            'x': observations.x.clone(),
+            'y': observations.y.clone(),
+            'idx': observations.idx.clone(),
+            'next_x': next_x,
+            'next_idx': next_idx if isinstance(candidates, CandidatePool) else None,
+            'candidates': candidates,
+            'kernel_type': kernel_type,
+            'acquisition_type': acquisition_type,
+            'backend': backend or self.optimizer.backend,
+            'objective': objective,
+            'seed': seed,
+            'iter': iter,
+            'cost_model': cost_model,
+            'background_cost_model': self._snapshot(cost_model),
+        }
+        # The single worker runs the prediction first, then the outcomes in the order of the quantiles
+        self.prediction = self.step['prediction'] = self.executor.submit(self._predict, self.step)
+        self.futures = [self.executor.submit(self._run_step, self.step, k) for k in range(len(self.quantiles))]
+
+    def resolve(self, y):
+        """(kernel_type, acquisition_type, backend, next_x, next_idx) of the step after observing y at next_x"""
+        if self.step is None:
+            raise ValueError("resolve() needs a speculate() first")
+        step = self.step
+        y = float(y.reshape(-1)[0]) if isinstance(y, torch.Tensor) else float(y)
+        outcomes, stddev = self.prediction.result()
+        k = int(torch.argmin((outcomes - y).abs()))
+        if abs(outcomes[k].item() - y) <= self.tol * stddev:
+            result = self.futures[k].result()
+            self.n_hits += 1
+            self.cancel()
+            return result[:5]
+
+        if self.boost is not None:
+            kernel_type, acquisition_type, backend = self.futures[k].result()[:3]
+        else:
+            kernel_type, acquisition_type, backend = step['kernel_type'], step['acquisition_type'], step['backend']
+        shortlists = [future.result()[5] for future in self.cancel() if not future.cancelled()]
+        candidates = step['candidates']
+        if shortlists:
+            candidates = CandidateSubset(candidates, torch.unique(torch.cat(shortlists)))
+        self.n_corrections += 1
+        self.optimizer.set_seed(step['seed'])
+        next_x, _, next_idx = self.optimizer.get_next_point(
+            train_x=self._observations(step, y),
+            train_y=None,
+            filtered_candidate_x=candidates,
+            filtered_candidate_y=None,
+            kernel_type=kernel_type,
+            acquisition_type=acquisition_type,
+            backend=backend,
+            cost_model=step['cost_model'],
+        )
+        return kernel_type, acquisition_type, backend, next_x, next_idx
+
+    def cancel(self):
+        """Drop the outcomes not started yet and wait for the running one; returns the futures of the outcomes"""
+        futures = self.futures
+        for future in futures:
+            future.cancel()
+        wait(futures + ([self.prediction] if self.prediction is not None else []))
+        self.step, self.prediction, self.futures = None, None, []
+        return futures
+
+    def close(self):
+        self.cancel()
+        self.executor.shutdown()
+
+    @staticmethod
+    def _snapshot(cost_model):
+        """Copy of cost_model with its own observations, so that the caller may observe and fit it meanwhile"""
+        if cost_model is None:
+            return None
+        snapshot = copy.copy(cost_model)
+        snapshot.x, snapshot.cost = list(cost_model.x), list(cost_model.cost)
+        snapshot.optimizer = copy.copy(cost_model.optimizer)
+        return snapshot
+
+    @staticmethod
+    def _observations(step, y):
+        """Copy of the observations with next_x observed at y"""
+        observations = ObservationStore.from_tensors(step['x'], step['y'], capacity=step['x'].shape[0] + 1, idx=step['idx'])
+        observations.append(step['next_x'], torch.tensor([y], dtype=step['x'].dtype, device=step['x'].device), step['next_idx'])
+        return observations
+
+    def _predict(self, step):
+        """Outcomes (one per quantile) and posterior standard deviation of y at next_x"""
+        optimizer = self.background
+        optimizer.seed_step(step['seed'])
+        x_min, x_range, y_median, y_std, train_x_normalized, train_y_normalized = optimizer.normalize_data(step['x'], step['y'])
+        model, likelihood = optimizer._train_model(train_x_normalized=train_x_normalized, train_y_normalized=train_y_normalized, kernel_type=step['kernel_type'])
+        model.eval()
+        likelihood.eval()
+        with torch.no_grad():
+            posterior = GPPosterior(model, likelihood, train_x_normalized, train_y_normalized, step['kernel_type'])
+            mean, variance = posterior.predict_points((step['next_x'] - x_min) / x_range)
+            normal = torch.distributions.Normal(0.0, 1.0)
+            z = normal.icdf(torch.tensor(self.quantiles, dtype=mean.dtype))
+            stddev = variance.sqrt() * y_std
+            outcomes = mean * y_std + y_median + z * stddev
+        return outcomes, stddev.item()
+
+    def _run_step(self, step, k):
+        outcomes, _ = step['prediction'].result()
+        y = outcomes[k].item()
+        kernel_type, acquisition_type, backend = step['kernel_type'], step['acquisition_type'], step['backend']
+        if self.boost is not None:
+            observations = self._observations(step, y)
+            recommended = self.boost.recommend(train_x_init=observations.x, train_y_init=observations.y, objective=step['objective'], seed=step['iter'])
+            kernel_type = KernelType(recommended['recommended_kernel'])
+            acquisition_type = AcquisitionType(recommended['recommended_acquisition'])
+            backend = GPBackend(recommended['recommended_backend'])
+        self.background.seed_step(step['seed'])
+        shortlist = self.background.get_shortlist(
+            train_x=self._observations(step, y),
+            train_y=None,
+            filtered_candidate_x=step['candidates'],
+            kernel_type=kernel_type,
+            acquisition_type=acquisition_type,
+            shortlist_size=self.shortlist_size,
+            backend=backend,
+            cost_model=step['background_cost_model'],
+        )
+        candidates = step['candidates']
+        next_x = candidates.points(shortlist[:1]) if isinstance(candidates, CandidateSet) else candidates[shortlist[:1]]
+        return kernel_type, acquisition_type, backend, next_x, shortlist[0], shortlist
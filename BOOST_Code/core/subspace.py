@@ -0,0 +1,135 @@
+import gpytorch
+import torch
+
+from core.candidates import CandidateGrid, CandidatePool, CandidateSet, CandidateSubset, domain_bounds
+from core.kernels_and_acquisitions import KernelType, SubspaceMethod
+from core.observations import ObservationStore
+
+
+class ProjectedCandidates(CandidateSet):
+    """
+    Candidates of a CandidateSet (or a tensor of candidate points) scored in a Subspace: chunks yield the indices of
+    the source and the projected points (n, n_dims), points() the points themselves (e.g. for a CostModel).
+    """
+    def __init__(self, source, subspace):
+        super().__init__(n_total=source.n_total if isinstance(source, CandidateSet) else source.shape[0], device=subspace.projection.device)
+        self.source = source
+        self.subspace = subspace
+
+    def __len__(self):
+        return len(self.source) if isinstance(self.source, CandidateSet) else self.source.shape[0]
+
+    def points(self, idx):
+        return self.source.points(idx) if isinstance(self.source, CandidateSet) else self.source[idx]
+
+    def iter_chunks(self, chunk_size=65536):
+        if isinstance(self.source, CandidateSet):
+            chunks = self.source.iter_chunks(chunk_size)
+        else:
+            chunks = ((torch.arange(start, min(start + chunk_size, self.source.shape[0]), device=self.source.device), self.source[start:start + chunk_size]) for start in range(0, self.source.shape[0], chunk_size))
+        for idx, x in chunks:
+            yield idx, self.subspace.project(x)
+
+
+class Subspace:
+    """
+    Low-dimensional subspace mode for BayesianOptimizer.get_next_points(subspace=...) in high-dimensional spaces.
+    The GP is fitted and the candidates are scored on n_dims coordinates z = u @ projection of the points u
+    normalized to the candidate domain [0, 1]^dim:
+    SubspaceMethod.RANDOM_EMBEDDING: a random (dim, n_dims) projection with orthonormal columns, drawn once.
+    SubspaceMethod.ACTIVE_AXES: the n_dims axes with the largest mean squared gradient of the posterior mean of a
+    GP on all dim coordinates at the observations (the diagonal of the active subspace matrix), refitted every
+    refit_every calls.
+    The candidates stay the points of the pool or grid: every remaining row of a CandidatePool (or tensor) is scored
+    in projection. A CandidateGrid is not enumerated: n_samples points of the subspace through the incumbent (the
+    inactive axes, or the orthogonal complement of the embedding, kept at the incumbent) are snapped to the nearest
+    grid points and the remaining ones are scored.
+    The domain is fixed by the first fit_domain (or restrict) call, so that the projection of a point never changes;
+    fit it on the whole candidate domain before copying the subspace (e.g. for the BOOST combinations).
+    """
+    def __init__(self, dim, n_dims=4, method=SubspaceMethod.RANDOM_EMBEDDING, n_samples=4096, refit_every=5, kernel_type=KernelType.MATERN52, seed=0):
+        if not 0 < n_dims < dim:
+            raise ValueError(f"n_dims must be between 1 and dim - 1 = {dim - 1}")
+        self.dim = dim
+        self.n_dims = n_dims
+        self.method = method
+        self.n_samples = n_samples
+        self.refit_every = refit_every
+        self.kernel_type = kernel_type
+        self.generator = torch.Generator().manual_seed(seed)
+
+        self.lower = None
+        self.extent = None
+        self.projection = None
+        self.axes = None
+        self.n_calls = 0
+
+    def project(self, x):
+        """Subspace coordinates (n, n_dims) of the points x (n, dim)"""
+        return ((x.to(self.projection.dtype) - self.lower) / self.extent) @ self.projection
+
+    def fit_domain(self, filtered_candidate_x):
+        """Fix the domain the points are normalized to from the candidates, unless it is fixed already"""
+        if self.lower is None:
+            lower, upper = domain_bounds(filtered_candidate_x)
+            self.lower = lower
+            self.extent = (upper - lower).clamp_min(1e-12)
+
+    def restrict(self, optimizer, train_x, train_y, filtered_candidate_x):
+        """
+        Update the projection and return (projected train_x (n, n_dims), train_y, ProjectedCandidates of the
+        candidates to score). optimizer (a BayesianOptimizer) fits the GP that selects the active axes.
+        """
+        if isinstance(train_x, ObservationStore):
+            train_x, train_y = train_x.x, train_x.y
+        self.fit_domain(filtered_candidate_x)
+
+        if self.method == SubspaceMethod.RANDOM_EMBEDDING:
+            if self.projection is None:
+                q, _ = torch.linalg.qr(torch.randn(self.dim, self.n_dims, generator=self.generator, dtype=train_x.dtype))
+                self.projection = q.to(train_x.device)
+        elif self.method == SubspaceMethod.ACTIVE_AXES:
+            if self.projection is None or self.n_calls % self.refit_every == 0:
+                self.axes = torch.topk(self._sensitivity(optimizer, train_x, train_y), self.n_dims).indices
+                self.projection = torch.zeros(self.dim, self.n_dims, dtype=train_x.dtype, device=train_x.device)
+                self.projection[self.axes, torch.arange(self.n_dims, device=train_x.device)] = 1.0
+        else:
+            raise ValueError(f"Unsupported subspace method: {self.method}")
+        self.n_calls += 1
+
+        if isinstance(filtered_candidate_x, CandidateGrid):
+            candidates = self._grid_subset(filtered_candidate_x, train_x[torch.argmin(train_y)])
+        elif isinstance(filtered_candidate_x, CandidateSet) and not isinstance(filtered_candidate_x, (CandidatePool, CandidateSubset)):
+            raise ValueError(f"Unsupported candidate set for a subspace: {type(filtered_candidate_x).__name__}")
+        else:
+            candidates = filtered_candidate_x
+        return self.project(train_x), train_y, ProjectedCandidates(candidates, self)
+
+    def _sensitivity(self, optimizer, train_x, train_y):
+        """Mean squared partial derivative of the GP posterior mean along every axis, at the observations"""
+        x_min, x_range, y_median, y_std, train_x_normalized, train_y_normalized = optimizer.normalize_data(train_x, train_y)
+        with torch.enable_grad():
+            model, likelihood = optimizer._train_model(train_x_normalized=train_x_normalized, train_y_normalized=train_y_normalized, kernel_type=self.kernel_type)
+            model.eval()
+            likelihood.eval()
+            x = train_x_normalized.detach().clone().requires_grad_(True)
+            with gpytorch.settings.fast_pred_var():
+                mean = model(x).mean
+            grad = torch.autograd.grad(mean.sum(), x)[0]
+        # back to the domain scale: du/dx_normalized = x_range / extent
+        return (grad / (x_range / self.extent)).pow(2).mean(dim=0)
+
+    def _grid_subset(self, grid, incumbent):
+        """Remaining grid points nearest to n_samples random points of the subspace through the incumbent"""
+        center = (incumbent.to(self.projection.dtype) - self.lower) / self.extent
+        if self.method == SubspaceMethod.ACTIVE_AXES:
+            u = center.repeat(self.n_samples, 1)
+            u[:, self.axes] = torch.rand(self.n_samples, self.n_dims, generator=self.generator, dtype=u.dtype).to(u.device)
+        else:
+            w = 2 * torch.rand(self.n_samples, self.n_dims, generator=self.generator, dtype=center.dtype).to(center.device) - 1
+            u = (center + w @ self.projection.T).clamp(0, 1)
+        idx = torch.unique(grid.nearest_indices(self.lower + u * self.extent))
+        idx = idx[~torch.from_numpy(grid.evaluated.contains(idx.cpu().numpy())).to(idx.device)]
+        if idx.shape[0] == 0:
+            raise ValueError("Every grid point of the subspace has been evaluated")
+        return CandidateSubset(grid, idx)
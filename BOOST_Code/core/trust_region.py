@@ -0,0 +1,93 @@
+import copy
+
+import torch
+
+from core.candidates import CandidateGrid, CandidatePool, CandidateSet, CandidateSubset, ContinuousBox, domain_bounds
+from core.observations import ObservationStore
+
+
+class TrustRegion:
+    """
+    TuRBO-style trust region for BayesianOptimizer.get_next_points(trust_region=...).
+    The region is a box centred at the incumbent (best observed point) whose side is length times the extent of the
+    candidate domain in every dimension. Every call first updates the length from the previous step:
+    success_tolerance consecutive improvements of the best value double it (up to length_max),
+    failure_tolerance consecutive non-improvements halve it, and it restarts at length_init below length_min.
+    The GP is fitted on the observations inside the region (at least the min_points nearest to the incumbent)
+    and only the remaining candidates inside the region are scored.
+    """
+    def __init__(self, dim, length_init=0.8, length_min=0.5 ** 7, length_max=1.6, success_tolerance=3, failure_tolerance=None, min_points=None, improvement_tol=1e-3):
+        self.length_init = length_init
+        self.length_min = length_min
+        self.length_max = length_max
+        self.success_tolerance = success_tolerance
+        self.failure_tolerance = failure_tolerance or max(4, dim)
+        self.min_points = min_points or max(10, 2 * dim)
+        # relative improvement of the best value that counts as a success
+        self.improvement_tol = improvement_tol
+
+        self.length = length_init
+        self.best_y = None
+        self.n_success = 0
+        self.n_failure = 0
+        self.n_restarts = 0
+
+    def update(self, best_y):
+        """Expand or shrink the region depending on whether the best value improved since the last call"""
+        if self.best_y is not None:
+            if best_y < self.best_y - self.improvement_tol * abs(self.best_y):
+                self.n_success += 1
+                self.n_failure = 0
+            else:
+                self.n_success = 0
+                self.n_failure += 1
+
+            if self.n_success == self.success_tolerance:
+                self.length = min(2 * self.length, self.length_max)
+                self.n_success = 0
+            elif self.n_failure == self.failure_tolerance:
+                self.length /= 2
+                self.n_failure = 0
+            if self.length < self.length_min:
+                self.length = self.length_init
+                self.n_restarts += 1
+        self.best_y = best_y if self.best_y is None else min(self.best_y, best_y)
+
+    def restrict(self, train_x, train_y, filtered_candidate_x):
+        """
+        Update the region and return (local train_x, local train_y, local candidates).
+        The local candidates are a CandidateSubset (a ContinuousBox for a ContinuousBox); if the region holds no
+        remaining candidate, all candidates are returned.
+        """
+        if isinstance(train_x, ObservationStore):
+            train_x, train_y = train_x.x, train_x.y
+        best = torch.argmin(train_y)
+        self.update(train_y[best].item())
+
+        lower, upper = domain_bounds(filtered_candidate_x)
+        lower, upper = lower.to(train_x.dtype), upper.to(train_x.dtype)
+        extent = (upper - lower).clamp_min(1e-12)
+        center = train_x[best]
+        region_lower = torch.max(center - self.length / 2 * extent, lower)
+        region_upper = torch.min(center + self.length / 2 * extent, upper)
+
+        # Local training data: observations inside the region, or the min_points nearest to the incumbent
+        dist = ((train_x - center) / extent).abs().max(dim=1)[0]
+        inside = dist <= self.length / 2
+        if inside.sum() < self.min_points:
+            inside = torch.zeros_like(inside)
+            inside[torch.topk(dist, min(self.min_points, dist.shape[0]), largest=False).indices] = True
+
+        if isinstance(filtered_candidate_x, ContinuousBox):
+            local_candidates = copy.copy(filtered_candidate_x)
+            local_candidates.lower, local_candidates.upper = region_lower, region_upper
+            return train_x[inside], train_y[inside], local_candidates
+        if isinstance(filtered_candidate_x, (CandidateGrid, CandidatePool)):
+            idx = filtered_candidate_x.box_indices(region_lower, region_upper)
+        elif isinstance(filtered_candidate_x, CandidateSet):
+            raise ValueError(f"Unsupported candidate set for a trust region: {type(filtered_candidate_x).__name__}")
+        else:
+            idx = torch.nonzero(((filtered_candidate_x >= region_lower) & (filtered_candidate_x <= region_upper)).all(dim=1)).reshape(-1)
+        if idx.shape[0] == 0:
+            return train_x[inside], train_y[inside], filtered_candidate_x
+        return train_x[inside], train_y[inside], CandidateSubset(filtered_candidate_x, idx)
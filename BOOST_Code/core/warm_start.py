@@ -0,0 +1,138 @@
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+import torch
+
+from core.BayesianOptimization import BayesianOptimizer
+from core.kernels_and_acquisitions import KernelType, AcquisitionType
+
+
+class PriorStudy:
+    """
+    Evaluated points (x (n, dim), y (n,)) of a prior related study over the same search space, as a minimization
+    problem, and the kernel and acquisition function it ended with when they are known (saved trial outputs).
+    """
+    def __init__(self, x, y, name=None, kernel_type=None, acquisition_type=None):
+        self.x = torch.as_tensor(x, dtype=torch.double)
+        self.y = torch.as_tensor(y, dtype=torch.double).reshape(-1)
+        self.name = name
+        self.kernel_type = kernel_type
+        self.acquisition_type = acquisition_type
+
+    @classmethod
+    def from_trial_output(cls, path):
+        """Study from a *_final.xlsx file written by save_final_data_to_excel"""
+        points = pd.read_excel(path, sheet_name='Points')
+        metadata = pd.read_excel(path, sheet_name='Metadata').set_index('Parameter')['Value']
+        x_columns = [column for column in points.columns if column[0] == 'x' and column[1:].isdigit()]
+        kernels = {kernel_type.value: kernel_type for kernel_type in KernelType if kernel_type != KernelType.TBD}
+        acquisitions = {acquisition_type.value: acquisition_type for acquisition_type in AcquisitionType if acquisition_type != AcquisitionType.TBD}
+        return cls(
+            x=points[x_columns].values,
+            y=points['function_value'].values,
+            name=os.path.basename(path),
+            kernel_type=kernels.get(metadata.get('Kernel')),
+            acquisition_type=acquisitions.get(metadata.get('Acquisition')),
+        )
+
+    @classmethod
+    def from_csv(cls, path, maximize=False):
+        """Study from an HPO-B style CSV: x in the first columns, y in the last one"""
+        df = pd.read_csv(path)
+        y = df.iloc[:, -1].values
+        return cls(x=df.iloc[:, :-1].values, y=-y if maximize else y, name=os.path.basename(path))
+
+
+class WarmStart:
+    """
+    Transfer from prior related studies (PriorStudy) to a new run over the same search space.
+    initial_design() seeds the initial design with the best configurations of the studies, apply() starts every GP
+    fit of an optimizer from the hyperparameters fitted on the studies (geometric mean over the studies, at most
+    max_fit_points random points per study), and boost_prior() gives BOOST prior weights of the kernel-acquisition
+    combinations the studies ended with.
+    """
+    def __init__(self, studies, max_fit_points=300, seed=0):
+        if not studies:
+            raise ValueError("WarmStart needs at least one prior study")
+        self.studies = studies
+        self.max_fit_points = max_fit_points
+        self.seed = seed
+        self._hyperparameters = {}
+
+    @classmethod
+    def from_trial_outputs(cls, base_dir, objective_name=None, **kwargs):
+        """Studies from the *_final.xlsx trial outputs in base_dir (of objective_name only, if given)"""
+        pattern = f'{objective_name}_seed*_final.xlsx' if objective_name is not None else '*_final.xlsx'
+        paths = sorted(glob.glob(os.path.join(base_dir, pattern)))
+        return cls([PriorStudy.from_trial_output(path) for path in paths], **kwargs)
+
+    @classmethod
+    def from_csvs(cls, paths, maximize=False, **kwargs):
+        """Studies from HPO-B style CSVs, e.g. the other datasets of the same search space"""
+        return cls([PriorStudy.from_csv(path, maximize=maximize) for path in paths], **kwargs)
+
+    def initial_design(self, candidates, n_points):
+        """
+        Indices of up to n_points distinct remaining candidates of a CandidateGrid or CandidatePool, nearest to the
+        best configurations of the studies, taken round-robin over the studies (the best of every study first)
+        """
+        nearest = []
+        for study in self.studies:
+            top = torch.argsort(study.y)[:4 * n_points]
+            nearest.append(candidates.nearest_indices(study.x[top]).tolist())
+
+        selected = []
+        for rank in range(max(len(idx) for idx in nearest)):
+            for idx in nearest:
+                if rank < len(idx) and idx[rank] not in selected and not candidates.evaluated.contains(np.array([idx[rank]]))[0]:
+                    selected.append(idx[rank])
+                if len(selected) == n_points:
+                    return torch.tensor(selected, dtype=torch.long, device=candidates.device)
+        return torch.tensor(selected, dtype=torch.long, device=candidates.device)
+
+    def fit_hyperparameters(self, kernel_type):
+        """{'lengthscale', 'outputscale', 'noise'}: geometric means of GP fits of kernel_type on the studies"""
+        if kernel_type not in self._hyperparameters:
+            optimizer = BayesianOptimizer(reuse_models=False)
+            generator = torch.Generator().manual_seed(self.seed)
+            fits = {'lengthscale': [], 'outputscale': [], 'noise': []}
+            for study in self.studies:
+                x, y = study.x, study.y
+                if x.shape[0] > self.max_fit_points:
+                    keep = torch.randperm(x.shape[0], generator=generator)[:self.max_fit_points]
+                    x, y = x[keep], y[keep]
+                _, _, _, _, train_x_normalized, train_y_normalized = optimizer.normalize_data(x, y)
+                model, likelihood = optimizer._train_model(train_x_normalized=train_x_normalized, train_y_normalized=train_y_normalized, kernel_type=kernel_type)
+                fits['lengthscale'].append(model.scale_kernel.base_kernel.lengthscale.detach())
+                fits['outputscale'].append(model.scale_kernel.outputscale.detach())
+                fits['noise'].append(likelihood.noise.detach())
+            self._hyperparameters[kernel_type] = {name: torch.stack(values).log().mean(dim=0).exp() for name, values in fits.items()}
+        return self._hyperparameters[kernel_type]
+
+    def apply(self, optimizer, kernel_types):
+        """Start every GP fit of optimizer (a BayesianOptimizer) with one of kernel_types from the studies' fits"""
+        for kernel_type in kernel_types:
+            optimizer.initial_hyperparameters[kernel_type] = self.fit_hyperparameters(kernel_type)
+
+    def boost_prior(self, boost=None, n_samples=50):
+        """
+        BOOST prior {(kernel value, acquisition value): weight}: the share of the studies that ended with each
+        combination. Studies without a known combination (CSVs) get a BOOST.recommend on n_samples random points
+        if boost is given, and are skipped otherwise.
+        """
+        counts = {}
+        generator = torch.Generator().manual_seed(self.seed)
+        for study in self.studies:
+            if study.kernel_type is not None and study.acquisition_type is not None:
+                combination = (study.kernel_type.value, study.acquisition_type.value)
+            elif boost is not None:
+                keep = torch.randperm(study.x.shape[0], generator=generator)[:n_samples]
+                recommended = boost.recommend(train_x_init=study.x[keep], train_y_init=study.y[keep], seed=self.seed)
+                combination = (recommended['recommended_kernel'], recommended['recommended_acquisition'])
+            else:
+                continue
+            counts[combination] = counts.get(combination, 0) + 1
+        total = sum(counts.values())
+        return {combination: count / total for combination, count in counts.items()}
@@ -12,7 +12,7 @@ from datetime import datetime
 from _class_for_test_BOOST import TestFunction
 from benchmarks.Benchmark_ftn import Benchmarks
 from core.kernels_and_acquisitions import KernelType, AcquisitionType
-from utils.Save_results import save_individual_trial
+from utils.Save_results import save_cost_history, save_individual_trial
 
 def cleanup_resources(full=False): # clean resources if needed
     import gc, os, torch, multiprocessing as mp
@@ -85,6 +85,7 @@ def test_benchmark_function(use_boost=False, kernels=[KernelType.TBD], acquisiti
                     time.sleep(0.5)
                     cleanup_resources()
                 save_individual_trial(current_trial_results, objective.__name__, n_initial_points=n_init_points, base_dir=base_dir)
+                save_cost_history(current_trial_results, objective.__name__, n_initial_points=n_init_points, base_dir=base_dir)
                 cleanup_resources(full=True)
 
 
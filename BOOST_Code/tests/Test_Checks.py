@@ -0,0 +1,552 @@
+import asyncio
+import os
+import pickle
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import tempfile
+import threading
+import time
+
+import numpy as np
+import torch
+from gpytorch.kernels import MaternKernel, RBFKernel, RQKernel
+from joblib import parallel_backend
+
+from core.BOOST import BOOST
+from core.acquisition_cache import AcquisitionCache
+from core.async_loop import AsyncOptimizer, Evaluator
+from core.BayesianOptimization import BayesianOptimizer
+from core.candidates import CandidateGrid, CandidatePool, CandidateSubset, ContinuousBox, PairwiseDistanceCache
+from core.cost import CostModel
+from core.kernels_and_acquisitions import KernelType, AcquisitionType, BatchStrategy, EvaluationMode, GPBackend, PoolDistanceKernel, WendlandKernel
+from core.memmap_pool import MemmapPool
+from core.objectives import Objective
+from core.observations import ObservationStore
+from core.posterior import CompactSupportPosterior, FantasyPosterior, GPPosterior
+from core.speculative import SpeculativeOptimizer
+from core.subspace import Subspace
+
+
+# Behaviour checks of the core modules, on small problems. Run with python Test_Checks.py or pytest Test_Checks.py;
+# Test_Runtime.py holds the timing benchmarks.
+
+def quadratic(x):
+    return (x - 0.3).pow(2).sum(dim=1) + 0.1 * torch.sin(10 * x).sum(dim=1)
+
+
+def sleepy_sum(x):
+    """Sum of the coordinates of x (1, dim) after sleeping x[0, 0] seconds"""
+    time.sleep(float(x[0, 0]))
+    return x.sum(dim=1)
+
+
+def fit(kernel_type, n_train=20, dim=3, seed=0):
+    """GP fitted on n_train random points: (optimizer, model, likelihood, x_min, x_range, y_median, y_std, train_x_normalized, train_y_normalized)"""
+    optimizer = BayesianOptimizer()
+    optimizer.set_seed(seed)
+    train_x = torch.rand(n_train, dim, dtype=torch.double)
+    x_min, x_range, y_median, y_std, train_x_normalized, train_y_normalized = optimizer.normalize_data(train_x, quadratic(train_x))
+    model, likelihood = optimizer._train_model(train_x_normalized=train_x_normalized, train_y_normalized=train_y_normalized, kernel_type=kernel_type)
+    model.eval()
+    likelihood.eval()
+    return optimizer, model, likelihood, x_min, x_range, y_median, y_std, train_x_normalized, train_y_normalized
+
+
+def run_pool(optimizer, candidate_pool, candidate_x, candidate_y, kernel_type, acquisition_type, n_steps=5, seed=0, acquisition_cache=None):
+    """Pool rows picked by n_steps BO steps from 10 random initial rows"""
+    optimizer.set_seed(seed)
+    index_initial_sample = torch.randperm(candidate_x.shape[0])[:10]
+    candidate_pool.remove(index_initial_sample)
+    observations = ObservationStore.from_tensors(candidate_x[index_initial_sample], candidate_y[index_initial_sample], idx=index_initial_sample)
+    selected = []
+    for _ in range(n_steps):
+        next_x, next_y, next_idx = optimizer.get_next_point(train_x=observations, train_y=None, filtered_candidate_x=candidate_pool, filtered_candidate_y=None, kernel_type=kernel_type, acquisition_type=acquisition_type, acquisition_cache=acquisition_cache)
+        observations.append(next_x, next_y, next_idx)
+        candidate_pool.remove(next_idx)
+        selected.append(int(next_idx))
+    return selected
+
+
+def test_grid_matches_cartesian_prod():
+    """CandidateGrid points, encode and removal against the materialized torch.cartesian_prod grid"""
+    grid = CandidateGrid.from_bounds(bounds=[-1.0, 2.0], n_grid=7, dim=3)
+    dense = torch.cartesian_prod(*grid.axes)
+    idx = torch.arange(grid.n_total)
+    assert torch.equal(grid.points(idx), dense)
+    assert torch.equal(grid.encode(dense), idx)
+    grid.remove_points(dense[[3, 50, 200]])
+    assert len(grid) == grid.n_total - 3
+    remaining = torch.cat([chunk_idx for chunk_idx, _ in grid.iter_chunks(chunk_size=64)])
+    assert torch.equal(remaining, idx[~torch.isin(idx, torch.tensor([3, 50, 200]))])
+    # 10**20 points overflow the int64 flat indices, 10**12 points the default bitset budget
+    for n_grid, dim in [(10, 20), (10, 12)]:
+        try:
+            CandidateGrid.from_bounds(bounds=[0.0, 1.0], n_grid=n_grid, dim=dim)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"CandidateGrid of {n_grid}**{dim} points was built")
+
+
+def test_box_snap_matches_grid():
+    """ContinuousBox.snap and CandidateGrid.encode agree on the nearest grid point, inside and outside the bounds"""
+    torch.manual_seed(0)
+    axes = [torch.linspace(-1.0, 2.0, 7, dtype=torch.double), torch.tensor([0.5], dtype=torch.double), torch.tensor([0.0, 0.1, 1.0], dtype=torch.double)]
+    grid = CandidateGrid(axes)
+    box = ContinuousBox([-1.0, 0.5, 0.0], [2.0, 0.5, 1.0], snap_axes=axes)
+    x = torch.rand(500, 3, dtype=torch.double) * 4 - 1.5
+    assert torch.equal(box.snap(x), grid.decode(grid.nearest_indices(x)))
+    assert torch.equal(box.points(box.snap(grid.points(torch.arange(grid.n_total)))), grid.points(torch.arange(grid.n_total)))
+
+
+def test_subset_removal():
+    """A CandidateSubset removes the source indices it is given, however large, and forks keep their own removals"""
+    grid = CandidateGrid.from_bounds(bounds=[0.0, 1.0], n_grid=10, dim=3)
+    idx = torch.tensor([998, 3, 500, 12, 777, 40, 41, 999, 0, 64])
+    subset = CandidateSubset(grid, idx)
+    fork = subset.fork()
+    subset.remove(torch.tensor([999, 500, 5, 3]))
+    remaining = torch.cat([chunk_idx for chunk_idx, _ in subset.iter_chunks(chunk_size=8)])
+    assert torch.equal(remaining, torch.tensor([998, 12, 777, 40, 41, 0, 64])) and len(subset) == 7
+    assert torch.equal(torch.cat([chunk_idx for chunk_idx, _ in fork.iter_chunks()]), idx) and len(fork) == 10
+
+
+def test_chunked_argmax_matches_dense():
+    """The pick of chunked scoring over a CandidateGrid equals the pick over the dense tensor of its remaining points"""
+    torch.manual_seed(0)
+    for kernel_type in [KernelType.RBF, KernelType.MATERN52]:
+        for acquisition_type in [AcquisitionType.EI, AcquisitionType.UCB, AcquisitionType.PM]:
+            grid = CandidateGrid.from_bounds(bounds=[0.0, 1.0], n_grid=9, dim=3)
+            train_idx = torch.randperm(grid.n_total)[:12]
+            grid.remove(train_idx)
+            train_x = grid.points(train_idx)
+            train_y = quadratic(train_x)
+            remaining = torch.cat([chunk_idx for chunk_idx, _ in grid.iter_chunks()])
+            picks = []
+            for candidates, chunk_size in [(grid, 50), (grid.points(remaining), 65536)]:
+                optimizer = BayesianOptimizer(chunk_size=chunk_size, kronecker_grid=False)
+                optimizer.set_seed(0)
+                next_x, _, _ = optimizer.get_next_point(train_x=train_x, train_y=train_y, filtered_candidate_x=candidates, filtered_candidate_y=None, kernel_type=kernel_type, acquisition_type=acquisition_type)
+                picks.append(next_x)
+            assert torch.equal(picks[0], picks[1]), (kernel_type, acquisition_type)
+
+
+def test_mixed_precision_moments():
+    """float32 scoring (Precision.MIXED) stays within float32 accuracy of the float64 moments"""
+    for kernel_type in [KernelType.RBF, KernelType.MATERN52, KernelType.RQ]:
+        _, model, likelihood, _, _, _, _, train_x_normalized, train_y_normalized = fit(kernel_type)
+        x = torch.rand(500, train_x_normalized.shape[1], dtype=torch.double)
+        mean, variance = GPPosterior(model, likelihood, train_x_normalized, train_y_normalized, kernel_type).predict_points(x)
+        mean32, variance32 = GPPosterior(model, likelihood, train_x_normalized, train_y_normalized, kernel_type, dtype=torch.float32).predict_points(x)
+        assert mean32.dtype == torch.float32
+        assert torch.allclose(mean32.double(), mean, atol=1e-3)
+        assert torch.allclose(variance32.double(), variance, atol=1e-3)
+
+
+def test_observation_store_statistics():
+    """ObservationStore statistics and normalization against normalize_data on the raw tensors, across buffer growth"""
+    torch.manual_seed(0)
+    x = torch.rand(45, 4, dtype=torch.double)
+    y = quadratic(x)
+    store = ObservationStore.from_tensors(x[:3], y[:3], capacity=4)
+    for start, stop in [(3, 4), (4, 20), (20, 45)]:
+        store.append(x[start:stop], y[start:stop])
+        assert torch.equal(store.x, x[:stop]) and torch.equal(store.y, y[:stop])
+        assert store.y_min == y[:stop].min().item()
+        expected = BayesianOptimizer.normalize_data(x[:stop], y[:stop])
+        for value, expected_value in zip(store.normalize(), expected):
+            assert torch.allclose(torch.as_tensor(value), torch.as_tensor(expected_value), rtol=1e-12, atol=1e-12)
+    assert store.capacity >= 45
+
+
+def test_kronecker_grid_moments():
+    """Per-dimension RBF grid scoring against likelihood(model(x)) on the remaining grid points"""
+    _, model, likelihood, x_min, x_range, _, _, train_x_normalized, train_y_normalized = fit(KernelType.RBF)
+    grid = CandidateGrid.from_bounds(bounds=[0.0, 1.0], n_grid=8, dim=3)
+    grid.remove(torch.tensor([0, 5, 77, 300]))
+    posterior = GPPosterior(model, likelihood, train_x_normalized, train_y_normalized, KernelType.RBF)
+    for flat_idx, mean, variance in posterior.iter_rbf_grid(grid, x_min, x_range, chunk_size=64):
+        with torch.no_grad():
+            observed_pred = likelihood(model((grid.points(flat_idx) - x_min) / x_range))
+        assert not torch.isin(flat_idx, torch.tensor([0, 5, 77, 300])).any()
+        assert torch.allclose(mean, observed_pred.mean, atol=1e-8)
+        assert torch.allclose(variance, observed_pred.variance, atol=1e-8)
+
+
+def test_fantasy_update_matches_refit():
+    """FantasyPosterior rank-one updates against a posterior rebuilt on the augmented data with the same hyperparameters"""
+    for kernel_type in [KernelType.RBF, KernelType.MATERN52]:
+        _, model, likelihood, _, _, _, _, train_x_normalized, train_y_normalized = fit(kernel_type)
+        x = torch.rand(200, train_x_normalized.shape[1], dtype=torch.double)
+        x_new = torch.rand(1, train_x_normalized.shape[1], dtype=torch.double)
+        y_new = torch.tensor(-0.5, dtype=torch.double)
+        with torch.no_grad():
+            posterior = FantasyPosterior(model, likelihood, train_x_normalized, train_y_normalized, kernel_type)
+            mean, variance = posterior.predict_points(x)
+            mean_new, _ = posterior.predict_points(x_new)
+            w, s = posterior.fantasize(x_new)
+            cov = posterior.posterior_covariance(x, x_new, w)
+            updated_mean = mean + cov * (y_new - mean_new) / s
+            updated_variance = variance - cov ** 2 / s
+            posterior.add(x_new, y_new, w, s)
+            refit = GPPosterior(model, likelihood, torch.cat([train_x_normalized, x_new]), torch.cat([train_y_normalized, y_new.reshape(1)]), kernel_type)
+            refit_mean, refit_variance = refit.predict_points(x)
+            added_mean, added_variance = posterior.predict_points(x)
+        assert torch.allclose(updated_mean, refit_mean, atol=1e-6)
+        assert torch.allclose(updated_variance, refit_variance, atol=1e-6)
+        assert torch.allclose(added_mean, refit_mean, atol=1e-6)
+        assert torch.allclose(added_variance, refit_variance, atol=1e-6)
+
+
+def test_pool_distance_kernel_values():
+    """PoolDistanceKernel on cached pool distances against the gpytorch kernels on the normalized points"""
+    torch.manual_seed(0)
+    x = torch.rand(300, 4, dtype=torch.double)
+    x_min, x_range = x.min(dim=0)[0], x.max(dim=0)[0] - x.min(dim=0)[0]
+    x_normalized = (x - x_min) / x_range
+    rows = torch.tensor([3, 17, 42, 99, 250])
+    cache = PairwiseDistanceCache(x)
+    kernels = {
+        KernelType.RBF: RBFKernel(),
+        KernelType.MATERN32: MaternKernel(nu=1.5),
+        KernelType.MATERN52: MaternKernel(nu=2.5),
+        KernelType.RQ: RQKernel(),
+        KernelType.WENDLAND: WendlandKernel(dim=4),
+    }
+    for kernel_type, kernel in kernels.items():
+        kernel = kernel.double()
+        kernel.lengthscale = 0.4
+        pool_kernel = PoolDistanceKernel(kernel_type, dim=4).double()
+        pool_kernel.lengthscale = 0.4
+        if kernel_type == KernelType.RQ:
+            kernel.alpha = 1.7
+            pool_kernel.initialize(raw_alpha=pool_kernel.raw_alpha_constraint.inverse_transform(torch.tensor([1.7], dtype=torch.double)))
+        pool_kernel.set_distances(rows, cache.scaled_sq_dist(rows, x_range))
+        with torch.no_grad():
+            values = pool_kernel(rows.double().unsqueeze(-1), torch.arange(300, dtype=torch.double).unsqueeze(-1)).to_dense()
+            expected = kernel(x_normalized[rows], x_normalized).to_dense()
+        assert torch.allclose(values, expected, atol=1e-10), kernel_type
+
+
+def test_memmap_pool_matches_candidate_pool():
+    """MemmapPool (chunked, with and without prefetch) picks the same rows as an in-memory CandidatePool"""
+    torch.manual_seed(0)
+    candidate_x = torch.rand(3000, 4, dtype=torch.double)
+    candidate_y = quadratic(candidate_x)
+    with tempfile.TemporaryDirectory() as directory:
+        np.save(os.path.join(directory, 'x.npy'), candidate_x.numpy())
+        np.save(os.path.join(directory, 'y.npy'), candidate_y.numpy())
+        expected = run_pool(BayesianOptimizer(chunk_size=512), CandidatePool(candidate_x, candidate_y), candidate_x, candidate_y, KernelType.MATERN52, AcquisitionType.EI)
+        for prefetch in [False, True]:
+            candidate_pool = MemmapPool(os.path.join(directory, 'x.npy'), os.path.join(directory, 'y.npy'), prefetch=prefetch, scan_rows=1000)
+            selected = run_pool(BayesianOptimizer(chunk_size=512), candidate_pool, candidate_pool.x, candidate_pool.y, KernelType.MATERN52, AcquisitionType.EI)
+            assert selected == expected, prefetch
+            reference = CandidatePool(candidate_x, candidate_y)
+            reference.remove(torch.tensor(selected))
+            assert len(candidate_pool) == len(reference) - 10
+            lower, upper = torch.full((4,), 0.2, dtype=torch.double), torch.full((4,), 0.6, dtype=torch.double)
+            assert not torch.isin(candidate_pool.box_indices(lower, upper), torch.tensor(selected)).any()
+            query = torch.rand(20, 4, dtype=torch.double)
+            assert torch.equal(candidate_pool.nearest_indices(query), reference.nearest_indices(query))
+
+
+def test_speculative_steps():
+    """Speculative steps (Thompson sampling, cost-aware acquisitions, SGPR) match get_next_point on a hit and pick a remaining row on a miss"""
+    torch.manual_seed(0)
+    candidate_x = torch.rand(1500, 3, dtype=torch.double)
+    candidate_y = quadratic(candidate_x)
+    cost_model = CostModel(candidate_cost=torch.rand(1500, dtype=torch.double) + 0.5)
+    cases = [
+        (AcquisitionType.TS, GPBackend.EXACT),
+        (AcquisitionType.EIPC, GPBackend.EXACT),
+        (AcquisitionType.PIPC, GPBackend.EXACT),
+        (AcquisitionType.EI, GPBackend.SGPR),
+    ]
+    for acquisition_type, backend in cases:
+        optimizer = BayesianOptimizer(n_inducing_points=8)
+        candidate_pool = CandidatePool(candidate_x, candidate_y)
+        initial_idx = torch.arange(0, 300, 15)
+        candidate_pool.remove(initial_idx)
+        observations = ObservationStore.from_tensors(candidate_x[initial_idx], candidate_y[initial_idx], idx=initial_idx)
+        kwargs = dict(kernel_type=KernelType.MATERN52, acquisition_type=acquisition_type, backend=backend, cost_model=cost_model)
+        optimizer.set_seed(0)
+        next_x, _, next_idx = optimizer.get_next_point(train_x=observations, train_y=None, filtered_candidate_x=candidate_pool, filtered_candidate_y=None, **kwargs)
+        candidate_pool.remove(next_idx)
+        speculation = SpeculativeOptimizer(optimizer)
+        for hit in [True, False]:
+            speculation.speculate(observations=observations, candidates=candidate_pool, next_x=next_x, next_idx=next_idx, seed=0, **kwargs)
+            outcomes, _ = speculation.prediction.result()
+            y = outcomes[0].item() if hit else 1e3
+            _, _, resolved_backend, resolved_x, resolved_idx = speculation.resolve(y)
+            assert resolved_backend == backend
+            assert not candidate_pool.evaluated.contains(resolved_idx.reshape(1)).any()
+            assert torch.equal(resolved_x.reshape(-1), candidate_x[int(resolved_idx)])
+            if hit and acquisition_type != AcquisitionType.TS:
+                # the same GP fit and scores as a direct step with y observed
+                optimizer.set_seed(0)
+                _, _, expected_idx = optimizer.get_next_point(train_x=SpeculativeOptimizer._observations({'x': observations.x, 'y': observations.y, 'idx': observations.idx, 'next_x': next_x, 'next_idx': next_idx}, y), train_y=None, filtered_candidate_x=candidate_pool, filtered_candidate_y=None, **kwargs)
+                assert int(resolved_idx) == int(expected_idx), acquisition_type
+        assert (speculation.n_hits, speculation.n_corrections) == (1, 1)
+        if backend == GPBackend.SGPR:
+            # the background GP was fitted with inducing points
+            assert any(key[-1] == 8 for key in speculation.background._model_pool)
+        speculation.close()
+
+
+def test_compact_support_posterior():
+    """CompactSupportPosterior decides pays_off before factorizing and predicts as the exact GP; BOOST skips TS with Wendland"""
+    optimizer, model, likelihood, x_min, x_range, y_median, y_std, train_x_normalized, train_y_normalized = fit(KernelType.WENDLAND, n_train=200)
+    query = torch.rand(50, 3, dtype=torch.double)
+    for lengthscale in [0.1, 1.5]:
+        model.scale_kernel.base_kernel.lengthscale = lengthscale
+        # drop the prediction caches of the old lengthscale
+        model.train()
+        model.eval()
+        posterior = CompactSupportPosterior(model, likelihood, train_x_normalized, train_y_normalized)
+        assert posterior.alpha is None
+        assert posterior.pays_off == (lengthscale == 0.1)
+        mean, variance = posterior.predict_points(query)
+        with torch.no_grad():
+            expected = likelihood(model(query))
+        assert torch.allclose(mean, expected.mean, atol=1e-6)
+        assert torch.allclose(variance, expected.variance, atol=1e-6)
+    boost = BOOST(kernel_candidates=[KernelType.WENDLAND, KernelType.MATERN52], acquisition_candidates=[AcquisitionType.TS, AcquisitionType.EI])
+    assert (AcquisitionType.TS, KernelType.WENDLAND, GPBackend.EXACT) not in boost.combinations()
+    assert (AcquisitionType.EI, KernelType.WENDLAND, GPBackend.EXACT) in BOOST().combinations()
+    assert len(boost.combinations()) == 3
+
+
+def test_boost_initial_hyperparameters():
+    """Warm-start hyperparameters given to BOOST start the GP fits of its combinations, in joblib workers too"""
+    hyperparameters = {
+        'lengthscale': torch.tensor([[0.3]], dtype=torch.double),
+        'outputscale': torch.tensor(1.3, dtype=torch.double),
+        'noise': torch.tensor([0.01], dtype=torch.double),
+    }
+    boost = BOOST(initial_hyperparameters={KernelType.MATERN52: hyperparameters})
+    train_x = torch.rand(10, 3, dtype=torch.double)
+    for worker in [boost, pickle.loads(pickle.dumps(boost))]:
+        model, likelihood, _, _ = worker._get_model(train_x, quadratic(train_x), KernelType.MATERN52)
+        assert torch.allclose(model.scale_kernel.base_kernel.lengthscale, hyperparameters['lengthscale'])
+        assert torch.allclose(model.scale_kernel.outputscale, hyperparameters['outputscale'])
+        assert torch.allclose(likelihood.noise, hyperparameters['noise'])
+
+
+def test_batch_backends():
+    """Batch selection is exact: SGPR raises once it would be sparse, and BOOST refuses batches with SGPR combinations"""
+    torch.manual_seed(0)
+    candidate_x = torch.rand(500, 3, dtype=torch.double)
+    candidate_pool = CandidatePool(candidate_x, quadratic(candidate_x))
+    train_x = torch.rand(20, 3, dtype=torch.double)
+    kwargs = dict(train_x=train_x, train_y=quadratic(train_x), filtered_candidate_x=candidate_pool, filtered_candidate_y=None, kernel_type=KernelType.MATERN52, acquisition_type=AcquisitionType.EI, q=4)
+    _, _, batch_idx = BayesianOptimizer(n_inducing_points=32).get_next_batch(backend=GPBackend.SGPR, **kwargs)
+    assert torch.unique(batch_idx).shape[0] == 4
+    for optimizer, backend in [(BayesianOptimizer(n_inducing_points=8), GPBackend.SGPR), (BayesianOptimizer(n_inducing_points=8, backend=GPBackend.SGPR), None)]:
+        try:
+            optimizer.get_next_batch(backend=backend, **kwargs)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("a sparse GP was used for batch selection")
+    try:
+        BOOST(backend_candidates=[GPBackend.EXACT, GPBackend.SGPR], batch_size=4, batch_strategy=BatchStrategy.KRIGING_BELIEVER)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("BOOST compared SGPR combinations with exact batches")
+
+
+class RecordingSubspace(Subspace):
+    """Subspace that records the domain of every copy it is restricted with"""
+    domains = []
+
+    def restrict(self, optimizer, train_x, train_y, filtered_candidate_x):
+        result = super().restrict(optimizer, train_x, train_y, filtered_candidate_x)
+        RecordingSubspace.domains.append((id(self), self.lower, self.extent))
+        return result
+
+
+def test_boost_subspace_domain():
+    """The subspace copies of the BOOST combinations share the domain of the parent, not the bounds of their pool"""
+    torch.manual_seed(0)
+    domain = torch.rand(2000, 6, dtype=torch.double)
+    subspace = RecordingSubspace(dim=6, n_dims=2)
+    subspace.fit_domain(domain)
+    lower, extent = subspace.lower.clone(), subspace.extent.clone()
+    # the BOOST data come from one corner of the domain
+    train_x = 0.5 * torch.rand(60, 6, dtype=torch.double)
+    boost = BOOST(kernel_candidates=[KernelType.MATERN52], acquisition_candidates=[AcquisitionType.EI, AcquisitionType.UCB], subspace=subspace)
+    RecordingSubspace.domains.clear()
+    with parallel_backend('sequential'):
+        boost.recommend(train_x_init=train_x, train_y_init=quadratic(train_x), max_iter_boost=3)
+    assert torch.equal(subspace.lower, lower) and torch.equal(subspace.extent, extent)
+    assert len({copy_id for copy_id, _, _ in RecordingSubspace.domains}) == 2
+    assert id(subspace) not in {copy_id for copy_id, _, _ in RecordingSubspace.domains}
+    for _, copy_lower, copy_extent in RecordingSubspace.domains:
+        assert torch.equal(copy_lower, lower) and torch.equal(copy_extent, extent)
+    # without a domain, the parent is fitted on the BOOST data before it is copied
+    subspace = RecordingSubspace(dim=6, n_dims=2)
+    boost = BOOST(kernel_candidates=[KernelType.MATERN52], acquisition_candidates=[AcquisitionType.EI, AcquisitionType.UCB], subspace=subspace)
+    RecordingSubspace.domains.clear()
+    with parallel_backend('sequential'):
+        boost.recommend(train_x_init=train_x, train_y_init=quadratic(train_x), max_iter_boost=3)
+    assert torch.equal(subspace.lower, train_x.min(dim=0)[0])
+    for _, copy_lower, copy_extent in RecordingSubspace.domains:
+        assert torch.equal(copy_lower, subspace.lower) and torch.equal(copy_extent, subspace.extent)
+
+
+class SleepyEvaluator(Evaluator):
+    """Evaluator of quadratic after an asyncio sleep"""
+    async def evaluate(self, x):
+        await asyncio.sleep(0.05)
+        return quadratic(x)
+
+
+class ThreadRecordingOptimizer(AsyncOptimizer):
+    """AsyncOptimizer recording the threads ask() runs on"""
+    def ask(self):
+        self.ask_threads.append(threading.current_thread())
+        return super().ask()
+
+
+def test_async_ask_off_event_loop():
+    """AsyncOptimizer.run fits the GP of ask() off the event loop thread, and tells every result"""
+    torch.manual_seed(0)
+    candidate_x = torch.rand(300, 3, dtype=torch.double)
+    candidate_pool = CandidatePool(candidate_x, quadratic(candidate_x))
+    initial_idx = torch.arange(0, 100, 10)
+    candidate_pool.remove(initial_idx)
+    observations = ObservationStore.from_tensors(candidate_x[initial_idx], quadratic(candidate_x[initial_idx]), idx=initial_idx)
+    loop = ThreadRecordingOptimizer(BayesianOptimizer(), candidate_pool, observations, KernelType.MATERN52, AcquisitionType.EI)
+    loop.ask_threads = []
+    stats = asyncio.run(loop.run(SleepyEvaluator(), n_evaluations=4, n_workers=2))
+    assert len(loop.ask_threads) == 4 and threading.main_thread() not in loop.ask_threads
+    assert len(observations) == 14 and not loop.pending and stats['optimizer_time'] > 0
+
+
+def test_objective_process_pool():
+    """PROCESS_POOL evaluations: values, per-point timeouts that kill only the hanging worker, persistent workers"""
+    objective = Objective(sleepy_sum, mode=EvaluationMode.PROCESS_POOL, max_workers=2, timeout=2.0, timeout_value=-1.0)
+    try:
+        x = torch.tensor([[0.0, 1.0], [0.1, 2.0], [0.0, 3.0]], dtype=torch.double)
+        assert torch.allclose(objective(x), x.sum(dim=1))
+        pids = {worker.process.pid for worker in objective._workers}
+        assert len(pids) == 2
+        assert torch.allclose(objective(x), x.sum(dim=1))
+        assert {worker.process.pid for worker in objective._workers} == pids
+        # the second row hangs: it gets timeout_value, the other worker evaluates the other rows and is kept
+        x = torch.tensor([[0.5, 1.0], [60.0, 2.0], [0.0, 3.0], [0.2, 4.0]], dtype=torch.double)
+        y = objective(x)
+        assert torch.allclose(y, torch.tensor([1.5, -1.0, 3.0, 4.2], dtype=torch.double))
+        assert objective.n_timeouts == 1
+        assert len(objective._workers) == 1 and objective._workers[0].process.pid in pids
+    finally:
+        objective.close()
+
+
+def test_distance_cache_budget():
+    """The distance cache budget counts training rows: max_rows overrides max_bytes, and a full cache rejects new rows"""
+    hpob_sized = PairwiseDistanceCache(torch.empty(59000, 9, dtype=torch.double))
+    assert hpob_sized.max_rows == 2**28 // (59000 * 9 * 8)
+    assert PairwiseDistanceCache(torch.empty(59000, 9, dtype=torch.double), max_rows=150).max_rows == 150
+    torch.manual_seed(0)
+    candidate_x = torch.rand(3000, 4, dtype=torch.double)
+    candidate_pool = CandidatePool(candidate_x, quadratic(candidate_x), cache_distances=True, cache_rows=12)
+    cache = candidate_pool.distance_cache
+    rows = torch.arange(0, 120, 10)
+    assert cache.fits(torch.cat([rows, rows]))
+    cache.fill(rows)
+    assert cache.n_rows == 12 and cache.fits(rows[:5])
+    assert not cache.fits(torch.tensor([1]))
+    # the training points then no longer fit, and the steps fall back to kernels on the points
+    observations = ObservationStore.from_tensors(candidate_x[:13], quadratic(candidate_x[:13]), idx=torch.arange(13))
+    assert BayesianOptimizer._get_distance_cache(observations, candidate_pool) is None
+
+
+def test_acquisition_cache_picks():
+    """Picks with an AcquisitionCache: equal to full rescoring with a rescore every step; with stale scores the pick
+    is the best candidate of a full rescore of the frozen GP, since stale scores are ranked by an upper bound"""
+    torch.manual_seed(0)
+    candidate_x = torch.rand(2000, 3, dtype=torch.double)
+    candidate_y = quadratic(candidate_x)
+    for acquisition_type in [AcquisitionType.EI, AcquisitionType.PI, AcquisitionType.UCB, AcquisitionType.PM]:
+        picks = {}
+        for full_rescore_every in [None, 1]:
+            acquisition_cache = AcquisitionCache(full_rescore_every=full_rescore_every) if full_rescore_every is not None else None
+            picks[full_rescore_every] = run_pool(BayesianOptimizer(), CandidatePool(candidate_x, candidate_y), candidate_x, candidate_y, KernelType.MATERN52, acquisition_type, n_steps=10, acquisition_cache=acquisition_cache)
+        assert picks[1] == picks[None], acquisition_type
+
+        optimizer = BayesianOptimizer()
+        candidate_pool = CandidatePool(candidate_x, candidate_y)
+        acquisition_cache = AcquisitionCache(full_rescore_every=5)
+        optimizer.set_seed(0)
+        initial_idx = torch.randperm(candidate_x.shape[0])[:10]
+        candidate_pool.remove(initial_idx)
+        observations = ObservationStore.from_tensors(candidate_x[initial_idx], candidate_y[initial_idx], idx=initial_idx)
+        for _ in range(10):
+            next_x, next_y, next_idx = optimizer.get_next_point(train_x=observations, train_y=None, filtered_candidate_x=candidate_pool, filtered_candidate_y=None, kernel_type=KernelType.MATERN52, acquisition_type=acquisition_type, acquisition_cache=acquisition_cache)
+            # full rescore of the remaining candidates with the frozen GP conditioned on every observation
+            x_min, x_range, y_median, y_std = acquisition_cache.normalization
+            with torch.no_grad():
+                full = torch.full((candidate_x.shape[0],), -np.inf, dtype=torch.double)
+                for idx, mean, stddev in optimizer._iter_predictions(model=acquisition_cache.model, likelihood=acquisition_cache.likelihood, kernel_type=KernelType.MATERN52, filtered_candidate_x=candidate_pool, x_min=x_min, x_range=x_range, train_x_normalized=(observations.x - x_min) / x_range, train_y_normalized=(observations.y - y_median) / y_std):
+                    full[idx] = optimizer._get_acq_values(acquisition_type=acquisition_type, best_f=observations.y.min().item(), mean=mean, stddev=stddev, y_median=y_median, y_std=y_std)
+            assert full[next_idx] >= full.max() - 1e-9 * max(1.0, full.max().abs().item()), acquisition_type
+            observations.append(next_x, next_y, next_idx)
+            candidate_pool.remove(next_idx)
+
+
+def test_gui_candidate_sets():
+    """The GUI optimizer picks from its CandidatePool and CandidateGrid, and raises ValueError once none is left"""
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'BOOST_GUI')))
+    try:
+        from BayesianOptimization import BayesianOptimizer as GUIBayesianOptimizer
+        from candidates import CandidateGrid as GUICandidateGrid, CandidatePool as GUICandidatePool
+        from kernels_and_acquisitions import AcquisitionType as GUIAcquisitionType, KernelType as GUIKernelType
+    finally:
+        sys.path.pop(0)
+    torch.manual_seed(0)
+    train_x = torch.rand(10, 2, dtype=torch.double)
+    candidate_x = torch.rand(50, 2, dtype=torch.double)
+    grid = GUICandidateGrid.from_bounds(bounds=[0.0, 1.0], n_grid=5, dim=2)
+    for candidates in [GUICandidatePool(candidate_x), grid]:
+        next_x, next_idx, _, _ = GUIBayesianOptimizer().get_next_point(train_x, quadratic(train_x), candidates, GUIKernelType.MATERN52, GUIAcquisitionType.EI)
+        assert torch.equal(next_x, candidates.points(next_idx))
+        candidates.remove(torch.arange(candidates.n_total))
+        try:
+            GUIBayesianOptimizer().get_next_point(train_x, quadratic(train_x), candidates, GUIKernelType.MATERN52, GUIAcquisitionType.EI)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("no ValueError without remaining candidates")
+
+
+def test_speculative_rng():
+    """The background thread of a SpeculativeOptimizer leaves the global RNGs of the main thread alone"""
+    torch.manual_seed(0)
+    candidate_x = torch.rand(1000, 3, dtype=torch.double)
+    candidate_pool = CandidatePool(candidate_x, quadratic(candidate_x))
+    initial_idx = torch.arange(0, 200, 10)
+    candidate_pool.remove(initial_idx)
+    observations = ObservationStore.from_tensors(candidate_x[initial_idx], quadratic(candidate_x[initial_idx]), idx=initial_idx)
+    optimizer = BayesianOptimizer(n_inducing_points=8)
+    next_idx = torch.tensor(500)
+    candidate_pool.remove(next_idx.reshape(1))
+    speculation = SpeculativeOptimizer(optimizer)
+    torch.manual_seed(123)
+    np.random.seed(123)
+    torch_state, numpy_state = torch.get_rng_state(), np.random.get_state()[1].copy()
+    speculation.speculate(observations=observations, candidates=candidate_pool, next_x=candidate_x[500:501], next_idx=next_idx, kernel_type=KernelType.MATERN52, acquisition_type=AcquisitionType.TS, backend=GPBackend.SGPR, seed=0)
+    for future in speculation.futures:
+        future.result()
+    assert torch.equal(torch.get_rng_state(), torch_state)
+    assert np.array_equal(np.random.get_state()[1], numpy_state)
+    speculation.close()
+
+
+if __name__ == '__main__':
+    for name, check in list(globals().items()):
+        if name.startswith('test_') and callable(check):
+            check()
+            print(f"{name}: ok")
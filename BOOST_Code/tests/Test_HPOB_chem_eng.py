@@ -11,7 +11,8 @@ import torch
 
 from _class_for_test_BOOST import TestFunction
 from core.kernels_and_acquisitions import KernelType, AcquisitionType
-from utils.Save_results import save_individual_trial
+from core.memmap_pool import MemmapPool
+from utils.Save_results import save_cost_history, save_individual_trial
 
 def cleanup_resources(full=False): # clean resources if needed
     import gc, os, torch, multiprocessing as mp
@@ -43,11 +44,14 @@ def cleanup_resources(full=False): # clean resources if needed
 
 
 class HPOB:
-    def __init__(self, data_dir='benchmarks/hpob_data', objective=None):
+    def __init__(self, data_dir='benchmarks/hpob_data', objective=None, cost_column=None):
         self.data_dir = Path(data_dir)
         self.objective = objective
+        # Column of the evaluation cost of every row (excluded from x); get_data stores it in candidate_cost
+        self.cost_column = cost_column
+        self.candidate_cost = None
 
-    def get_data(self):
+    def _file_path(self):
         if self.objective == "AgNP" or self.objective == "P3HT":
             file_path = Path('benchmarks') / f'{self.objective}_dataset_avg.csv'
             maximize = (self.objective == "P3HT")
@@ -58,8 +62,14 @@ class HPOB:
             print(f"✅{self.objective}.csv exists")
         else:
             raise ValueError(f"❌❌❌File does not exist: {file_path}❌❌❌")
+        return file_path, maximize
 
+    def get_data(self):
+        file_path, maximize = self._file_path()
         df = pd.read_csv(file_path)
+        if self.cost_column is not None:
+            self.candidate_cost = torch.tensor(df[self.cost_column].values, dtype=torch.double)
+            df = df.drop(columns=[self.cost_column])
         candidate_x = torch.tensor(df.iloc[:, :-1].values)
         candidate_y = torch.tensor(df.iloc[:, -1].values)
         
@@ -72,7 +82,19 @@ class HPOB:
 
         return candidate_x, candidate_y
 
-def test_hpob(use_boost=False, kernels=[KernelType.TBD], acquisitions=[AcquisitionType.TBD], benchmarks=None, n_init_points=10, max_iter=100, trial=10):
+    def get_memmap_pool(self, directory):
+        """
+        Same data as get_data as a MemmapPool whose .npy files (written once to directory) stay on disk,
+        for datasets too large for memory
+        """
+        file_path, maximize = self._file_path()
+        drop_columns = ()
+        if self.cost_column is not None:
+            self.candidate_cost = torch.tensor(pd.read_csv(file_path, usecols=[self.cost_column])[self.cost_column].values, dtype=torch.double)
+            drop_columns = (self.cost_column,)
+        return MemmapPool.from_csv(file_path, directory, maximize=maximize, normalize_y=True, drop_columns=drop_columns)
+
+def test_hpob(use_boost=False, kernels=[KernelType.TBD], acquisitions=[AcquisitionType.TBD], benchmarks=None, n_init_points=10, max_iter=100, trial=10, cost_column=None, memmap_dir=None):
     if use_boost:
         base_dir = f'results/results_HPOB_boost_{datetime.now().strftime("%Y%m%d")}'
     else:
@@ -91,7 +113,10 @@ def test_hpob(use_boost=False, kernels=[KernelType.TBD], acquisitions=[Acquisiti
             for kernel_type in kernels:
                 current_trial_results = []
                 for i in range(trial):
-                    candidate_x, candidate_y = HPOB(objective=objective_name).get_data()
+                    hpob = HPOB(objective=objective_name, cost_column=cost_column)
+                    # with memmap_dir the dataset stays on disk (MemmapPool) instead of being read into memory
+                    candidate_pool = hpob.get_memmap_pool(memmap_dir) if memmap_dir is not None else None
+                    candidate_x, candidate_y = (candidate_pool.x, candidate_pool.y) if candidate_pool is not None else hpob.get_data()
                     dim = dim if dim is not None else candidate_x.shape[1]
                     time.sleep(0.5)
                     test = TestFunction(
@@ -108,6 +133,8 @@ def test_hpob(use_boost=False, kernels=[KernelType.TBD], acquisitions=[Acquisiti
                         is_fixed_candidate_x=True,
                         candidate_x=candidate_x,
                         candidate_y=candidate_y,
+                        candidate_cost=hpob.candidate_cost,
+                        candidate_pool=candidate_pool,
                     )
 
                     result = test.optimize_recommend_adaptive()
@@ -123,6 +150,7 @@ def test_hpob(use_boost=False, kernels=[KernelType.TBD], acquisitions=[Acquisiti
 
                     time.sleep(0.5)
                 save_individual_trial(current_trial_results, f'{data_num}_{dim}D', n_initial_points=n_init_points, base_dir=base_dir)
+                save_cost_history(current_trial_results, f'{data_num}_{dim}D', n_initial_points=n_init_points, base_dir=base_dir)
                 cleanup_resources(full=True)
 
 
@@ -0,0 +1,1034 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import asyncio
+import random
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import torch
+
+from core.BOOST import BOOST
+from core.BayesianOptimization import BayesianOptimizer
+from core.acquisition_cache import AcquisitionCache
+from core.async_loop import AsyncOptimizer, ProcessPoolEvaluator
+from benchmarks.Benchmark_ftn import Benchmarks
+from core.candidates import CandidateGrid, CandidatePool, ContinuousBox
+from core.cost import CostModel
+from core.kernels_and_acquisitions import KernelType, AcquisitionType, BatchStrategy, EvaluationMode, GPBackend, Precision, SubspaceMethod
+from core.memmap_pool import MemmapPool
+from core.objectives import Objective
+from core.observations import ObservationStore
+from core.speculative import SpeculativeOptimizer
+from core.subspace import Subspace
+from core.samplers import PerturbationSampler, StratifiedSampler, UniformSampler, UnionSampler
+from core.trust_region import TrustRegion
+from core.warm_start import PriorStudy, WarmStart
+from Test_HPOB_chem_eng import HPOB
+from _class_for_test_BOOST import TestFunction
+
+
+def run_steps(optimizer, candidate_x, candidate_y, kernel_type, acquisition_type, n_init_points=10, n_steps=30, seed=0, trace_memory=False, cache_distances=False, trust_region=None, candidate_sampler=None, subspace=None):
+    """
+    Run n_steps BO steps over a fixed pool; returns per-step latencies (s), peak traced Python memory (bytes),
+    the best value found and the selected pool rows
+    """
+    optimizer.set_seed(seed)
+    index_initial_sample = torch.randperm(candidate_x.shape[0])[:n_init_points]
+    candidate_pool = CandidatePool(candidate_x, candidate_y, cache_distances=cache_distances)
+    candidate_pool.remove(index_initial_sample)
+    observations = ObservationStore.from_tensors(candidate_x[index_initial_sample], candidate_y[index_initial_sample], capacity=n_init_points + n_steps, idx=index_initial_sample)
+
+    latencies, peak_memory, selected = [], [], []
+    for _ in range(n_steps):
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        next_x, next_y, next_idx = optimizer.get_next_point(
+            train_x=observations,
+            train_y=None,
+            filtered_candidate_x=candidate_pool,
+            filtered_candidate_y=None,
+            kernel_type=kernel_type,
+            acquisition_type=acquisition_type,
+            trust_region=trust_region,
+            candidate_sampler=candidate_sampler,
+            subspace=subspace,
+        )
+        latencies.append(time.perf_counter() - start)
+        if trace_memory:
+            peak_memory.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        observations.append(next_x, next_y, next_idx)
+        candidate_pool.remove(next_idx)
+        selected.append(int(next_idx))
+
+    return latencies, peak_memory, observations.y_min, selected
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def benchmark_model_reuse(n_candidates=2000, dim=6, n_steps=30, kernels=[KernelType.RBF, KernelType.MATERN52]):
+    """Step latency and allocations with and without GP model reuse"""
+    torch.manual_seed(0)
+    candidate_x = torch.rand(n_candidates, dim, dtype=torch.double)
+    candidate_y = (candidate_x - 0.3).pow(2).sum(dim=1)
+
+    # count nn.Module constructions (GP models, likelihoods, kernels, mlls)
+    n_modules = [0]
+    module_init = torch.nn.Module.__init__
+    def counting_init(module, *args, **kwargs):
+        n_modules[0] += 1
+        module_init(module, *args, **kwargs)
+    torch.nn.Module.__init__ = counting_init
+
+    try:
+        for kernel_type in kernels:
+            for reuse_models in [False, True]:
+                optimizer = BayesianOptimizer(reuse_models=reuse_models)
+                latencies, _, best, _ = run_steps(optimizer, candidate_x, candidate_y, kernel_type, AcquisitionType.EI, n_steps=n_steps)
+                n_modules[0] = 0
+                _, peak_memory, _, _ = run_steps(optimizer, candidate_x, candidate_y, kernel_type, AcquisitionType.EI, n_steps=n_steps, trace_memory=True)
+                print(
+                    f"{kernel_type.value:>8} reuse_models={reuse_models!s:>5}: "
+                    f"step {1000 * median(latencies[3:]):7.1f} ms, "
+                    f"modules/step {n_modules[0] / n_steps:5.1f}, "
+                    f"peak Python memory/step {median(peak_memory[3:]) / 1024:6.0f} KB, "
+                    f"best {best:.5f}"
+                )
+    finally:
+        torch.nn.Module.__init__ = module_init
+
+
+def benchmark_distance_cache(n_candidates=2000, dims=[6, 32], n_steps=30, kernels=[KernelType.RBF, KernelType.MATERN52, KernelType.RQ]):
+    """Step latency with and without the pairwise distance cache of the pool, and agreement of the selected rows"""
+    for dim in dims:
+        torch.manual_seed(0)
+        candidate_x = torch.rand(n_candidates, dim, dtype=torch.double)
+        candidate_y = (candidate_x - 0.3).pow(2).sum(dim=1)
+        for kernel_type in kernels:
+            results = {}
+            for cache_distances in [False, True]:
+                results[cache_distances] = run_steps(BayesianOptimizer(), candidate_x, candidate_y, kernel_type, AcquisitionType.EI, n_steps=n_steps, cache_distances=cache_distances)
+            n_same = sum(a == b for a, b in zip(results[False][3], results[True][3]))
+            print(
+                f"dim {dim:3d} {kernel_type.value:>8}: "
+                f"step {1000 * median(results[False][0][3:]):7.1f} ms -> {1000 * median(results[True][0][3:]):7.1f} ms with cache, "
+                f"same selections {n_same}/{n_steps}"
+            )
+
+
+def benchmark_kronecker_grid(config=Benchmarks.ACKLEY_CONFIG, objective=Benchmarks.Ackley, n_init_points=30, acquisitions=[AcquisitionType.EI, AcquisitionType.UCB]):
+    """RBF step latency on a full Cartesian grid with and without the per-dimension (Kronecker) scoring path"""
+    torch.manual_seed(0)
+    grid = CandidateGrid.from_bounds(bounds=config.bounds, n_grid=config.n_grid, dim=config.dim)
+    train_idx = torch.randperm(grid.n_total)[:n_init_points]
+    grid.remove(train_idx)
+    train_x = grid.points(train_idx)
+    observations = ObservationStore.from_tensors(train_x, objective(train_x))
+
+    for acquisition_type in acquisitions:
+        selected, latencies = {}, {}
+        for kronecker_grid in [False, True]:
+            optimizer = BayesianOptimizer(kronecker_grid=kronecker_grid)
+            optimizer.set_seed(0)
+            latencies[kronecker_grid] = []
+            for _ in range(4):
+                start = time.perf_counter()
+                _, _, next_idx = optimizer.get_next_point(
+                    train_x=observations,
+                    train_y=None,
+                    filtered_candidate_x=grid,
+                    filtered_candidate_y=None,
+                    kernel_type=KernelType.RBF,
+                    acquisition_type=acquisition_type,
+                    objective=objective,
+                )
+                latencies[kronecker_grid].append(time.perf_counter() - start)
+            selected[kronecker_grid] = int(next_idx)
+        print(
+            f"{grid.n_total} grid points, {acquisition_type.value:>3}: "
+            f"step {1000 * median(latencies[False][1:]):7.1f} ms -> {1000 * median(latencies[True][1:]):7.1f} ms with Kronecker scoring, "
+            f"same selection {selected[False] == selected[True]}"
+        )
+
+
+def benchmark_mixed_precision(n_candidates=50000, dim=16, n_steps=10, kernels=[KernelType.RBF, KernelType.MATERN52, KernelType.RQ], acquisitions=[AcquisitionType.EI, AcquisitionType.UCB]):
+    """
+    Step latency of Precision.MIXED against Precision.DOUBLE on a fixed pool, and whether both select the same point.
+    Both optimizers fit the same float64 model at every step; the trajectory follows the float64 selections.
+    """
+    torch.manual_seed(0)
+    candidate_x = torch.rand(n_candidates, dim, dtype=torch.double)
+    candidate_y = (candidate_x - 0.3).pow(2).sum(dim=1) + 0.1 * torch.sin(20 * candidate_x).sum(dim=1)
+    optimizers = {precision: BayesianOptimizer(precision=precision) for precision in [Precision.DOUBLE, Precision.MIXED]}
+
+    for kernel_type in kernels:
+        for acquisition_type in acquisitions:
+            torch.manual_seed(0)
+            index_initial_sample = torch.randperm(n_candidates)[:10]
+            candidate_pool = CandidatePool(candidate_x, candidate_y)
+            candidate_pool.remove(index_initial_sample)
+            observations = ObservationStore.from_tensors(candidate_x[index_initial_sample], candidate_y[index_initial_sample], capacity=10 + n_steps)
+
+            latencies = {precision: [] for precision in optimizers}
+            n_same = 0
+            for _ in range(n_steps):
+                selected = {}
+                for precision, optimizer in optimizers.items():
+                    start = time.perf_counter()
+                    selected[precision] = optimizer.get_next_point(
+                        train_x=observations,
+                        train_y=None,
+                        filtered_candidate_x=candidate_pool,
+                        filtered_candidate_y=None,
+                        kernel_type=kernel_type,
+                        acquisition_type=acquisition_type,
+                    )
+                    latencies[precision].append(time.perf_counter() - start)
+                next_x, next_y, next_idx = selected[Precision.DOUBLE]
+                n_same += int(next_idx) == int(selected[Precision.MIXED][2])
+                observations.append(next_x, next_y)
+                candidate_pool.remove(next_idx)
+
+            print(
+                f"{kernel_type.value:>8} {acquisition_type.value:>3}: "
+                f"step {1000 * median(latencies[Precision.DOUBLE][1:]):7.1f} ms (double) -> "
+                f"{1000 * median(latencies[Precision.MIXED][1:]):7.1f} ms (mixed), "
+                f"same argmax {n_same}/{n_steps}"
+            )
+
+
+def benchmark_compiled_steps(n_candidates=2000, dim=6, n_steps=20, kernels=[KernelType.RBF, KernelType.MATERN52, KernelType.RQ]):
+    """
+    Cold (first call, includes compilation) and warm step latency of compile_steps=True against the eager GPyTorch path.
+    The training sizes 10..10+n_steps fall into two padding buckets (16 and 32).
+    """
+    torch.manual_seed(0)
+    candidate_x = torch.rand(n_candidates, dim, dtype=torch.double)
+    candidate_y = (candidate_x - 0.3).pow(2).sum(dim=1)
+    for kernel_type in kernels:
+        results = {}
+        for compile_steps in [False, True]:
+            results[compile_steps] = run_steps(BayesianOptimizer(compile_steps=compile_steps), candidate_x, candidate_y, kernel_type, AcquisitionType.EI, n_steps=n_steps)
+        latencies, _, best, selected = results[True]
+        eager_latencies, _, eager_best, eager_selected = results[False]
+        n_same = sum(a == b for a, b in zip(eager_selected, selected))
+        print(
+            f"{kernel_type.value:>8}: eager step {1000 * median(eager_latencies[1:]):7.1f} ms, "
+            f"compiled cold {latencies[0]:6.1f} s, warm {1000 * median(latencies[8:]):7.1f} ms, "
+            f"best {eager_best:.5f} / {best:.5f}, same selections {n_same}/{n_steps}"
+        )
+
+
+def benchmark_moments_planner(n_candidates=50000, dim=16, n_steps=6, kernels=[KernelType.MATERN52, KernelType.RQ]):
+    """
+    PM step latency with and without skipping the predictive variance, and the four acquisition functions
+    scored in one pass (get_next_points) against four get_next_point calls.
+    """
+    torch.manual_seed(0)
+    candidate_x = torch.rand(n_candidates, dim, dtype=torch.double)
+    candidate_y = (candidate_x - 0.3).pow(2).sum(dim=1)
+    acquisitions = [AcquisitionType.EI, AcquisitionType.PI, AcquisitionType.UCB, AcquisitionType.PM]
+    for kernel_type in kernels:
+        latencies = {}
+        for plan_moments in [False, True]:
+            latencies[plan_moments], _, best, selected = run_steps(BayesianOptimizer(plan_moments=plan_moments), candidate_x, candidate_y, kernel_type, AcquisitionType.PM, n_steps=n_steps)
+        print(
+            f"{kernel_type.value:>8} PM: step {1000 * median(latencies[False][1:]):7.1f} ms (mean and variance) -> "
+            f"{1000 * median(latencies[True][1:]):7.1f} ms (mean only)"
+        )
+
+        optimizer = BayesianOptimizer()
+        candidate_pool = CandidatePool(candidate_x, candidate_y)
+        candidate_pool.remove(torch.arange(20))
+        observations = ObservationStore.from_tensors(candidate_x[:20], candidate_y[:20])
+        kwargs = dict(train_x=observations, train_y=None, filtered_candidate_x=candidate_pool, filtered_candidate_y=None, kernel_type=kernel_type)
+        separate, batched = [], []
+        for _ in range(3):
+            start = time.perf_counter()
+            separate_points = {acquisition_type: optimizer.get_next_point(acquisition_type=acquisition_type, **kwargs) for acquisition_type in acquisitions}
+            separate.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            batched_points = optimizer.get_next_points(acquisition_types=acquisitions, **kwargs)
+            batched.append(time.perf_counter() - start)
+        same = all(int(separate_points[a][2]) == int(batched_points[a][2]) for a in acquisitions)
+        print(
+            f"{kernel_type.value:>8} EI+PI+UCB+PM: {1000 * median(separate):7.1f} ms (4 calls) -> "
+            f"{1000 * median(batched):7.1f} ms (one pass), same selections {same}"
+        )
+
+
+def benchmark_thompson_sampling(objective='7609_9D', n_steps=30, seeds=[0, 1, 2], kernels=[KernelType.RBF, KernelType.MATERN52]):
+    """
+    Step latency and regret of Thompson sampling (random Fourier feature sample paths) against EI
+    on the 59k-row HPO-B search space. candidate_y is min-max normalized, so the best value found is the regret.
+    """
+    data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks', 'hpob_data')
+    candidate_x, candidate_y = HPOB(data_dir=data_dir, objective=objective).get_data()
+    for kernel_type in kernels:
+        for acquisition_type in [AcquisitionType.EI, AcquisitionType.TS]:
+            latencies, regrets = [], []
+            for seed in seeds:
+                step_latencies, _, best, _ = run_steps(BayesianOptimizer(), candidate_x, candidate_y, kernel_type, acquisition_type, n_steps=n_steps, seed=seed)
+                latencies += step_latencies[1:]
+                regrets.append(best)
+            print(
+                f"{kernel_type.value:>8} {acquisition_type.value:>3}: step {1000 * median(latencies):7.1f} ms, "
+                f"regret after {n_steps} steps {sum(regrets) / len(regrets):.4f} (mean of {len(seeds)} seeds)"
+            )
+
+
+def benchmark_sparse_backend(n_trains=[250, 500, 1000, 2000], n_candidates=5000, dim=6, n_steps=3, n_inducing_points=128, kernels=[KernelType.RBF, KernelType.MATERN52]):
+    """
+    Step latency (dominated by the GP fit) and regret of the SGPR backend against the exact GP as the number
+    of training points grows. With many observations the best value is usually already observed, so the regret
+    reported is the mean regret of the points selected by the n_steps BO steps.
+    """
+    torch.manual_seed(0)
+    for n_train in n_trains:
+        candidate_x = torch.rand(n_train + n_candidates, dim, dtype=torch.double)
+        candidate_y = (candidate_x - 0.3).pow(2).sum(dim=1) + 0.1 * torch.sin(10 * candidate_x).sum(dim=1)
+        candidate_y = candidate_y - candidate_y.min()
+        for kernel_type in kernels:
+            results = {}
+            for backend in [GPBackend.EXACT, GPBackend.SGPR]:
+                optimizer = BayesianOptimizer(backend=backend, n_inducing_points=n_inducing_points)
+                results[backend] = run_steps(optimizer, candidate_x, candidate_y, kernel_type, AcquisitionType.EI, n_init_points=n_train, n_steps=n_steps)
+            exact, sparse = results[GPBackend.EXACT], results[GPBackend.SGPR]
+            print(
+                f"n={n_train:5d} {kernel_type.value:>8}: step {1000 * median(exact[0]):8.1f} ms (exact) -> "
+                f"{1000 * median(sparse[0]):8.1f} ms (SGPR, m={n_inducing_points}), "
+                f"selected-point regret {candidate_y[exact[3]].mean():.4f} -> {candidate_y[sparse[3]].mean():.4f}"
+            )
+
+
+def benchmark_compact_kernel(n_candidates=50000, dim=4, n_trains=[50, 500], n_steps=5, kernels=[KernelType.MATERN52, KernelType.WENDLAND]):
+    """
+    Step latency and regret of the compactly supported Wendland kernel (sparse neighbour cross-covariance)
+    against the globally supported kernels on a large pool.
+    """
+    torch.manual_seed(0)
+    candidate_x = torch.rand(n_candidates, dim, dtype=torch.double)
+    candidate_y = (candidate_x - 0.3).pow(2).sum(dim=1) + 0.1 * torch.sin(10 * candidate_x).sum(dim=1)
+    candidate_y = candidate_y - candidate_y.min()
+    for n_train in n_trains:
+        for kernel_type in kernels:
+            latencies, _, best, selected = run_steps(BayesianOptimizer(), candidate_x, candidate_y, kernel_type, AcquisitionType.EI, n_init_points=n_train, n_steps=n_steps)
+            print(
+                f"n={n_train:4d} {kernel_type.value:>8}: step {1000 * median(latencies):8.1f} ms, "
+                f"regret {best:.4f}, selected-point regret {candidate_y[selected].mean():.4f}"
+            )
+
+
+def benchmark_continuous_domain(config=Benchmarks.ACKLEY_CONFIG, objective=Benchmarks.Ackley, dims=[4, 10, 20, 50], n_init_points=20, n_steps=10, kernel_type=KernelType.MATERN52, acquisition_type=AcquisitionType.EI):
+    """
+    Step latency and best value of multi-start L-BFGS-B on a ContinuousBox (snapped to the config grid) against
+    scoring the whole CandidateGrid, which is only feasible up to the configured dimension.
+    """
+    for dim in dims:
+        domains = {'box': ContinuousBox.from_bounds(bounds=config.bounds, dim=dim, n_grid=config.n_grid)}
+        if dim <= config.dim:
+            domains['grid'] = CandidateGrid.from_bounds(bounds=config.bounds, n_grid=config.n_grid, dim=dim)
+        for name, domain in domains.items():
+            optimizer = BayesianOptimizer()
+            optimizer.set_seed(0)
+            box = domains['box']
+            train_x = box.points(torch.stack([torch.randint(config.n_grid, (n_init_points,)) for _ in range(dim)], dim=1))
+            domain.remove_points(train_x)
+            observations = ObservationStore.from_tensors(train_x, torch.as_tensor(objective(train_x)), capacity=n_init_points + n_steps)
+            latencies = []
+            for _ in range(n_steps):
+                start = time.perf_counter()
+                next_x, next_y, _ = optimizer.get_next_point(
+                    train_x=observations,
+                    train_y=None,
+                    filtered_candidate_x=domain,
+                    filtered_candidate_y=None,
+                    kernel_type=kernel_type,
+                    acquisition_type=acquisition_type,
+                    objective=objective,
+                )
+                latencies.append(time.perf_counter() - start)
+                observations.append(next_x, next_y)
+                domain.remove_points(next_x)
+            print(
+                f"dim={dim:3d} {name:>4}: step {1000 * median(latencies):8.1f} ms, "
+                f"best {float(observations.y_min) - config.target:.3f} after {n_steps} steps"
+            )
+
+
+def benchmark_trust_region(objective='7609_9D', n_steps=40, seeds=[0, 1, 2], kernel_type=KernelType.MATERN52, acquisition_type=AcquisitionType.EI):
+    """
+    Step latency, number of scored candidates and regret with a TuRBO-style trust region against global scoring
+    on the 59k-row HPO-B search space (candidate_y is min-max normalized, so the best value found is the regret).
+    """
+    data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks', 'hpob_data')
+    candidate_x, candidate_y = HPOB(data_dir=data_dir, objective=objective).get_data()
+    for use_trust_region in [False, True]:
+        latencies, regrets, lengths = [], [], []
+        for seed in seeds:
+            trust_region = TrustRegion(dim=candidate_x.shape[1]) if use_trust_region else None
+            step_latencies, _, best, _ = run_steps(BayesianOptimizer(), candidate_x, candidate_y, kernel_type, acquisition_type, n_steps=n_steps, seed=seed, trust_region=trust_region)
+            latencies += step_latencies[1:]
+            regrets.append(best)
+            if trust_region is not None:
+                lengths.append(trust_region.length)
+        name = "trust region" if use_trust_region else "global"
+        print(
+            f"{name:>12}: step {1000 * median(latencies):7.1f} ms, regret after {n_steps} steps {sum(regrets) / len(regrets):.4f} "
+            f"(mean of {len(seeds)} seeds)" + (f", final lengths {[round(length, 3) for length in lengths]}" if lengths else "")
+        )
+
+
+def benchmark_candidate_samplers(n_samples=2048, n_steps=20, seeds=[0, 1], kernel_type=KernelType.MATERN52, acquisition_type=AcquisitionType.EI, objectives=['7609_9D']):
+    """
+    Regret penalty against speedup of scoring a sampled subset of n_samples candidates per step instead of all of them,
+    on the Benchmarks grids (lazy CandidateGrid) and on HPO-B CSVs (CandidatePool).
+    """
+    samplers = {
+        'all': None,
+        'uniform': UniformSampler(n_samples),
+        'stratified': StratifiedSampler(n_samples),
+        'perturbation': PerturbationSampler(n_samples),
+        'union': UnionSampler([UniformSampler(n_samples // 2), PerturbationSampler(n_samples // 2)]),
+    }
+    data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks', 'hpob_data')
+    problems = {'Ackley grid': (Benchmarks.ACKLEY_CONFIG, Benchmarks.Ackley), 'Levy grid': (Benchmarks.LEVY_CONFIG, Benchmarks.Levy)}
+    problems.update({objective: HPOB(data_dir=data_dir, objective=objective).get_data() for objective in objectives})
+
+    for problem, data in problems.items():
+        baseline = None
+        for name, sampler in samplers.items():
+            latencies, regrets = [], []
+            for seed in seeds:
+                optimizer = BayesianOptimizer()
+                optimizer.set_seed(seed)
+                if not isinstance(data[0], torch.Tensor):
+                    config, objective = data
+                    candidates = CandidateGrid.from_bounds(bounds=config.bounds, n_grid=config.n_grid, dim=config.dim)
+                    train_x = candidates.points(torch.randperm(candidates.n_total)[:10])
+                    train_y = torch.as_tensor(objective(train_x))
+                    target = config.target
+                else:
+                    candidate_x, candidate_y = data
+                    candidates = CandidatePool(candidate_x, candidate_y)
+                    objective = None
+                    train_idx = torch.randperm(candidate_x.shape[0])[:10]
+                    train_x, train_y = candidate_x[train_idx], candidate_y[train_idx]
+                    target = 0.0
+                candidates.remove_points(train_x)
+                observations = ObservationStore.from_tensors(train_x, train_y, capacity=10 + n_steps)
+                for _ in range(n_steps):
+                    start = time.perf_counter()
+                    next_x, next_y, next_idx = optimizer.get_next_point(
+                        train_x=observations,
+                        train_y=None,
+                        filtered_candidate_x=candidates,
+                        filtered_candidate_y=None,
+                        kernel_type=kernel_type,
+                        acquisition_type=acquisition_type,
+                        objective=objective,
+                        candidate_sampler=sampler,
+                    )
+                    latencies.append(time.perf_counter() - start)
+                    observations.append(next_x, next_y)
+                    candidates.remove(next_idx)
+                regrets.append(float(observations.y_min) - target)
+            step, regret = median(latencies), sum(regrets) / len(regrets)
+            baseline = baseline or (step, regret)
+            print(
+                f"{problem:>12} {name:>12}: step {1000 * step:8.1f} ms ({baseline[0] / step:5.1f}x), "
+                f"regret after {n_steps} steps {regret:.4f} (all candidates: {baseline[1]:.4f})"
+            )
+
+
+def benchmark_acquisition_cache(n_steps=30, seeds=[0, 1], periods=[5, 10], kernels=[KernelType.MATERN52, KernelType.WENDLAND], acquisition_type=AcquisitionType.EI, objectives=['7609_9D']):
+    """
+    Step latency, candidates scored per step and regret with an AcquisitionCache (full rescore every `period` steps,
+    local rescoring around the new observation in between) against scoring every candidate with a new fit every step,
+    on the Ackley grid (lazy CandidateGrid) and on HPO-B CSVs (CandidatePool).
+    The kernel radius shrinks with the lengthscale: it is shortest for the compactly supported Wendland kernel.
+    """
+    data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks', 'hpob_data')
+    problems = {'Ackley grid': (Benchmarks.ACKLEY_CONFIG, Benchmarks.Ackley)}
+    problems.update({objective: HPOB(data_dir=data_dir, objective=objective).get_data() for objective in objectives})
+
+    for problem, data in problems.items():
+        for kernel_type in kernels:
+            for period in [None] + periods:
+                latencies, regrets, n_scored = [], [], []
+                for seed in seeds:
+                    optimizer = BayesianOptimizer()
+                    optimizer.set_seed(seed)
+                    cache = AcquisitionCache(full_rescore_every=period) if period else None
+                    if not isinstance(data[0], torch.Tensor):
+                        config, objective = data
+                        candidates = CandidateGrid.from_bounds(bounds=config.bounds, n_grid=config.n_grid, dim=config.dim)
+                        train_x = candidates.points(torch.randperm(candidates.n_total)[:10])
+                        train_y = torch.as_tensor(objective(train_x))
+                        target = config.target
+                    else:
+                        candidate_x, candidate_y = data
+                        candidates = CandidatePool(candidate_x, candidate_y)
+                        objective = None
+                        train_idx = torch.randperm(candidate_x.shape[0])[:10]
+                        train_x, train_y = candidate_x[train_idx], candidate_y[train_idx]
+                        target = 0.0
+                    candidates.remove_points(train_x)
+                    observations = ObservationStore.from_tensors(train_x, train_y, capacity=10 + n_steps)
+                    for _ in range(n_steps):
+                        start = time.perf_counter()
+                        next_x, next_y, next_idx = optimizer.get_next_point(
+                            train_x=observations,
+                            train_y=None,
+                            filtered_candidate_x=candidates,
+                            filtered_candidate_y=None,
+                            kernel_type=kernel_type,
+                            acquisition_type=acquisition_type,
+                            objective=objective,
+                            acquisition_cache=cache,
+                        )
+                        latencies.append(time.perf_counter() - start)
+                        observations.append(next_x, next_y)
+                        candidates.remove(next_idx)
+                    regrets.append(float(observations.y_min) - target)
+                    n_scored.append(cache.n_scored / n_steps if cache is not None else candidates.n_total)
+                name = f"every {period}" if period else "no cache"
+                print(
+                    f"{problem:>12} {kernel_type.value:>9} {name:>9}: step {1000 * sum(latencies) / len(latencies):8.1f} ms (mean), "
+                    f"{sum(n_scored) / len(n_scored):9.0f} candidates scored per step, regret after {n_steps} steps {sum(regrets) / len(regrets):.4f}"
+                )
+
+
+def benchmark_batch_selection(n_evaluations=32, batch_sizes=[1, 4, 8], seeds=[0, 1], kernel_type=KernelType.MATERN52, acquisition_type=AcquisitionType.EI, objectives=['7609_9D']):
+    """
+    Time per batch and regret of q-point batches (get_next_batch) against sequential BO (q=1) with the same number of
+    evaluations, and with the same number of batches (rounds of parallel experiments),
+    on the Ackley grid (lazy CandidateGrid) and on HPO-B CSVs (CandidatePool).
+    """
+    data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks', 'hpob_data')
+    problems = {'Ackley grid': (Benchmarks.ACKLEY_CONFIG, Benchmarks.Ackley)}
+    problems.update({objective: HPOB(data_dir=data_dir, objective=objective).get_data() for objective in objectives})
+    n_rounds = n_evaluations // max(batch_sizes)
+
+    for problem, data in problems.items():
+        for q in batch_sizes:
+            for strategy in ([None] if q == 1 else list(BatchStrategy)):
+                latencies, regrets, round_regrets = [], [], []
+                for seed in seeds:
+                    optimizer = BayesianOptimizer()
+                    optimizer.set_seed(seed)
+                    if not isinstance(data[0], torch.Tensor):
+                        config, objective = data
+                        candidates = CandidateGrid.from_bounds(bounds=config.bounds, n_grid=config.n_grid, dim=config.dim)
+                        train_x = candidates.points(torch.randperm(candidates.n_total)[:10])
+                        train_y = torch.as_tensor(objective(train_x))
+                        target = config.target
+                    else:
+                        candidate_x, candidate_y = data
+                        candidates = CandidatePool(candidate_x, candidate_y)
+                        objective = None
+                        train_idx = torch.randperm(candidate_x.shape[0])[:10]
+                        train_x, train_y = candidate_x[train_idx], candidate_y[train_idx]
+                        target = 0.0
+                    candidates.remove_points(train_x)
+                    observations = ObservationStore.from_tensors(train_x, train_y, capacity=10 + n_evaluations)
+                    for batch in range(n_evaluations // q):
+                        start = time.perf_counter()
+                        if q == 1:
+                            next_x, next_y, next_idx = optimizer.get_next_point(train_x=observations, train_y=None, filtered_candidate_x=candidates, filtered_candidate_y=None, kernel_type=kernel_type, acquisition_type=acquisition_type, objective=objective)
+                        else:
+                            next_x, next_y, next_idx = optimizer.get_next_batch(train_x=observations, train_y=None, filtered_candidate_x=candidates, filtered_candidate_y=None, kernel_type=kernel_type, acquisition_type=acquisition_type, q=q, strategy=strategy, objective=objective)
+                        latencies.append(time.perf_counter() - start)
+                        observations.append(next_x, next_y)
+                        candidates.remove(next_idx)
+                        if batch + 1 == n_rounds:
+                            round_regrets.append(float(observations.y_min) - target)
+                    regrets.append(float(observations.y_min) - target)
+                name = f"q={q}" + (f" {strategy.value}" if strategy else "")
+                print(
+                    f"{problem:>12} {name:>8}: {1000 * sum(latencies) / len(latencies):8.1f} ms per batch, "
+                    f"regret after {n_evaluations} evaluations {sum(regrets) / len(regrets):.4f}, "
+                    f"after {n_rounds} batches {sum(round_regrets) / len(round_regrets):.4f}"
+                )
+
+
+def benchmark_async_loop(n_workers=4, n_evaluations=24, durations=(0.5, 2.5), n_grid=21, seeds=[0, 1], kernel_type=KernelType.MATERN52, acquisition_type=AcquisitionType.EI):
+    """
+    Wall time, worker utilization and regret of n_evaluations Ackley evaluations with n_workers process-pool workers,
+    each evaluation sleeping a random duration (uniform in durations, in seconds) to simulate an experiment:
+    sequential BO (one evaluation at a time), synchronous batches of n_workers points (get_next_batch, the next
+    batch waits for the slowest evaluation), and the asynchronous ask/tell loop (AsyncOptimizer.run).
+    """
+    config, objective = Benchmarks.ACKLEY_CONFIG, Benchmarks.Ackley
+
+    async def run_batches(optimizer, candidates, observations, evaluator, q):
+        busy_time, start = 0.0, time.perf_counter()
+
+        async def timed(x):
+            submitted = time.perf_counter()
+            y = await evaluator.evaluate(x)
+            return y, time.perf_counter() - submitted
+
+        while len(observations) < 10 + n_evaluations:
+            if q == 1:
+                batch_x, _, batch_idx = optimizer.get_next_point(train_x=observations, train_y=None, filtered_candidate_x=candidates, filtered_candidate_y=None, kernel_type=kernel_type, acquisition_type=acquisition_type)
+            else:
+                batch_x, _, batch_idx = optimizer.get_next_batch(train_x=observations, train_y=None, filtered_candidate_x=candidates, filtered_candidate_y=None, kernel_type=kernel_type, acquisition_type=acquisition_type, q=q)
+            results = await asyncio.gather(*[timed(x.unsqueeze(0)) for x in batch_x])
+            observations.append(batch_x, torch.cat([y for y, _ in results]))
+            candidates.remove(batch_idx)
+            busy_time += sum(duration for _, duration in results)
+        wall_time = time.perf_counter() - start
+        return {'wall_time': wall_time, 'busy_time': busy_time, 'utilization': busy_time / (n_workers * wall_time)}
+
+    for mode in ['sequential', 'batch', 'async']:
+        stats, regrets = [], []
+        for seed in seeds:
+            optimizer = BayesianOptimizer()
+            optimizer.set_seed(seed)
+            rng = random.Random(seed)
+            evaluator = ProcessPoolEvaluator(objective, max_workers=n_workers, duration=lambda x: rng.uniform(*durations))
+            candidates = CandidateGrid.from_bounds(bounds=config.bounds, n_grid=n_grid, dim=config.dim)
+            train_x = candidates.points(torch.randperm(candidates.n_total)[:10])
+            candidates.remove_points(train_x)
+            observations = ObservationStore.from_tensors(train_x, torch.as_tensor(objective(train_x)), capacity=10 + n_evaluations)
+            if mode == 'async':
+                loop = AsyncOptimizer(optimizer, candidates, observations, kernel_type, acquisition_type)
+                stats.append(asyncio.run(loop.run(evaluator, n_evaluations=n_evaluations, n_workers=n_workers)))
+            else:
+                stats.append(asyncio.run(run_batches(optimizer, candidates, observations, evaluator, q=1 if mode == 'sequential' else n_workers)))
+            evaluator.close()
+            regrets.append(observations.y_min - config.target)
+        print(
+            f"{mode:>10}: wall time {sum(stat['wall_time'] for stat in stats) / len(stats):6.1f} s, "
+            f"utilization {100 * sum(stat['utilization'] for stat in stats) / len(stats):5.1f}% of {n_workers} workers, "
+            f"regret after {n_evaluations} evaluations {sum(regrets) / len(regrets):.4f}"
+        )
+
+
+def benchmark_speculative(n_steps=8, duration=10.0, seeds=[0], kernel_type=KernelType.MATERN52, acquisition_type=AcquisitionType.EI, objectives=['7609_9D'], boost_steps=3, boost_duration=45.0):
+    """
+    Decision latency (time from the objective value to the next point) of plain BO steps against speculative steps
+    (SpeculativeOptimizer precomputes the next step while the objective runs, simulated by sleeping duration seconds),
+    on the Ackley grid (lazy CandidateGrid) and on HPO-B CSVs (CandidatePool); then the same with a BOOST
+    recommendation before every step (2 kernels x 2 acquisitions, speculated for the fantasized mean only).
+    """
+    data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks', 'hpob_data')
+    problems = {'Ackley grid': (Benchmarks.ACKLEY_CONFIG, Benchmarks.Ackley)}
+    problems.update({objective: HPOB(data_dir=data_dir, objective=objective).get_data() for objective in objectives})
+    settings = [(False, n_steps, duration), (True, boost_steps, boost_duration)]
+
+    for use_boost, steps, sleep in settings:
+        for problem, data in problems.items():
+            if use_boost and problem != 'Ackley grid':
+                continue
+            for speculative in [False, True]:
+                latencies, regrets, n_hits = [], [], 0
+                for seed in seeds:
+                    optimizer = BayesianOptimizer()
+                    optimizer.set_seed(seed)
+                    if not isinstance(data[0], torch.Tensor):
+                        config, objective = data
+                        candidates = CandidateGrid.from_bounds(bounds=config.bounds, n_grid=config.n_grid, dim=config.dim)
+                        train_x = candidates.points(torch.randperm(candidates.n_total)[:10])
+                        train_y = torch.as_tensor(objective(train_x))
+                        target = config.target
+                    else:
+                        candidate_x, candidate_y = data
+                        candidates = CandidatePool(candidate_x, candidate_y)
+                        objective = None
+                        train_idx = torch.randperm(candidate_x.shape[0])[:10]
+                        train_x, train_y = candidate_x[train_idx], candidate_y[train_idx]
+                        target = 0.0
+                    candidates.remove_points(train_x)
+                    observations = ObservationStore.from_tensors(train_x, train_y, capacity=10 + steps)
+                    boost = BOOST(kernel_candidates=[KernelType.MATERN52, KernelType.RBF], acquisition_candidates=[AcquisitionType.EI, AcquisitionType.UCB]) if use_boost else None
+                    speculation = SpeculativeOptimizer(optimizer, quantiles=(0.5,) if use_boost else (0.5, 0.1, 0.9), boost=boost) if speculative else None
+                    kernel, acquisition, backend = kernel_type, acquisition_type, GPBackend.EXACT
+
+                    next_x, _, next_idx = optimizer.get_next_point(train_x=observations, train_y=None, filtered_candidate_x=candidates, filtered_candidate_y=None, kernel_type=kernel, acquisition_type=acquisition)
+                    for step in range(steps):
+                        candidates.remove(next_idx)
+                        if speculation is not None:
+                            speculation.speculate(observations=observations, candidates=candidates, next_x=next_x, next_idx=next_idx, kernel_type=kernel, acquisition_type=acquisition, backend=backend, seed=seed, iter=step)
+                        # the experiment
+                        time.sleep(sleep)
+                        if objective is None:
+                            next_y = candidates.y[next_idx].reshape(1)
+                        else:
+                            next_y = torch.as_tensor(objective(next_x), dtype=next_x.dtype).reshape(1)
+                        observations.append(next_x, next_y)
+
+                        start = time.perf_counter()
+                        if speculation is not None:
+                            kernel, acquisition, backend, next_x, next_idx = speculation.resolve(next_y)
+                        else:
+                            if boost is not None:
+                                recommended = boost.recommend(train_x_init=observations.x, train_y_init=observations.y, seed=step)
+                                kernel, acquisition = KernelType(recommended['recommended_kernel']), AcquisitionType(recommended['recommended_acquisition'])
+                            optimizer.set_seed(seed)
+                            next_x, _, next_idx = optimizer.get_next_point(train_x=observations, train_y=None, filtered_candidate_x=candidates, filtered_candidate_y=None, kernel_type=kernel, acquisition_type=acquisition, backend=backend)
+                        latencies.append(time.perf_counter() - start)
+                    if speculation is not None:
+                        n_hits += speculation.n_hits
+                        speculation.close()
+                    regrets.append(float(observations.y_min) - target)
+                name = ("BOOST " if use_boost else "") + ("speculative" if speculative else "plain")
+                print(
+                    f"{problem:>12} {name:>17}: decision latency {1000 * median(latencies):8.1f} ms median, "
+                    f"{1000 * max(latencies):8.1f} ms max, "
+                    + (f"{n_hits}/{len(latencies)} precomputed, " if speculative else "")
+                    + f"regret after {steps} evaluations {sum(regrets) / len(regrets):.4f}"
+                )
+
+
+def benchmark_cost_aware(budget=150.0, seeds=[0, 1, 2], kernel_type=KernelType.MATERN52, objectives=['7609_9D']):
+    """
+    Regret against the cumulative evaluation cost of EI and of EI per unit cost (EIPC) with the costs looked up
+    (a cost column) or learned by the log-cost GP of the CostModel, on HPO-B CSVs with a synthetic cost column:
+    1 to 10 linearly in the first hyperparameter (e.g. a training budget).
+    """
+    data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks', 'hpob_data')
+    for objective in objectives:
+        candidate_x, candidate_y = HPOB(data_dir=data_dir, objective=objective).get_data()
+        first = candidate_x[:, 0]
+        candidate_cost = 1 + 9 * (first - first.min()) / (first.max() - first.min())
+        for name, acquisition_type, known_cost in [('EI', AcquisitionType.EI, True), ('EIpc cost column', AcquisitionType.EIPC, True), ('EIpc learned cost', AcquisitionType.EIPC, False)]:
+            latencies, half_regrets, regrets, n_evaluations = [], [], [], []
+            for seed in seeds:
+                optimizer = BayesianOptimizer()
+                optimizer.set_seed(seed)
+                train_idx = torch.randperm(candidate_x.shape[0])[:10]
+                candidate_pool = CandidatePool(candidate_x, candidate_y)
+                candidate_pool.remove(train_idx)
+                observations = ObservationStore.from_tensors(candidate_x[train_idx], candidate_y[train_idx], idx=train_idx)
+                cost_model = CostModel(candidate_cost=candidate_cost if known_cost else None)
+                cost_model.observe(candidate_x[train_idx], candidate_cost[train_idx])
+                spent, half_regret = 0.0, None
+                while spent < budget:
+                    start = time.perf_counter()
+                    next_x, next_y, next_idx = optimizer.get_next_point(train_x=observations, train_y=None, filtered_candidate_x=candidate_pool, filtered_candidate_y=None, kernel_type=kernel_type, acquisition_type=acquisition_type, cost_model=cost_model)
+                    latencies.append(time.perf_counter() - start)
+                    observations.append(next_x, next_y, next_idx)
+                    candidate_pool.remove(next_idx)
+                    cost_model.observe(next_x, candidate_cost[next_idx])
+                    spent += candidate_cost[next_idx].item()
+                    if half_regret is None and spent >= budget / 2:
+                        half_regret = float(observations.y_min)
+                half_regrets.append(half_regret)
+                regrets.append(float(observations.y_min))
+                n_evaluations.append(len(observations) - 10)
+            print(
+                f"{objective:>8} {name:>17}: {1000 * median(latencies):6.1f} ms per step, "
+                f"{sum(n_evaluations) / len(n_evaluations):5.1f} evaluations, "
+                f"regret at cost {budget / 2:.0f} {sum(half_regrets) / len(half_regrets):.4f}, "
+                f"at cost {budget:.0f} {sum(regrets) / len(regrets):.4f}"
+            )
+
+
+def benchmark_warm_start(n_evaluations=20, checkpoints=[5, 10, 20], n_studies=3, n_study_points=200, seeds=[0, 1, 2], kernel_type=KernelType.MATERN52, acquisition_type=AcquisitionType.EI, objectives=['7609_9D']):
+    """
+    Regret after a number of evaluations from a cold start (10 random initial points) and from a WarmStart of
+    n_studies related prior studies: 5 of the 10 initial points seeded from the studies' best configurations
+    (design), plus GP fits starting from the studies' hyperparameters (design + hyperparameters).
+    Ackley grid: the studies are n_study_points random grid points of Ackley shifted by up to 2 grid steps.
+    HPO-B CSVs: the studies are random rows of one half of the CSV with noisy y, the run uses the other half.
+    """
+    data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks', 'hpob_data')
+    problems = {'Ackley grid': (Benchmarks.ACKLEY_CONFIG, Benchmarks.Ackley)}
+    problems.update({objective: HPOB(data_dir=data_dir, objective=objective).get_data() for objective in objectives})
+
+    for problem, data in problems.items():
+        for mode in ['cold', 'design', 'design + hyperparameters']:
+            regrets = {checkpoint: [] for checkpoint in checkpoints}
+            for seed in seeds:
+                optimizer = BayesianOptimizer()
+                optimizer.set_seed(seed)
+                generator = torch.Generator().manual_seed(1000 + seed)
+                if not isinstance(data[0], torch.Tensor):
+                    config, objective = data
+                    candidates = CandidateGrid.from_bounds(bounds=config.bounds, n_grid=config.n_grid, dim=config.dim)
+                    step = (config.bounds[1] - config.bounds[0]) / (config.n_grid - 1)
+                    studies = []
+                    for _ in range(n_studies):
+                        shift = (torch.rand(config.dim, generator=generator, dtype=torch.double) * 4 - 2) * step
+                        x = candidates.points(torch.randint(candidates.n_total, (n_study_points,), generator=generator))
+                        studies.append(PriorStudy(x, objective((x - shift).numpy())))
+                    target = config.target
+                else:
+                    candidate_x, candidate_y = data
+                    halves = torch.randperm(candidate_x.shape[0], generator=torch.Generator().manual_seed(0))
+                    prior_rows, rows = halves[:candidate_x.shape[0] // 2], halves[candidate_x.shape[0] // 2:]
+                    studies = []
+                    for _ in range(n_studies):
+                        study_rows = prior_rows[torch.randperm(prior_rows.shape[0], generator=generator)[:n_study_points]]
+                        studies.append(PriorStudy(candidate_x[study_rows], candidate_y[study_rows] + 0.05 * torch.randn(n_study_points, generator=generator, dtype=torch.double)))
+                    candidate_x, candidate_y = candidate_x[rows], candidate_y[rows]
+                    candidates = CandidatePool(candidate_x, candidate_y)
+                    objective = None
+                    target = float(candidate_y.min())
+
+                train_idx = torch.randperm(candidates.n_total)[:10]
+                if mode != 'cold':
+                    warm_start = WarmStart(studies, seed=seed)
+                    warm_idx = warm_start.initial_design(candidates, 5)
+                    train_idx = torch.cat([warm_idx, train_idx[~torch.isin(train_idx, warm_idx)]])[:10]
+                    if mode == 'design + hyperparameters':
+                        warm_start.apply(optimizer, kernel_types=[kernel_type])
+                train_x = candidates.points(train_idx)
+                train_y = candidates.y[train_idx] if objective is None else torch.as_tensor(objective(train_x))
+                candidates.remove(train_idx)
+                observations = ObservationStore.from_tensors(train_x, train_y, capacity=10 + n_evaluations)
+                for evaluation in range(1, n_evaluations + 1):
+                    next_x, next_y, next_idx = optimizer.get_next_point(train_x=observations, train_y=None, filtered_candidate_x=candidates, filtered_candidate_y=None, kernel_type=kernel_type, acquisition_type=acquisition_type, objective=objective)
+                    observations.append(next_x, next_y)
+                    candidates.remove(next_idx)
+                    if evaluation in regrets:
+                        regrets[evaluation].append(float(observations.y_min) - target)
+            print(
+                f"{problem:>12} {mode:>24}: regret after "
+                + ", ".join(f"{checkpoint} evaluations {sum(values) / len(values):.4f}" for checkpoint, values in regrets.items())
+            )
+
+
+def ackley_numpy(individuals):
+    """Ackley on a numpy array (n, dim), as Benchmarks.Ackley computed it before the torch-native path"""
+    n = individuals.shape[1]
+    sum1 = np.sum(individuals ** 2, axis=1)
+    sum2 = np.sum(np.cos(2 * np.pi * individuals), axis=1)
+    return -20 * np.exp(-0.2 * np.sqrt(sum1 / n)) - np.exp(sum2 / n) + 20 + np.exp(1)
+
+
+def slow_ackley(individuals, duration=0.2, slow_duration=5.0):
+    """Ackley of one point after sleeping duration seconds, slow_duration when x1 > 20 (a simulator that hangs)"""
+    time.sleep(slow_duration if individuals[0, 0] > 20 else duration)
+    return Benchmarks.Ackley(individuals)
+
+
+def benchmark_objective_adapter(n_points=20000, n_slow_points=24, n_workers=4, timeout=1.0, n_steps=15, kernel_type=KernelType.MATERN52, acquisition_type=AcquisitionType.EI):
+    """
+    Evaluation time per point of Ackley through the Objective adapter: one call per point with a numpy round trip,
+    one numpy call per batch (VECTORIZED) and one torch call per batch (TORCH); then a slow simulator (slow_ackley)
+    evaluated point by point in-process against PROCESS_POOL with n_workers processes and a timeout (penalty 25);
+    then the evaluation and optimizer time of TestFunction runs with the TORCH and the PROCESS_POOL objective.
+    """
+    config = Benchmarks.ACKLEY_CONFIG
+    candidates = CandidateGrid.from_bounds(bounds=config.bounds, n_grid=config.n_grid, dim=config.dim)
+    x = candidates.points(torch.randperm(candidates.n_total, generator=torch.Generator().manual_seed(0))[:n_points])
+    reference = torch.as_tensor(ackley_numpy(x.numpy()))
+
+    settings = [
+        ('per point, numpy', Objective(ackley_numpy, mode=EvaluationMode.VECTORIZED), 1),
+        ('batch, VECTORIZED', Objective(ackley_numpy, mode=EvaluationMode.VECTORIZED), n_points),
+        ('per point, TORCH', Objective(Benchmarks.Ackley), 1),
+        ('batch, TORCH', Objective(Benchmarks.Ackley), n_points),
+    ]
+    for name, objective, batch_size in settings:
+        y = torch.cat([objective(x[start:start + batch_size]) for start in range(0, n_points, batch_size)])
+        print(
+            f"{name:>18}: {1e6 * objective.eval_time / n_points:8.2f} us per point, {objective.n_calls:5d} calls, "
+            f"max difference {(y - reference).abs().max().item():.1e}"
+        )
+
+    slow_x = candidates.points(torch.randperm(candidates.n_total, generator=torch.Generator().manual_seed(1))[:n_slow_points])
+    settings = [
+        ('slow, in-process', Objective(slow_ackley, mode=EvaluationMode.VECTORIZED), 1),
+        ('slow, PROCESS_POOL', Objective(slow_ackley, mode=EvaluationMode.PROCESS_POOL, max_workers=n_workers, timeout=timeout, timeout_value=25.0), n_slow_points),
+    ]
+    for name, objective, batch_size in settings:
+        y = torch.cat([objective(slow_x[start:start + batch_size]) for start in range(0, n_slow_points, batch_size)])
+        print(
+            f"{name:>18}: {objective.eval_time:6.2f} s for {n_slow_points} points, {objective.n_timeouts} timeouts, "
+            f"best {y.min().item():.4f}"
+        )
+        objective.close()
+
+    settings = [
+        ('TestFunction, TORCH', Objective(Benchmarks.Ackley)),
+        ('TestFunction, PROCESS_POOL', Objective(slow_ackley, mode=EvaluationMode.PROCESS_POOL, max_workers=1, timeout=timeout, timeout_value=25.0)),
+    ]
+    for name, objective in settings:
+        with tempfile.TemporaryDirectory() as base_dir:
+            test = TestFunction(kernel_type=kernel_type, acquisition_type=acquisition_type, objective=objective, bounds=config.bounds, n_grid=config.n_grid, dim=config.dim, target=config.target, max_iter=10 + n_steps, base_dir=base_dir)
+            result = test.optimize_recommend_adaptive()
+        print(
+            f"{name:>26}: evaluation {result['eval_time']:6.2f} s, optimizer {result['optimizer_time']:6.2f} s, "
+            f"{objective.n_evaluations} evaluations, {objective.n_timeouts} timeouts"
+        )
+        objective.close()
+
+
+def benchmark_subspace(dims=[8, 16, 32, 64, 128], n_candidates=20000, n_effective=4, n_dims=4, n_steps=20, seeds=[0, 1], grid_dims=[5, 6, 7], n_grid=11, grid_steps=5, kernel_type=KernelType.MATERN52, acquisition_type=AcquisitionType.EI, objectives=['5906_16D']):
+    """
+    Median per-step latency and regret of BO on all coordinates against the Subspace mode (random embedding and
+    active axes, n_dims projected coordinates) as the ambient dimension grows: random pools of n_candidates points
+    in [-31.5, 31.5]^dim and lazy grids (n_grid points per axis) where Ackley depends on n_effective random
+    coordinates, and HPO-B CSVs.
+    """
+    config = Benchmarks.ACKLEY_CONFIG
+    methods = [None, SubspaceMethod.RANDOM_EMBEDDING, SubspaceMethod.ACTIVE_AXES]
+
+    def run(dim, make_run):
+        for method in methods:
+            latencies, regrets = [], []
+            for seed in seeds:
+                generator = torch.Generator().manual_seed(seed)
+                axes = torch.randperm(dim, generator=generator)[:n_effective]
+                subspace = Subspace(dim, n_dims=n_dims, method=method, seed=seed) if method is not None else None
+                step_latencies, regret = make_run(axes, generator, subspace, seed)
+                latencies += step_latencies
+                regrets.append(regret)
+            yield method.value if method is not None else 'full', median(latencies), sum(regrets) / len(regrets)
+
+    def pool_run(dim):
+        def make_run(axes, generator, subspace, seed):
+            candidate_x = config.bounds[0] + (config.bounds[1] - config.bounds[0]) * torch.rand(n_candidates, dim, generator=generator, dtype=torch.double)
+            candidate_y = Benchmarks.Ackley(candidate_x[:, axes])
+            latencies, _, best, _ = run_steps(BayesianOptimizer(), candidate_x, candidate_y, kernel_type, acquisition_type, n_steps=n_steps, seed=seed, subspace=subspace)
+            return latencies, float(best) - float(candidate_y.min())
+        return make_run
+
+    def grid_run(dim):
+        def make_run(axes, generator, subspace, seed):
+            def objective(x):
+                return Benchmarks.Ackley(x[:, axes])
+            optimizer = BayesianOptimizer()
+            optimizer.set_seed(seed)
+            candidates = CandidateGrid.from_bounds(bounds=config.bounds, n_grid=n_grid, dim=dim)
+            train_x = candidates.points(torch.randint(candidates.n_total, (10,)))
+            candidates.remove_points(train_x)
+            observations = ObservationStore.from_tensors(train_x, objective(train_x), capacity=10 + grid_steps)
+            latencies = []
+            for _ in range(grid_steps):
+                start = time.perf_counter()
+                next_x, next_y, next_idx = optimizer.get_next_point(train_x=observations, train_y=None, filtered_candidate_x=candidates, filtered_candidate_y=None, kernel_type=kernel_type, acquisition_type=acquisition_type, objective=objective, subspace=subspace)
+                latencies.append(time.perf_counter() - start)
+                observations.append(next_x, next_y)
+                candidates.remove(next_idx)
+            return latencies, float(observations.y_min) - config.target
+        return make_run
+
+    for dim in dims:
+        for name, latency, regret in run(dim, pool_run(dim)):
+            print(f"pool {dim:4d}D {name:>7}: {1000 * latency:8.1f} ms per step, regret after {n_steps} steps {regret:.4f}")
+    for dim in grid_dims:
+        for name, latency, regret in run(dim, grid_run(dim)):
+            print(f"grid {dim:4d}D {name:>7}: {1000 * latency:8.1f} ms per step, regret after {grid_steps} steps {regret:.4f}")
+
+    data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks', 'hpob_data')
+    for objective in objectives:
+        candidate_x, candidate_y = HPOB(data_dir=data_dir, objective=objective).get_data()
+        for method in methods:
+            latencies, regrets = [], []
+            for seed in seeds:
+                subspace = Subspace(candidate_x.shape[1], n_dims=n_dims, method=method, seed=seed) if method is not None else None
+                step_latencies, _, best, _ = run_steps(BayesianOptimizer(), candidate_x, candidate_y, kernel_type, acquisition_type, n_steps=n_steps, seed=seed, subspace=subspace)
+                latencies += step_latencies
+                regrets.append(float(best) - float(candidate_y.min()))
+            name = method.value if method is not None else 'full'
+            print(f"{objective:>9} {name:>7}: {1000 * median(latencies):8.1f} ms per step, regret after {n_steps} steps {sum(regrets) / len(regrets):.4f}")
+
+
+def rss_anon():
+    """Anonymous resident memory of this process in bytes (the page cache of memory-mapped files is not counted)"""
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('RssAnon:'):
+                return int(line.split()[1]) * 1024
+
+
+def drop_page_cache(path):
+    """Evict the cached pages of a file that is not mapped, so that the next reads go to the disk"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+def benchmark_memmap_pool(n_rows=[10**6, 4 * 10**6], dim=9, n_steps=4, chunk_rows=10**6, seed=0, kernel_type=KernelType.MATERN52, acquisition_type=AcquisitionType.EI):
+    """
+    Per-step latency and anonymous memory of BO over a pool of n_rows random Ackley points in [-31.5, 31.5]^dim:
+    read into memory (CandidatePool) against a MemmapPool of .npy files, with and without prefetching the next chunk.
+    The first step starts from a cold page cache; the picks must be the same.
+    """
+    config = Benchmarks.ACKLEY_CONFIG
+    for n in n_rows:
+        with tempfile.TemporaryDirectory() as directory:
+            x_path, y_path = os.path.join(directory, 'x.npy'), os.path.join(directory, 'y.npy')
+            x = np.lib.format.open_memmap(x_path, mode='w+', dtype=np.float64, shape=(n, dim))
+            y = np.lib.format.open_memmap(y_path, mode='w+', dtype=np.float64, shape=(n,))
+            generator = torch.Generator().manual_seed(seed)
+            for start in range(0, n, chunk_rows):
+                rows = config.bounds[0] + (config.bounds[1] - config.bounds[0]) * torch.rand(min(chunk_rows, n - start), dim, generator=generator, dtype=torch.double)
+                x[start:start + rows.shape[0]] = rows.numpy()
+                y[start:start + rows.shape[0]] = Benchmarks.Ackley(rows).numpy()
+            x.flush()
+            y.flush()
+            del x, y
+
+            results = {}
+            for name in ['memory', 'memmap', 'memmap+prefetch']:
+                drop_page_cache(x_path)
+                drop_page_cache(y_path)
+                rss_start = rss_anon()
+                start = time.perf_counter()
+                if name == 'memory':
+                    candidate_x, candidate_y = torch.from_numpy(np.load(x_path)), torch.from_numpy(np.load(y_path))
+                    candidate_pool = CandidatePool(candidate_x, candidate_y)
+                else:
+                    candidate_pool = MemmapPool(x_path, y_path, prefetch=(name == 'memmap+prefetch'))
+                    candidate_x, candidate_y = candidate_pool.x, candidate_pool.y
+                load_time = time.perf_counter() - start
+
+                optimizer = BayesianOptimizer()
+                optimizer.set_seed(seed)
+                index_initial_sample = torch.randperm(n, generator=torch.Generator().manual_seed(seed))[:10]
+                candidate_pool.remove(index_initial_sample)
+                observations = ObservationStore.from_tensors(candidate_x[index_initial_sample], candidate_y[index_initial_sample], capacity=10 + n_steps, idx=index_initial_sample)
+                latencies, selected = [], []
+                for _ in range(n_steps):
+                    start = time.perf_counter()
+                    next_x, next_y, next_idx = optimizer.get_next_point(train_x=observations, train_y=None, filtered_candidate_x=candidate_pool, filtered_candidate_y=None, kernel_type=kernel_type, acquisition_type=acquisition_type)
+                    latencies.append(time.perf_counter() - start)
+                    observations.append(next_x, next_y, next_idx)
+                    candidate_pool.remove(next_idx)
+                    selected.append(int(next_idx))
+                results[name] = selected
+                rss = rss_anon() - rss_start
+                print(f"{n:9d} rows {name:>15}: load {load_time:6.2f} s, cold step {latencies[0]:6.2f} s, warm steps {median(latencies[1:]):6.2f} s, RssAnon +{rss / 2**20:7.1f} MiB")
+                del candidate_pool, candidate_x, candidate_y, observations
+            print(f"{n:9d} rows: same picks {results['memmap'] == results['memory'] and results['memmap+prefetch'] == results['memory']}")
+
+
+if __name__ == '__main__':
+    benchmark_model_reuse()
+    benchmark_distance_cache()
+    benchmark_kronecker_grid()
+    benchmark_mixed_precision()
+    benchmark_compiled_steps()
+    benchmark_moments_planner()
+    benchmark_thompson_sampling()
+    benchmark_sparse_backend()
+    benchmark_compact_kernel()
+    benchmark_continuous_domain()
+    benchmark_trust_region()
+    benchmark_candidate_samplers()
+    benchmark_acquisition_cache()
+    benchmark_batch_selection()
+    benchmark_async_loop()
+    benchmark_speculative()
+    benchmark_cost_aware()
+    benchmark_warm_start()
+    benchmark_objective_adapter()
+    benchmark_subspace()
+    benchmark_memmap_pool()
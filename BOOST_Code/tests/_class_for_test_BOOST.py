@@ -2,6 +2,7 @@
 import os
 import gc
 import random
+import time
 
 import numpy as np
 import torch
@@ -10,8 +11,14 @@ from tqdm import tqdm
 from benchmarks.Benchmark_ftn import Benchmarks
 from core.BOOST import BOOST
 from core.BayesianOptimization import BayesianOptimizer
-from core.kernels_and_acquisitions import KernelType, AcquisitionType
-from utils.Save_results import save_final_data_to_excel
+from core.candidates import CandidateGrid, CandidatePool, CandidateSet, ContinuousBox
+from core.cost import CostModel
+from core.kernels_and_acquisitions import KernelType, AcquisitionType, GPBackend
+from core.objectives import Objective
+from core.observations import ObservationStore
+from core.speculative import SpeculativeOptimizer
+from core.trust_region import TrustRegion
+from utils.Save_results import save_final_data_to_excel, save_recommendation_log
 
 os.environ['OMP_NUM_THREADS'] = '1'
 
@@ -34,12 +41,29 @@ class TestFunction(BayesianOptimizer):
             is_fixed_candidate_x=False,
             candidate_x=None,
             candidate_y=None,
+            cache_distances=False,
+            backend=GPBackend.EXACT,
+            backend_candidates=[GPBackend.EXACT],
+            continuous=False,
+            snap_to_grid=True,
+            trust_region=False,
+            candidate_sampler=None,
+            speculative=False,
+            candidate_cost=None,
+            warm_start=None,
+            n_warm_points=None,
+            subspace=None,
+            candidate_pool=None,
             ):
-        super().__init__(device=device)
+        super().__init__(device=device, backend=backend)
         self.device = device or torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self.kernel_type = kernel_type
         self.acquisition_type = acquisition_type
         self.use_boost = use_boost
+        # Objective functions are wrapped in an Objective adapter (core/objectives.py, EvaluationMode.TORCH unless an
+        # Objective is given), whose counters separate the evaluation time from the optimizer time
+        if callable(objective) and not isinstance(objective, Objective):
+            objective = Objective(objective)
         self.objective = objective
         self.bounds = bounds
         self.n_grid = n_grid
@@ -52,6 +76,25 @@ class TestFunction(BayesianOptimizer):
         self.base_dir = base_dir
 
         self.is_fixed_candidate_x = is_fixed_candidate_x
+        # Pairwise distance cache of the fixed candidate pool (is_fixed_candidate_x=True only)
+        self.cache_distances = cache_distances
+        # GP backends BOOST compares; the recommended one replaces self.backend
+        self.backend_candidates = backend_candidates
+        # continuous=True optimizes the acquisition over the box instead of scoring the n_grid^dim grid
+        # (is_fixed_candidate_x=False only); snap_to_grid keeps the next points on that grid
+        self.continuous = continuous
+        self.snap_to_grid = snap_to_grid
+        # trust_region=True fits and scores locally around the incumbent (TuRBO-style, see core/trust_region.py)
+        self.use_trust_region = trust_region
+        # CandidateSampler (core/samplers.py) that bounds the number of candidates scored per step
+        self.candidate_sampler = candidate_sampler
+        # speculative=True precomputes the next recommendation while the objective runs (see core/speculative.py)
+        self.speculative = speculative
+        # Out-of-core pool (MemmapPool, core/memmap_pool.py) used instead of candidate_x and candidate_y
+        # (is_fixed_candidate_x=True only); every run scores a fork of it, so the rows stay on disk
+        self.candidate_pool = candidate_pool
+        if candidate_pool is not None:
+            candidate_x, candidate_y = candidate_pool.x, candidate_pool.y
         if candidate_x is not None:
             self.candidate_x = candidate_x.to(self.device)
         else:
@@ -60,6 +103,19 @@ class TestFunction(BayesianOptimizer):
             self.candidate_y = candidate_y.to(self.device)
         else:
             self.candidate_y = None
+        # Evaluation cost of every candidate row (e.g. a cost column of the CSV, is_fixed_candidate_x=True only).
+        # Without it, objective evaluations cost their measured wall time and pool lookups cost 1
+        if candidate_cost is not None:
+            self.candidate_cost = candidate_cost.to(self.device)
+        else:
+            self.candidate_cost = None
+        # WarmStart (core/warm_start.py): n_warm_points of the initial points (n_init_points // 2 by default) are the
+        # best configurations of prior studies, GP fits start from their hyperparameters and BOOST gets their prior
+        self.warm_start = warm_start
+        self.n_warm_points = n_warm_points if n_warm_points is not None else n_init_points // 2
+        # Subspace (core/subspace.py): the GP is fitted and the candidates are scored on a low-dimensional projection
+        # (random embedding or active axes), also inside BOOST
+        self.subspace = subspace
 
         self.all_indices = None
         self.train_indices = None
@@ -67,37 +123,77 @@ class TestFunction(BayesianOptimizer):
         self.filtered_candidate_y = None
 
     def optimize_recommend_adaptive(self):
-        torch.set_default_dtype(torch.double)
         self.set_seed(self.seed)
+        run_start = time.perf_counter()
+        if isinstance(self.objective, Objective):
+            self.objective.reset_counters()
         if self.is_fixed_candidate_x:
             # Generate training set
             num_data = self.candidate_x.shape[0]
             index_initial_sample = np.random.choice(num_data, self.n_init_points, replace=False)
-            self.train_x = self.candidate_x[index_initial_sample]
-            self.train_y = self.candidate_y[index_initial_sample]
 
-            mask = torch.ones(self.candidate_x.shape[0], dtype=torch.bool, device=self.device)
-            mask[torch.tensor(index_initial_sample, device=self.device)] = False
-            self.filtered_candidate_x = self.candidate_x[mask]
-            self.filtered_candidate_y = self.candidate_y[mask]
+            # candidate_x and candidate_y are never copied; evaluated rows are only marked in the pool
+            if self.candidate_pool is not None:
+                self.filtered_candidate_x = self.candidate_pool.fork()
+            else:
+                # a run has at most max_iter training points
+                self.filtered_candidate_x = CandidatePool(self.candidate_x, self.candidate_y, cache_distances=self.cache_distances, cache_rows=self.max_iter)
+            if self.warm_start is not None:
+                # the best configurations of the prior studies replace part of the random initial points
+                warm_idx = self.warm_start.initial_design(self.filtered_candidate_x, self.n_warm_points).cpu().numpy()
+                random_idx = index_initial_sample[~np.isin(index_initial_sample, warm_idx)]
+                index_initial_sample = np.concatenate([warm_idx, random_idx])[:self.n_init_points]
+            self.train_x = self.candidate_x[index_initial_sample]
+            self.train_y, train_cost = self._evaluate(self.train_x, torch.as_tensor(index_initial_sample, device=self.device))
+            self.filtered_candidate_x.remove(index_initial_sample)
+            train_idx = torch.as_tensor(index_initial_sample, device=self.device)
 
             self.target = self.candidate_y.min()
 
         else:
             self.train_x = self._generate_lhs_samples(dim=self.dim, n_samples=self.n_init_points, bounds=self.bounds, n_grid=self.n_grid).to(self.device)
-            self.train_y = self.objective(self.train_x).to(dtype=self.train_x.dtype).to(self.device)
-
-            candidate_points = []
-            for d in range(self.dim):
-                candidate_points.append(torch.linspace(self.bounds[0], self.bounds[1], self.n_grid, device=self.device))
-            self.candidate_x = torch.cartesian_prod(*candidate_points).to(self.device)
+            if self.warm_start is not None:
+                if self.continuous:
+                    raise ValueError("warm_start needs a grid (continuous=False)")
+                # the best configurations of the prior studies replace part of the LHS points
+                grid = CandidateGrid.from_bounds(bounds=self.bounds, n_grid=self.n_grid, dim=self.dim, device=self.device)
+                warm_idx = self.warm_start.initial_design(grid, self.n_warm_points)
+                lhs_x = self.train_x[~torch.isin(grid.encode(self.train_x), warm_idx)]
+                self.train_x = torch.cat([grid.points(warm_idx), lhs_x])[:self.n_init_points]
+            self.train_y, train_cost = self._evaluate(self.train_x)
+
+            if self.continuous:
+                self.candidate_x = ContinuousBox.from_bounds(bounds=self.bounds, dim=self.dim, n_grid=self.n_grid if self.snap_to_grid else None, device=self.device)
+            else:
+                # The grid is kept lazy: only the axes and a bitset of evaluated points are stored
+                self.candidate_x = CandidateGrid.from_bounds(bounds=self.bounds, n_grid=self.n_grid, dim=self.dim, device=self.device)
 
             # Remove already selected points from candidate_x
-            mask = ~torch.any(torch.cdist(self.candidate_x, self.train_x) < 1e-5, dim=1)
-            self.filtered_candidate_x = self.candidate_x[mask]
-
+            self.candidate_x.remove_points(self.train_x)
+            self.filtered_candidate_x = self.candidate_x
+            train_idx = None
+
+        # train_x and train_y are views of the preallocated observation buffers
+        self.observations = ObservationStore.from_tensors(self.train_x, self.train_y, capacity=self.max_iter, idx=train_idx)
+        trust_region = TrustRegion(dim=self.train_x.shape[1]) if self.use_trust_region else None
+        n_candidates = self.filtered_candidate_x.n_total if isinstance(self.filtered_candidate_x, CandidateSet) else None
         current_min = self.train_y.min().item()
-
+        # Costs of the evaluations, and the log-cost model of the cost-aware acquisitions (AcquisitionType.EIPC, PIPC)
+        self.cost_model = CostModel(candidate_cost=self.candidate_cost, device=self.device)
+        self.cost_model.observe(self.train_x, train_cost)
+        if self.subspace is not None:
+            # the bounds of the whole domain, before BOOST copies the subspace for its combinations
+            self.subspace.fit_domain(self.filtered_candidate_x)
+        boost_prior = None
+        if self.warm_start is not None:
+            self.warm_start.apply(self, kernel_types=BOOST().kernel_candidates if self.use_boost else [self.kernel_type])
+            boost_prior = self.warm_start.boost_prior()
+        if self.speculative and (self.continuous or self.use_trust_region or self.candidate_sampler is not None or self.subspace is not None):
+            raise ValueError("speculative cannot be combined with continuous, trust_region, candidate_sampler or subspace")
+        speculation = None
+        if self.speculative:
+            boost = BOOST(device=self.device, cache_distances=self.cache_distances, backend_candidates=self.backend_candidates, n_inducing_points=self.n_inducing_points, prior=boost_prior, subspace=self.subspace, initial_hyperparameters=self.initial_hyperparameters) if self.use_boost else None
+            speculation = SpeculativeOptimizer(self, boost=boost)
 
         # Initialize progress bar
         bar_format = '{desc}: {percentage:3.0f}%|{bar:10}| {n:3d}/{total:3d} [{elapsed}<{remaining}, {rate_fmt}]{postfix}'
@@ -110,36 +206,51 @@ class TestFunction(BayesianOptimizer):
         history = {
             'iterations': [],
             'best_values': [],
+            'costs': [],
         }
         for i in range(self.n_init_points):
             history['iterations'].append(i)
+            history['costs'].append(train_cost[:i+1].sum().item())
             regret = self.train_y[:i+1].min().item()-self.target
             value = regret.item() if isinstance(regret, torch.Tensor) else regret
             history['best_values'].append(value)
 
         for iter in pbar:
-            # Use BOOST to get recommendation of kernel and acquisition functions
-            if self.use_boost:
-                boost = BOOST(device=self.device)
-                self.kernel_type, self.acquisition_type = boost.get_kernel_acq(train_x=self.train_x, train_y=self.train_y, objective=self.objective, iter=iter, seed=self.seed, n_init_points=self.n_init_points, base_dir=self.base_dir)
-            # reset seed to be dependent of seed in BOOST
-            self.set_seed(self.seed)
-
-            # Get next point using BO
-            next_x, next_y, next_x_idx = self.get_next_point(train_x=self.train_x, train_y=self.train_y, filtered_candidate_x=self.filtered_candidate_x, filtered_candidate_y=self.filtered_candidate_y, kernel_type=self.kernel_type, acquisition_type=self.acquisition_type, objective=self.objective)
-            # update train_x and train_y
-            self.train_x = torch.cat([self.train_x, next_x], dim=0)
-            self.train_y = torch.cat([self.train_y, next_y], dim=0)
+            if speculation is not None and speculation.pending:
+                # Next point precomputed while the last one was evaluated (or corrected with its value)
+                self.kernel_type, self.acquisition_type, self.backend, next_x, next_x_idx = speculation.resolve(self.train_y[-1])
+                if self.use_boost:
+                    save_recommendation_log(objective_name=self.objective if isinstance(self.objective, str) else self.objective.__name__, seed=self.seed, kernel=self.kernel_type.value, acquisition=self.acquisition_type.value, n_init_sample=self.n_init_points, iteration=iter, base_dir=self.base_dir)
+            else:
+                # Use BOOST to get recommendation of kernel and acquisition functions
+                if self.use_boost:
+                    boost = BOOST(device=self.device, cache_distances=self.cache_distances, backend_candidates=self.backend_candidates, n_inducing_points=self.n_inducing_points, prior=boost_prior, subspace=self.subspace, initial_hyperparameters=self.initial_hyperparameters)
+                    self.kernel_type, self.acquisition_type = boost.get_kernel_acq(train_x=self.train_x, train_y=self.train_y, objective=self.objective, iter=iter, seed=self.seed, n_init_points=self.n_init_points, base_dir=self.base_dir)
+                    self.backend = boost.backend
+                # reset seed to be dependent of seed in BOOST
+                self.set_seed(self.seed)
+
+                # Get next point using BO (evaluated below, speculative: after the next step has been started)
+                next_x, _, next_x_idx = self.get_next_point(train_x=self.observations, train_y=None, filtered_candidate_x=self.filtered_candidate_x, filtered_candidate_y=self.filtered_candidate_y, kernel_type=self.kernel_type, acquisition_type=self.acquisition_type, trust_region=trust_region, candidate_sampler=self.candidate_sampler, cost_model=self.cost_model, subspace=self.subspace)
+
+            if isinstance(self.filtered_candidate_x, ContinuousBox):
+                self.filtered_candidate_x.remove_points(next_x)
+            else:
+                self.filtered_candidate_x.remove(next_x_idx)
+            if speculation is not None:
+                # precompute the next step on a background thread while next_x is evaluated
+                speculation.speculate(observations=self.observations, candidates=self.filtered_candidate_x, next_x=next_x, next_idx=next_x_idx, kernel_type=self.kernel_type, acquisition_type=self.acquisition_type, backend=self.backend, objective=self.objective, seed=self.seed, iter=iter + 1, cost_model=self.cost_model)
+            next_y, next_cost = self._evaluate(next_x, next_x_idx.reshape(1) if self.is_fixed_candidate_x else None)
+            self.cost_model.observe(next_x, next_cost)
 
-            mask = torch.ones(self.filtered_candidate_x.shape[0], dtype=torch.bool, device=self.device)
-            mask[next_x_idx] = False
-            self.filtered_candidate_x = self.filtered_candidate_x[mask]
-            assert (self.filtered_candidate_x.shape[0] + self.train_x.shape[0] - self.candidate_x.shape[0]) == 0
-            if self.is_fixed_candidate_x:
-                self.filtered_candidate_y = self.filtered_candidate_y[mask]
+            # update train_x and train_y
+            self.observations.append(next_x, next_y, next_x_idx if self.is_fixed_candidate_x else None)
+            self.train_x, self.train_y = self.observations.x, self.observations.y
+            if not isinstance(self.filtered_candidate_x, ContinuousBox):
+                assert (len(self.filtered_candidate_x) + self.train_x.shape[0] - n_candidates) == 0
 
             # update current best
-            current_min = self.train_y.min().item()
+            current_min = self.observations.y_min
             best_idx = self.train_y.argmin().item()
             best_x = self.train_x[best_idx]
 
@@ -162,6 +273,7 @@ class TestFunction(BayesianOptimizer):
             regret = current_min - self.target
             value = regret.item() if isinstance(regret, torch.Tensor) else regret
             history['best_values'].append(value)
+            history['costs'].append(history['costs'][-1] + next_cost.sum().item())
 
             # stop if target reached
             if self.train_y.min().item() <= self.target + 1e-10:
@@ -169,13 +281,17 @@ class TestFunction(BayesianOptimizer):
                 for remaining_iter in remaining_iterations:
                     history['iterations'].append(remaining_iter)
                     history['best_values'].append(0.0)
+                    history['costs'].append(history['costs'][-1])
                 break
 
         pbar.close()
+        if speculation is not None:
+            speculation.close()
 
         save_final_data_to_excel(
             self.train_x, self.train_y, self.seed, self.kernel_type, self.acquisition_type, self.objective, self.base_dir
         )
+        eval_time = self.objective.eval_time if isinstance(self.objective, Objective) else 0.0
 
         return {
             'kernel': self.kernel_type,
@@ -184,8 +300,25 @@ class TestFunction(BayesianOptimizer):
             'final_best': current_min,
             'iterations': history['iterations'],
             'best_values': history['best_values'],
+            'costs': history['costs'],
+            'eval_time': eval_time,
+            'optimizer_time': time.perf_counter() - run_start - eval_time,
         }
 
+    def _evaluate(self, x, idx=None):
+        """
+        Objective values of the rows of x and their evaluation costs: pool rows idx (is_fixed_candidate_x=True) are
+        looked up and cost their candidate_cost (1 without it), other points cost the measured wall time
+        """
+        if self.is_fixed_candidate_x:
+            y = self.candidate_y[idx]
+            cost = self.candidate_cost[idx] if self.candidate_cost is not None else torch.ones_like(y)
+            return y, cost
+        start = time.perf_counter()
+        y = self.objective(x).to(dtype=x.dtype, device=self.device)
+        cost = torch.full((x.shape[0],), (time.perf_counter() - start) / x.shape[0], dtype=x.dtype, device=self.device)
+        return y, cost
+
 
     def _generate_lhs_samples(self, dim, n_samples, bounds=None, n_grid=19):
         """LHS for discrete grid points."""
@@ -202,7 +335,7 @@ class TestFunction(BayesianOptimizer):
             lhs_points = []
             for d in range(dim):
                 # discrete version of LHS
-                grid_points = torch.linspace(bounds[0], bounds[1], n_grid)
+                grid_points = torch.linspace(bounds[0], bounds[1], n_grid, dtype=torch.double)
                 lhs_step = max(1, (n_grid - 1) // (n_samples - 1))
                 lhs_start = ((n_grid - 1) - lhs_step * (n_samples - 1)) // 2
                 dim_points = [grid_points[lhs_start + i * lhs_step].item() for i in range(min(n_samples, n_grid))]
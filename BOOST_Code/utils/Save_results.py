@@ -36,6 +36,13 @@ def save_individual_trial(trial_results, objective_name, n_initial_points, base_
 
         pd.DataFrame(combined_data).to_excel(writer, sheet_name='combined_seeds', index=False, header=False)
 
+        # Wall time spent in the objective and in the optimizer (TestFunction results)
+        if 'eval_time' in trial_results[0]:
+            pd.DataFrame(
+                [[f'seed_{i}', result['eval_time'], result['optimizer_time']] for i, result in enumerate(trial_results)],
+                columns=['seed', 'eval_time', 'optimizer_time'],
+            ).to_excel(writer, sheet_name='timing', index=False)
+
         # Individual seed sheets
         for i, result in enumerate(trial_results):
             pd.DataFrame([
@@ -44,6 +51,70 @@ def save_individual_trial(trial_results, objective_name, n_initial_points, base_
             ]).to_excel(writer, sheet_name=f'seed_{i}', index=False, header=False)
 
 
+def save_cost_history(trial_results, objective_name, n_initial_points, base_dir=None, n_grid=101):
+    """
+    Saves the regret against the cumulative evaluation cost ('costs' of every trial result) to an Excel file and,
+    if matplotlib is installed, plots it. The statistics interpolate every seed's best value at n_grid costs
+    (the best value after the last evaluation within that cost; NaN before a seed's first evaluation).
+    """
+    if base_dir is None:
+        base_dir = f'results_{datetime.now().strftime("%Y%m%d")}_{n_initial_points}_init'
+    os.makedirs(base_dir, exist_ok=True)
+
+    if 'method' in trial_results[0] and trial_results[0]['method'] == 'recommended':
+        name = f'{objective_name}_recommended'
+    else:
+        name = f"{objective_name}_{trial_results[0]['kernel'].value}_{trial_results[0]['acquisition'].value}"
+
+    cost_grid = np.linspace(min(r['costs'][0] for r in trial_results), max(r['costs'][-1] for r in trial_results), n_grid)
+    grid_values = []
+    for r in trial_results:
+        # index of the last evaluation whose cumulative cost is within each grid cost
+        last = np.searchsorted(np.array(r['costs']), cost_grid, side='right') - 1
+        values = np.array(r['best_values'], dtype=float)[np.maximum(last, 0)]
+        values[last < 0] = np.nan
+        grid_values.append(values)
+    grid_values = np.array(grid_values)
+
+    excel_path = os.path.join(base_dir, f'{name}_cost_results.xlsx')
+    with pd.ExcelWriter(excel_path) as writer:
+        # Statistics sheet
+        stats_data = [
+            ['cost'] + cost_grid.tolist(),
+            ['mean'] + np.nanmean(grid_values, axis=0).tolist(),
+            ['std'] + np.nanstd(grid_values, axis=0).tolist()
+        ]
+        pd.DataFrame(stats_data).to_excel(writer, sheet_name='statistics', index=False, header=False)
+
+        # Individual seed sheets
+        for i, result in enumerate(trial_results):
+            pd.DataFrame([
+                ['cost'] + result['costs'],
+                [f'seed_{i}'] + result['best_values']
+            ]).to_excel(writer, sheet_name=f'seed_{i}', index=False, header=False)
+
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+    except ImportError:
+        return excel_path
+
+    fig, ax = plt.subplots(figsize=(6, 4))
+    for result in trial_results:
+        ax.step(result['costs'], result['best_values'], where='post', color='gray', alpha=0.3, linewidth=0.8)
+    ax.plot(cost_grid, np.nanmean(grid_values, axis=0), color='C0', label='mean')
+    ax.set_xlabel('cumulative evaluation cost')
+    ax.set_ylabel('regret')
+    ax.set_title(name)
+    ax.legend()
+    fig.tight_layout()
+    fig.savefig(os.path.join(base_dir, f'{name}_cost_results.png'), dpi=150)
+    plt.close(fig)
+
+    return excel_path
+
+
 def save_recommendation_log(objective_name, seed, kernel, acquisition, n_init_sample, iteration, base_dir=None):
     if base_dir is None:
         base_dir = f'results_{datetime.now().strftime("%Y%m%d")}'
@@ -4,6 +4,8 @@ import torch
 from sklearn.cluster import KMeans
 
 from BayesianOptimization import BayesianOptimizer
+from candidates import CandidatePool
+from observations import ObservationStore
 from kernels_and_acquisitions import KernelType, AcquisitionType
 
 
@@ -62,11 +64,10 @@ class BOOST(BayesianOptimizer):
         selected_train_x_init = train_x_init[train_indices]
 
         # leftover points for candidate set: treat as undiscovered points
-        candidate_mask = torch.ones(train_x_init.shape[0], dtype=torch.bool, device=self.device)
-        candidate_mask[train_indices] = False
-        self.filtered_candidate_x = train_x_init[candidate_mask]
+        # The pool is shared read-only by every combination; each one only forks the evaluated set
+        self.candidate_pool = CandidatePool(train_x_init, train_y_init)
+        self.candidate_pool.remove(train_indices)
         selected_train_y_init = train_y_init[train_indices]
-        self.filtered_candidate_y = train_y_init[candidate_mask]
 
         best_iterations = max_iter_boost
         results = []
@@ -74,42 +75,36 @@ class BOOST(BayesianOptimizer):
         for acquisition_type in self.acquisition_candidates:
             for kernel_type in self.kernel_candidates:
                 iterations = 0
-                train_x = selected_train_x_init.clone()
-                filtered_candidate_x = self.filtered_candidate_x.clone()
-                train_y = selected_train_y_init.clone()
-                filtered_candidate_y = self.filtered_candidate_y.clone()
+                candidate_pool = self.candidate_pool.fork()
+                observations = ObservationStore.from_tensors(selected_train_x_init, selected_train_y_init, capacity=train_x_init.shape[0])
 
-                while train_x.shape[0] < train_x_init.shape[0]:
+                while len(observations) < train_x_init.shape[0]:
                     iterations += 1
                     next_x, next_idx, _, __ = self.get_next_point(
-                        train_x=train_x,
-                        train_y=train_y,
-                        filtered_candidate_x=filtered_candidate_x,
+                        train_x=observations,
+                        train_y=None,
+                        filtered_candidate_x=candidate_pool,
                         kernel_type=kernel_type,
                         acquisition_type=acquisition_type,
                     )
-                    next_y = filtered_candidate_y[next_idx].unsqueeze(0).to(self.device)
-                    train_x = torch.cat([train_x, next_x], dim=0)
-                    train_y = torch.cat([train_y, next_y], dim=0)
+                    next_y = candidate_pool.y[next_idx].unsqueeze(0).to(self.device)
+                    observations.append(next_x, next_y)
 
-                    mask = torch.ones(filtered_candidate_x.shape[0], dtype=torch.bool, device=self.device)
-                    mask[next_idx] = False
-                    filtered_candidate_x = filtered_candidate_x[mask]
-                    filtered_candidate_y = filtered_candidate_y[mask]
+                    candidate_pool.remove(next_idx)
 
                     gc.collect()
                     if torch.cuda.is_available():
                         torch.cuda.empty_cache()
 
                     # Stopping criterion
-                    if train_y.min().item() <= target:
+                    if observations.y_min <= target:
                         best_iterations = iterations
                         break
                     elif iterations == best_iterations:
-                        iterations = iterations + train_y.min().item() - target
+                        iterations = iterations + observations.y_min - target
                         break
 
-                del train_x, train_y, filtered_candidate_x, filtered_candidate_y
+                del observations, candidate_pool
                 gc.collect()
 
                 results.append({
@@ -8,12 +8,16 @@ import torch
 from gpytorch.constraints import Interval
 from gpytorch.likelihoods import GaussianLikelihood
 
-from kernels_and_acquisitions import AcquisitionType, GPModel
+from candidates import CandidateSet
+from kernels_and_acquisitions import AcquisitionType, BatchStrategy, GPModel
+from observations import ObservationStore
 
 
 class BayesianOptimizer:
-    def __init__(self, device='cpu'):
+    def __init__(self, device='cpu', chunk_size=65536):
         self.device = torch.device("cuda") if device == "cuda" else torch.device("cpu")
+        # Number of candidates scored at once when candidates are given as a CandidateSet
+        self.chunk_size = chunk_size
 
     @staticmethod
     def set_seed(seed):
@@ -28,9 +32,17 @@ class BayesianOptimizer:
         torch.use_deterministic_algorithms(True)
 
     def get_next_point(self, train_x, train_y, filtered_candidate_x, kernel_type, acquisition_type):
+        """
+        train_x is either a tensor (with train_y) or an ObservationStore (train_y is then ignored).
+        filtered_candidate_x is either a tensor of candidate points or a CandidateSet (CandidateGrid, CandidatePool).
+        For a CandidateSet, next_x_idx is the index of next_x in the set, and evaluated candidates are not copied out.
+        """
         # Normaize data: x is min-max normalized to [0, 1], y is standardized with median and std
         x_min, x_range, y_median, y_std, train_x_normalized, train_y_normalized = self.normalize_data(train_x, train_y)
-        candidate_x_normalized = (filtered_candidate_x - x_min) / x_range
+        if isinstance(train_x, ObservationStore):
+            best_f = train_x.y_min
+        else:
+            best_f = train_y.min().item()
 
         # Generate and train GP model
         model, likelihood = self._train_model(train_x_normalized=train_x_normalized, train_y_normalized=train_y_normalized, kernel_type=kernel_type)
@@ -41,31 +53,153 @@ class BayesianOptimizer:
         
         with torch.no_grad(), gpytorch.settings.fast_pred_var():
             # Get predictions for the candidate points and find the next point
-            observed_pred = likelihood(model(candidate_x_normalized))
-            best_f = train_y.min().item()
-            next_x_idx = self._get_next_idx(acquisition_type=acquisition_type, best_f=best_f, observed_pred=observed_pred, y_median=y_median, y_std=y_std)
-            next_x = filtered_candidate_x[next_x_idx].unsqueeze(0)
+            if isinstance(filtered_candidate_x, CandidateSet):
+                # Score the candidates chunk by chunk and keep the best point found so far
+                best_value = None
+                for candidate_idx, candidate_x in filtered_candidate_x.iter_chunks(self.chunk_size):
+                    observed_pred = likelihood(model((candidate_x - x_min) / x_range))
+                    acq_values = self._get_acq_values(acquisition_type=acquisition_type, best_f=best_f, observed_pred=observed_pred, y_median=y_median, y_std=y_std)
+                    chunk_idx = torch.argmax(acq_values)
+                    if best_value is None or acq_values[chunk_idx] > best_value:
+                        best_value = acq_values[chunk_idx]
+                        next_x_idx = candidate_idx[chunk_idx]
+                        prediction_mean = observed_pred.mean[chunk_idx].cpu().item()
+                        prediction_var = observed_pred.variance[chunk_idx].cpu().item()
+                if best_value is None:
+                    raise ValueError("No remaining candidate")
+                next_x = filtered_candidate_x.points(next_x_idx)
+            else:
+                candidate_x_normalized = (filtered_candidate_x - x_min) / x_range
+                observed_pred = likelihood(model(candidate_x_normalized))
+                next_x_idx = self._get_next_idx(acquisition_type=acquisition_type, best_f=best_f, observed_pred=observed_pred, y_median=y_median, y_std=y_std)
+                next_x = filtered_candidate_x[next_x_idx].unsqueeze(0)
 
-            # Modified code:
-            prediction_mean = observed_pred.mean[next_x_idx].cpu().item()
-            prediction_var = observed_pred.variance[next_x_idx].cpu().item()  # Changed name to variance
+                # Modified code:
+                prediction_mean = observed_pred.mean[next_x_idx].cpu().item()
+                prediction_var = observed_pred.variance[next_x_idx].cpu().item()  # Changed name to variance
 
             next_point_mean = prediction_mean * y_std + y_median
             next_point_var = prediction_var * (y_std ** 2)  # ✅ Variance is multiplied by y_std squared
 
         # Remove unnecessary variables to free memory
-        del candidate_x_normalized, observed_pred
+        del observed_pred
         gc.collect()
         if torch.cuda.is_available():
             torch.cuda.empty_cache()
 
         return next_x, next_x_idx, next_point_mean, next_point_var
 
+    def get_next_batch(self, train_x, train_y, filtered_candidate_x, kernel_type, acquisition_type, q, strategy=BatchStrategy.KRIGING_BELIEVER, shortlist_size=8192):
+        """
+        q distinct points to be run in parallel from one GP fit: (batch_x (q, dim), batch_idx (q,), means (q,), variances (q,)),
+        where means and variances are the predictions of the fitted GP (before any fantasy).
+        Every candidate is scored once and the shortlist_size best are kept; the points are then picked greedily:
+        KRIGING_BELIEVER and CONSTANT_LIAR condition the GP on every pick (get_fantasy_model updates the prediction
+        caches, the hyperparameters are held fixed) at its posterior mean or at the best observed value.
+        LOCAL_PENALIZATION multiplies the acquisition by a penalizer around every pick, whose radius comes from
+        the Lipschitz constant of the posterior mean.
+        """
+        x_min, x_range, y_median, y_std, train_x_normalized, train_y_normalized = self.normalize_data(train_x, train_y)
+        if isinstance(train_x, ObservationStore):
+            best_f = train_x.y_min
+        else:
+            best_f = train_y.min().item()
+
+        # Generate and train GP model
+        model, likelihood = self._train_model(train_x_normalized=train_x_normalized, train_y_normalized=train_y_normalized, kernel_type=kernel_type)
+        model.eval()
+        likelihood.eval()
+
+        with torch.no_grad(), gpytorch.settings.fast_pred_var():
+            # Shortlist of the best candidates
+            if isinstance(filtered_candidate_x, CandidateSet):
+                chunks = filtered_candidate_x.iter_chunks(self.chunk_size)
+            else:
+                chunks = [(torch.arange(filtered_candidate_x.shape[0], device=filtered_candidate_x.device), filtered_candidate_x)]
+            shortlist_idx, shortlist_values = [], []
+            for candidate_idx, candidate_x in chunks:
+                observed_pred = likelihood(model((candidate_x - x_min) / x_range))
+                acq_values = self._get_acq_values(acquisition_type=acquisition_type, best_f=best_f, observed_pred=observed_pred, y_median=y_median, y_std=y_std)
+                top = torch.topk(acq_values, min(shortlist_size, acq_values.shape[0]))
+                shortlist_idx.append(candidate_idx[top.indices])
+                shortlist_values.append(top.values)
+            if not shortlist_idx:
+                raise ValueError("No remaining candidate")
+            shortlist_values = torch.cat(shortlist_values)
+            candidate_idx = torch.cat(shortlist_idx)[torch.topk(shortlist_values, min(shortlist_size, shortlist_values.shape[0])).indices]
+            candidate_x = filtered_candidate_x.points(candidate_idx) if isinstance(filtered_candidate_x, CandidateSet) else filtered_candidate_x[candidate_idx]
+            candidate_x_normalized = (candidate_x - x_min) / x_range
+
+            observed_pred = likelihood(model(candidate_x_normalized))
+            mean, variance = observed_pred.mean, observed_pred.variance
+            if strategy == BatchStrategy.LOCAL_PENALIZATION:
+                log_penalty = torch.zeros_like(mean)
+                best_value = torch.min(train_y_normalized.min(), mean.min())
+                lipschitz = self._lipschitz_constant(model, candidate_x_normalized[:1024])
+
+            fantasy_model = model
+            picks = []
+            n_picks = min(q, candidate_idx.shape[0])
+            while len(picks) < n_picks:
+                if strategy == BatchStrategy.LOCAL_PENALIZATION:
+                    acq_values = self._get_acq_values(acquisition_type=acquisition_type, best_f=best_f, observed_pred=observed_pred, y_median=y_median, y_std=y_std)
+                    # product of the acquisition and the penalizers, in log space; EI and PI are already positive
+                    if acquisition_type in (AcquisitionType.EI, AcquisitionType.PI):
+                        acq_values = acq_values.clamp_min(1e-300).log() + log_penalty
+                    else:
+                        acq_values = torch.nn.functional.softplus(acq_values).clamp_min(1e-300).log() + log_penalty
+                else:
+                    fantasy_pred = likelihood(fantasy_model(candidate_x_normalized))
+                    acq_values = self._get_acq_values(acquisition_type=acquisition_type, best_f=best_f, observed_pred=fantasy_pred, y_median=y_median, y_std=y_std)
+                acq_values[picks] = -math.inf
+                pick = int(torch.argmax(acq_values))
+                picks.append(pick)
+                if len(picks) == n_picks:
+                    break
+
+                x_pick = candidate_x_normalized[pick].unsqueeze(0)
+                if strategy == BatchStrategy.LOCAL_PENALIZATION:
+                    # penalizer: probability that the pick's value plus lipschitz * distance is above the best value,
+                    # taken below every posterior mean so that every pick excludes a ball
+                    dist = torch.cdist(candidate_x_normalized, x_pick).squeeze(-1)
+                    z = (lipschitz * dist + best_value - mean[pick]) / variance[pick].sqrt()
+                    log_penalty += torch.special.log_ndtr(z)
+                else:
+                    if strategy == BatchStrategy.KRIGING_BELIEVER:
+                        y_fantasy = fantasy_pred.mean[pick]
+                    else:
+                        y_fantasy = train_y_normalized.min()
+                    fantasy_model = fantasy_model.get_fantasy_model(x_pick, y_fantasy.reshape(1))
+
+            batch_x = candidate_x[picks]
+            batch_idx = candidate_idx[picks]
+            batch_mean = mean[picks] * y_std + y_median
+            batch_var = variance[picks] * (y_std ** 2)
+
+        del observed_pred, fantasy_model
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+        return batch_x, batch_idx, batch_mean, batch_var
+
+    @staticmethod
+    def _lipschitz_constant(model, x):
+        """Largest gradient norm of the posterior mean over the rows of x (normalized x and y), at least 1e-7"""
+        with torch.enable_grad():
+            x = x.clone().requires_grad_(True)
+            grad, = torch.autograd.grad(model(x).mean.sum(), x)
+        return grad.nan_to_num(0.0).norm(dim=1).max().clamp_min(1e-7)
+
     @staticmethod
     def normalize_data(train_x, train_y):
         """
         Normaize data: x is min-max normalized to [0, 1], y is standardized with median and std
+        An ObservationStore is normalized from its cached statistics (train_y is then ignored).
         """
+        if isinstance(train_x, ObservationStore):
+            return train_x.normalize()
+
         # x is min-max normalized to [0, 1]
         x_min = train_x.min(dim=0)[0]
         x_max = train_x.max(dim=0)[0]
@@ -110,26 +244,29 @@ class BayesianOptimizer:
 
         return model, likelihood
 
-    def _get_next_idx(self, acquisition_type, best_f, observed_pred, y_median, y_std):
+    def _get_acq_values(self, acquisition_type, best_f, observed_pred, y_median, y_std):
+        """Acquisition values signed so that the next point is always the argmax"""
         # Denormalize predictions
         # Assume minimization problem. Should be modified if applied to maximization problem
         mean = observed_pred.mean * y_std + y_median
         stddev = observed_pred.stddev * y_std
         if acquisition_type == AcquisitionType.EI:
             acq_values = self._expected_improvement(best_f=best_f, mean=mean, sigma=stddev)
-            next_x_idx = torch.argmax(acq_values)
         elif acquisition_type == AcquisitionType.PI:
             acq_values = self._probability_improvement(best_f=best_f, mean=mean, sigma=stddev)
-            next_x_idx = torch.argmax(acq_values)
         elif acquisition_type == AcquisitionType.PM:
-            acq_values = self._posterior_mean(mean=mean)
-            next_x_idx = torch.argmin(acq_values)
+            acq_values = -self._posterior_mean(mean=mean)
         elif acquisition_type == AcquisitionType.UCB:
-            acq_values = self._upper_confidence_bound(mean=mean, sigma=stddev)
-            next_x_idx = torch.argmin(acq_values)
+            acq_values = -self._upper_confidence_bound(mean=mean, sigma=stddev)
         else:
             raise ValueError("Unsupported acquisition type")
 
+        return acq_values
+
+    def _get_next_idx(self, acquisition_type, best_f, observed_pred, y_median, y_std):
+        acq_values = self._get_acq_values(acquisition_type=acquisition_type, best_f=best_f, observed_pred=observed_pred, y_median=y_median, y_std=y_std)
+        next_x_idx = torch.argmax(acq_values)
+
         return next_x_idx
 
 
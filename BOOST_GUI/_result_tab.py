@@ -10,6 +10,8 @@ import psutil
 
 from BOOST import BOOST
 from BayesianOptimization import BayesianOptimizer
+from candidates import CandidateGrid
+from observations import ObservationStore
 
 
 class ResultTab(BayesianOptimizer):
@@ -92,9 +94,28 @@ class ResultTab(BayesianOptimizer):
         )
         run_btn.grid(row=0, column=0, padx=7, pady=2)
 
+        # Number of points suggested per run (one per parallel experiment)
+        batch_label = tk.Label(
+            button_frame,
+            text="Points per run (q):",
+            font=self.main_app.button_font,
+            bg=self.bg_color_2
+        )
+        batch_label.grid(row=0, column=1, padx=(10, 2), pady=2)
+        self.batch_size_var = tk.StringVar(value="1")
+        batch_spinbox = tk.Spinbox(
+            button_frame,
+            from_=1, to=48,
+            width=4,
+            textvariable=self.batch_size_var,
+            justify="center",
+            font=self.main_app.button_font
+        )
+        batch_spinbox.grid(row=0, column=2, padx=(2, 7), pady=2)
+
         # separator
         sep = tk.Frame(button_frame, width=2, height=20, bg='gray')
-        sep.grid(row=0, column=1, padx=10, pady=2)
+        sep.grid(row=0, column=3, padx=10, pady=2)
 
         # Add recommended points button (initially disabled)
         self.add_points_button = tk.Button(
@@ -106,11 +127,19 @@ class ResultTab(BayesianOptimizer):
             state="disabled",
             takefocus=False
         )
-        self.add_points_button.grid(row=0, column=2, padx=7, pady=2)
+        self.add_points_button.grid(row=0, column=4, padx=7, pady=2)
 
 
     def run_optimization(self):
         try:
+            try:
+                batch_size = int(self.batch_size_var.get())
+            except ValueError:
+                batch_size = 0
+            if batch_size < 1:
+                messagebox.showwarning("Invalid Input", "Points per run (q) must be a positive integer.")
+                return
+
             # extract data
             df = self.main_app.data_tab.extract_data_only()
             partially_filled = df[df.notna().any(axis=1) & df.isna().any(axis=1)]
@@ -226,8 +255,8 @@ class ResultTab(BayesianOptimizer):
             for grid in candidate_points:
                 num_candidates *= len(grid)
 
-            dim = len(candidate_points)
-            expected_mem = num_candidates * dim * 8  # GB unit (based on float64)
+            # The grid is never materialized: only a bitset of evaluated points is stored
+            expected_mem = num_candidates / 8
             mem = psutil.virtual_memory()
 
             print(expected_mem/ (1024**3))
@@ -238,7 +267,7 @@ class ResultTab(BayesianOptimizer):
             if used_ratio >= 0.2:
                 messagebox.showwarning(
                     "Memory Warning",
-                    f"Candidate points may require ~{expected_mem:.2f} GB "
+                    f"Candidate points may require ~{expected_mem / (1024**3):.2f} GB "
                     f"({used_ratio * 100:.1f}% of total RAM).\n\n"
                     "This could slow down or freeze the program. "
                     "Consider reducing parameter ranges or step size."
@@ -246,11 +275,10 @@ class ResultTab(BayesianOptimizer):
                 return
             # ────────────────────────────────────────────────────────────────
 
-            candidate_x = torch.cartesian_prod(*candidate_points).to(device)
+            filtered_candidate_x = CandidateGrid(candidate_points, device=device)
 
             # remove already evaluated points
-            mask = ~torch.any(torch.cdist(candidate_x, train_x) < 1e-5, dim=1)
-            filtered_candidate_x = candidate_x[mask]
+            filtered_candidate_x.remove_points(train_x)
 
             # check data count
             if len(train_x) < 6:
@@ -272,46 +300,66 @@ class ResultTab(BayesianOptimizer):
             self.result_text.insert(tk.END, f"Selected kernel: {kernel_type.value}\n")
             self.result_text.insert(tk.END, f"Selected acquisition: {acquisition_type.value}\n")
 
-            next_point, _, prediction_mean, prediction_var = self.get_next_point(
-                train_x=train_x,
-                train_y=train_y,
-                filtered_candidate_x=filtered_candidate_x,
-                kernel_type=kernel_type,
-                acquisition_type=acquisition_type
-            )
+            observations = ObservationStore.from_tensors(train_x, train_y)
+            if batch_size == 1:
+                next_point, _, prediction_mean, prediction_var = self.get_next_point(
+                    train_x=observations,
+                    train_y=None,
+                    filtered_candidate_x=filtered_candidate_x,
+                    kernel_type=kernel_type,
+                    acquisition_type=acquisition_type
+                )
+                next_points = next_point.reshape(1, -1)
+                prediction_means, prediction_vars = [prediction_mean], [prediction_var]
+            else:
+                # q points for parallel experiments, picked greedily with kriging believer fantasies
+                next_points, _, prediction_means, prediction_vars = self.get_next_batch(
+                    train_x=observations,
+                    train_y=None,
+                    filtered_candidate_x=filtered_candidate_x,
+                    kernel_type=kernel_type,
+                    acquisition_type=acquisition_type,
+                    q=batch_size
+                )
+                prediction_means, prediction_vars = prediction_means.tolist(), prediction_vars.tolist()
 
-            prediction_std = np.sqrt(prediction_var)
+            self.result_text.insert(tk.END, "\n=== Prediction ===\n")
+            suggested_points, suggestion_lines = [], []
+            for k, (next_point, prediction_mean, prediction_var) in enumerate(zip(next_points, prediction_means, prediction_vars)):
+                prediction_std = np.sqrt(float(prediction_var))
+                prediction_mean = float(prediction_mean)
 
-            # revert maximization
-            if is_maximization:
-                prediction_mean = -prediction_mean
+                # revert maximization
+                if is_maximization:
+                    prediction_mean = -prediction_mean
 
-            # 67% confidence interval
-            lower_bound = prediction_mean - prediction_std
-            upper_bound = prediction_mean + prediction_std
+                # 67% confidence interval
+                lower_bound = prediction_mean - prediction_std
+                upper_bound = prediction_mean + prediction_std
 
-            # convert next_point
-            next_point_cpu = next_point.cpu().numpy().flatten()
-            next_point_list = [round(float(val), 4) for val in next_point_cpu]
+                # convert next_point
+                next_point_cpu = next_point.cpu().numpy().flatten()
+                next_point_list = [round(float(val), 4) for val in next_point_cpu]
+                suggested_points.append(next_point_list)
 
-            # display results
-            self.result_text.insert(tk.END, "\n=== Prediction ===\n")
-            point_str = ", ".join([f"{param_info[i]['name']}={next_point_list[i]}"
-                                   for i in range(len(next_point_list))])
-            self.result_text.insert(tk.END, f"Recommended Point: {point_str}\n")
-            self.result_text.insert(tk.END, f"Predicted {param_config['y_name']}: {prediction_mean:.4f}\n")
-            self.result_text.insert(tk.END, f"67% CI: [{lower_bound:.4f}, {upper_bound:.4f}]\n")
-            self.result_text.insert(tk.END, f"Std. (±1σ): {prediction_std:.4f}\n")
-
-            suggestion_text = (
-                "Suggested Point: " +
-                point_str +
-                f"\nPredicted {param_config['y_name']}: [{lower_bound:.4f}, {upper_bound:.4f}]"
-            )
-            self.suggestion_label.config(text=suggestion_text)
-
-            # store single point as a list
-            self.last_suggested_points = [next_point_list]
+                # display results
+                point_str = ", ".join([f"{param_info[i]['name']}={next_point_list[i]}"
+                                       for i in range(len(next_point_list))])
+                title = "Recommended Point" if len(next_points) == 1 else f"Recommended Point {k + 1}"
+                self.result_text.insert(tk.END, f"{title}: {point_str}\n")
+                self.result_text.insert(tk.END, f"Predicted {param_config['y_name']}: {prediction_mean:.4f}\n")
+                self.result_text.insert(tk.END, f"67% CI: [{lower_bound:.4f}, {upper_bound:.4f}]\n")
+                self.result_text.insert(tk.END, f"Std. (±1σ): {prediction_std:.4f}\n")
+
+                suggestion_lines.append(
+                    ("Suggested Point: " if len(next_points) == 1 else f"Point {k + 1}: ") +
+                    point_str +
+                    f"\nPredicted {param_config['y_name']}: [{lower_bound:.4f}, {upper_bound:.4f}]"
+                )
+            self.suggestion_label.config(text="\n".join(suggestion_lines))
+
+            # store the suggested points as a list
+            self.last_suggested_points = suggested_points
             self.last_param_info = param_info
             self.add_points_button.config(state="normal")
 
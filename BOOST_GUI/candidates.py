@@ -0,0 +1,168 @@
+import copy
+import math
+
+import numpy as np
+import torch
+
+
+class Bitset:
+    """Packed boolean array with one bit per entry"""
+    def __init__(self, size):
+        self.size = size
+        self.bits = np.zeros((size + 7) // 8, dtype=np.uint8)
+
+    def add(self, idx):
+        idx = np.asarray(idx, dtype=np.int64).reshape(-1)
+        np.bitwise_or.at(self.bits, idx >> 3, np.left_shift(1, idx & 7).astype(np.uint8))
+
+    def contains(self, idx):
+        idx = np.asarray(idx, dtype=np.int64)
+        return ((self.bits[idx >> 3] >> (idx & 7)) & 1).astype(bool)
+
+    def unpack(self, start, stop):
+        """Boolean array for entries [start, stop). start must be a multiple of 8."""
+        return np.unpackbits(self.bits[start >> 3:(stop + 7) >> 3], bitorder='little')[:stop - start].astype(bool)
+
+    def copy(self):
+        new = copy.copy(self)
+        new.bits = self.bits.copy()
+        return new
+
+
+class CandidateSet:
+    """
+    Base class of candidate sets scored chunk by chunk by BayesianOptimizer.get_next_point.
+    Candidates are addressed by a fixed integer index, and evaluated candidates are tracked in a bitset
+    so that removal is O(1). fork() gives an independent evaluated set while sharing the candidate data.
+    """
+    def __init__(self, n_total, device='cpu'):
+        self.device = torch.device(device)
+        self.n_total = n_total
+        self.evaluated = Bitset(self.n_total)
+        self.n_remaining = self.n_total
+
+    def __len__(self):
+        return self.n_remaining
+
+    def remove(self, idx):
+        """Mark candidates as evaluated"""
+        idx = np.unique(torch.as_tensor(idx).reshape(-1).cpu().numpy())
+        new_idx = idx[~self.evaluated.contains(idx)]
+        self.evaluated.add(new_idx)
+        self.n_remaining -= len(new_idx)
+
+    def points(self, idx):
+        """Candidate indices -> points of shape (n, dim)"""
+        raise NotImplementedError
+
+    def iter_chunks(self, chunk_size=65536):
+        """Yield (indices, points) of the remaining candidates"""
+        raise NotImplementedError
+
+    def fork(self):
+        """Copy with its own evaluated set. The candidate data is shared."""
+        new = copy.copy(self)
+        new.evaluated = self.evaluated.copy()
+        return new
+
+
+class CandidateGrid(CandidateSet):
+    """
+    Cartesian grid of candidate points that is never materialized.
+    Points are addressed by flat index in the same order as torch.cartesian_prod (last dimension varies fastest).
+    Every axis must be increasing.
+    """
+    def __init__(self, axes, device='cpu'):
+        self.axes = [torch.as_tensor(axis, dtype=torch.double, device=device) for axis in axes]
+        self.shape = tuple(axis.shape[0] for axis in self.axes)
+        self.dim = len(self.axes)
+        super().__init__(n_total=math.prod(self.shape), device=device)
+        self.strides = torch.tensor(
+            [math.prod(self.shape[d + 1:]) for d in range(self.dim)], dtype=torch.long, device=self.device
+        )
+        self.sizes = torch.tensor(self.shape, dtype=torch.long, device=self.device)
+
+    @classmethod
+    def from_bounds(cls, bounds, n_grid, dim, device='cpu'):
+        """Same grid as torch.linspace(bounds[0], bounds[1], n_grid) repeated over every dimension"""
+        axes = [torch.linspace(bounds[0], bounds[1], n_grid, dtype=torch.double) for _ in range(dim)]
+        return cls(axes, device=device)
+
+    def decode(self, flat_idx):
+        """Flat indices -> integer grid coordinates of shape (n, dim)"""
+        flat_idx = torch.as_tensor(flat_idx, dtype=torch.long, device=self.device).reshape(-1, 1)
+        return (flat_idx // self.strides) % self.sizes
+
+    def points(self, flat_idx):
+        """Flat indices -> grid points of shape (n, dim)"""
+        coords = self.decode(flat_idx)
+        return torch.stack([self.axes[d][coords[:, d]] for d in range(self.dim)], dim=1)
+
+    def encode(self, x, tol=1e-5):
+        """
+        Points -> flat indices (int64 keys of the integer grid coordinates).
+        Points farther than tol from every grid point are encoded as -1.
+        """
+        x = x.to(device=self.device, dtype=torch.double).reshape(-1, self.dim)
+        coords = torch.zeros(x.shape, dtype=torch.long, device=self.device)
+        sq_err = torch.zeros(x.shape[0], dtype=torch.double, device=self.device)
+        for d, axis in enumerate(self.axes):
+            if axis.shape[0] > 1:
+                # nearest axis value by binary search
+                right = torch.searchsorted(axis, x[:, d].contiguous()).clamp(1, axis.shape[0] - 1)
+                left = right - 1
+                is_left = (x[:, d] - axis[left]).abs() <= (axis[right] - x[:, d]).abs()
+                coords[:, d] = torch.where(is_left, left, right)
+            sq_err += (axis[coords[:, d]] - x[:, d]) ** 2
+        flat_idx = (coords * self.strides).sum(dim=1)
+
+        return torch.where(sq_err < tol ** 2, flat_idx, -1)
+
+    def remove_points(self, x, tol=1e-5):
+        """Mark grid points closer than tol to any row of x as evaluated"""
+        flat_idx = self.encode(x, tol=tol)
+        self.remove(flat_idx[flat_idx >= 0])
+
+    def iter_chunks(self, chunk_size=65536):
+        """Yield (flat indices, points) of the remaining grid points, chunk_size grid positions at a time"""
+        chunk_size = max(8, chunk_size - chunk_size % 8)
+        for start in range(0, self.n_total, chunk_size):
+            stop = min(start + chunk_size, self.n_total)
+            is_evaluated = torch.from_numpy(self.evaluated.unpack(start, stop)).to(self.device)
+            flat_idx = torch.arange(start, stop, device=self.device)[~is_evaluated]
+            if flat_idx.shape[0] == 0:
+                continue
+            yield flat_idx, self.points(flat_idx)
+
+
+class CandidatePool(CandidateSet):
+    """
+    Fixed pool of candidate rows (e.g. HPO-B or chemical engineering datasets) with optional known y values.
+    x and y are shared read-only by every fork. The remaining rows are kept in an index tensor that is
+    compacted lazily, once more than compaction_ratio of its entries have been evaluated.
+    """
+    def __init__(self, x, y=None, compaction_ratio=0.25):
+        super().__init__(n_total=x.shape[0], device=x.device)
+        self.x = x
+        self.y = y
+        self.compaction_ratio = compaction_ratio
+        self.active_idx = torch.arange(self.n_total, device=self.device)
+
+    def remove(self, idx):
+        super().remove(idx)
+        if self.active_idx.shape[0] - self.n_remaining > self.compaction_ratio * self.active_idx.shape[0]:
+            is_evaluated = torch.from_numpy(self.evaluated.contains(self.active_idx.cpu().numpy())).to(self.device)
+            self.active_idx = self.active_idx[~is_evaluated]
+
+    def points(self, idx):
+        return self.x[torch.as_tensor(idx, device=self.device).reshape(-1)]
+
+    def iter_chunks(self, chunk_size=65536):
+        """Yield (row indices, rows) of the remaining pool rows"""
+        for start in range(0, self.active_idx.shape[0], chunk_size):
+            idx = self.active_idx[start:start + chunk_size]
+            is_evaluated = torch.from_numpy(self.evaluated.contains(idx.cpu().numpy())).to(self.device)
+            idx = idx[~is_evaluated]
+            if idx.shape[0] == 0:
+                continue
+            yield idx, self.x[idx]
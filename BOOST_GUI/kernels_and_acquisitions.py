@@ -25,6 +25,11 @@ class AcquisitionType(Enum):
     PM = "PM"
     TBD = "TBD"
 
+class BatchStrategy(Enum):
+    KRIGING_BELIEVER = "KB" # every pick is fantasized at its posterior mean
+    CONSTANT_LIAR = "CL" # every pick is fantasized at the best observed value
+    LOCAL_PENALIZATION = "LP" # the acquisition is penalized around every pick (Gonzalez et al., 2016)
+
 class GPModel(ExactGP):
     def __init__(self, train_x, train_y, likelihood, kernel_type, lengthscale_constraint, outputscale_constraint):
         super().__init__(train_x, train_y, likelihood)